@@ -1,11 +1,16 @@
 from django.contrib import admin
-from django.db.models import Sum, Count
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from django.utils import timezone
+from django.db import transaction
 import datetime
 
-from .models import Categoria, Produto, Venda, RelatorioVendas, ConfiguracaoLoja
+from .models import Categoria, Produto, Venda, RelatorioVendas, RelatorioJob, ConfiguracaoLoja
+from .caching import invalidar
+from .consolidacao import recontar_produtos_ativos
+from .utils import filtro_periodo
+from .exportacao import exportar_csv, exportar_xlsx
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -72,22 +77,26 @@ class ProdutoAdmin(admin.ModelAdmin):
         ('Configurações', {
             'fields': ('ativo',)
         }),
+        ('Vendas', {
+            'fields': ('produtos_vendidos', 'quantidade_vendas', 'total_vendas', 'ultima_venda'),
+            'classes': ('collapse',)
+        }),
         ('Informações do Sistema', {
             'fields': ('criado_em', 'atualizado_em'),
             'classes': ('collapse',)
         }),
     )
     
-    readonly_fields = ['criado_em', 'atualizado_em']
+    readonly_fields = [
+        'criado_em', 'atualizado_em',
+        'produtos_vendidos', 'quantidade_vendas', 'total_vendas', 'ultima_venda'
+    ]
     inlines = [VendaInline]
     
     # Filtros personalizados
     def get_queryset(self, request):
         """Otimiza queries com select_related"""
-        return super().get_queryset(request).select_related('categoria').annotate(
-            vendas_count=Count('vendas'),
-            vendas_total=Sum('vendas__quantidade')
-        )
+        return super().get_queryset(request).select_related('categoria')
     
     def preco_formatado(self, obj):
         """Formata o preço com símbolo de moeda"""
@@ -116,25 +125,33 @@ class ProdutoAdmin(admin.ModelAdmin):
     
     def total_vendido(self, obj):
         """Mostra total vendido do produto"""
-        total = obj.vendas_total or 0
+        total = obj.produtos_vendidos
         if total > 0:
             return format_html('<strong>{}</strong> unidades', total)
         return '0 unidades'
     total_vendido.short_description = 'Total Vendido'
-    total_vendido.admin_order_field = 'vendas_total'
+    total_vendido.admin_order_field = 'produtos_vendidos'
     
     # Actions personalizadas
     actions = ['marcar_ativo', 'marcar_inativo', 'ajustar_estoque']
     
     def marcar_ativo(self, request, queryset):
         """Marca produtos como ativos"""
-        updated = queryset.update(ativo=True)
+        with transaction.atomic():
+            categorias = set(queryset.values_list('categoria_id', flat=True))
+            updated = queryset.update(ativo=True, atualizado_em=timezone.now())
+            recontar_produtos_ativos(categorias)
+        invalidar('produto')
         self.message_user(request, f'{updated} produtos marcados como ativos.')
     marcar_ativo.short_description = "Marcar selecionados como ativos"
     
     def marcar_inativo(self, request, queryset):
         """Marca produtos como inativos"""
-        updated = queryset.update(ativo=False)
+        with transaction.atomic():
+            categorias = set(queryset.values_list('categoria_id', flat=True))
+            updated = queryset.update(ativo=False, atualizado_em=timezone.now())
+            recontar_produtos_ativos(categorias)
+        invalidar('produto')
         self.message_user(request, f'{updated} produtos marcados como inativos.')
     marcar_inativo.short_description = "Marcar selecionados como inativos"
 
@@ -197,13 +214,17 @@ class VendaAdmin(admin.ModelAdmin):
     valor_total_formatado.admin_order_field = 'valor_total'
     
     # Actions personalizadas
-    actions = ['exportar_vendas']
+    actions = ['exportar_vendas', 'exportar_vendas_xlsx']
     
     def exportar_vendas(self, request, queryset):
-        """Exporta vendas selecionadas (placeholder)"""
-        count = queryset.count()
-        self.message_user(request, f'Exportação de {count} vendas preparada.')
-    exportar_vendas.short_description = "Exportar vendas selecionadas"
+        """Exporta vendas selecionadas em CSV"""
+        return exportar_csv(queryset)
+    exportar_vendas.short_description = "Exportar vendas selecionadas (CSV)"
+    
+    def exportar_vendas_xlsx(self, request, queryset):
+        """Exporta vendas selecionadas em XLSX"""
+        return exportar_xlsx(queryset)
+    exportar_vendas_xlsx.short_description = "Exportar vendas selecionadas (XLSX)"
 
 @admin.register(RelatorioVendas)
 class RelatorioVendasAdmin(admin.ModelAdmin):
@@ -238,6 +259,21 @@ class RelatorioVendasAdmin(admin.ModelAdmin):
         return 'R$ 0,00'
     ticket_medio.short_description = 'Ticket Médio'
 
+@admin.register(RelatorioJob)
+class RelatorioJobAdmin(admin.ModelAdmin):
+    """Acompanhamento da fila de relatórios"""
+    list_display = ['id', 'tipo', 'status', 'criado_em', 'concluido_em']
+    list_filter = ['tipo', 'status', 'criado_em']
+    ordering = ['-criado_em']
+    readonly_fields = [
+        'tipo', 'parametros', 'status', 'arquivo', 'nome_arquivo', 'erro',
+        'criado_em', 'iniciado_em', 'concluido_em'
+    ]
+    
+    def has_add_permission(self, request):
+        """Jobs são criados pela API"""
+        return False
+
 # Personalizar o admin site
 admin.site.site_header = "E-commerce Dashboard"
 admin.site.site_title = "E-commerce Admin"
@@ -287,16 +323,16 @@ class VendasHojeFilter(admin.SimpleListFilter):
         )
     
     def queryset(self, request, queryset):
-        hoje = datetime.date.today()
+        hoje = timezone.localdate()
         
         if self.value() == 'hoje':
-            return queryset.filter(data_venda__date=hoje)
+            return queryset.filter(filtro_periodo('data_venda', hoje, hoje))
         if self.value() == 'semana':
             inicio_semana = hoje - datetime.timedelta(days=hoje.weekday())
-            return queryset.filter(data_venda__date__gte=inicio_semana)
+            return queryset.filter(filtro_periodo('data_venda', inicio_semana))
         if self.value() == 'mes':
             inicio_mes = hoje.replace(day=1)
-            return queryset.filter(data_venda__date__gte=inicio_mes)
+            return queryset.filter(filtro_periodo('data_venda', inicio_mes))
 
 @admin.register(ConfiguracaoLoja)
 class ConfiguracaoLojaAdmin(admin.ModelAdmin):
@@ -368,24 +404,22 @@ class ConfiguracaoLojaAdmin(admin.ModelAdmin):
     actions = ['testar_viacep']
     
     def testar_viacep(self, request, queryset):
-        """Action para testar integração ViaCEP"""
-        import requests
+        """Action para testar integração ViaCEP (CEPs consultados em paralelo)"""
+        from .viacep import validar_ceps
+        
+        configs = [config for config in queryset if config.cep]
+        resultados = validar_ceps([config.cep for config in configs])
         
         success_count = 0
-        for config in queryset:
-            if config.cep:
-                try:
-                    cep_limpo = config.cep.replace('-', '')
-                    url = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-                    response = requests.get(url, timeout=5)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if 'erro' not in data:
-                            success_count += 1
-                
-                except:
-                    pass
+        for config, resultado in zip(configs, resultados):
+            if resultado['status'] == 'valido':
+                success_count += 1
+            else:
+                self.message_user(
+                    request,
+                    f'{config}: CEP {resultado["cep"]} - {resultado["erro"] or resultado["status"]}',
+                    level='WARNING'
+                )
         
         if success_count > 0:
             self.message_user(
@@ -0,0 +1,260 @@
+"""
+Índice de autocomplete em memória (um por processo).
+
+Guarda os produtos ativos como tuplas compactas e as palavras
+normalizadas dos nomes (minúsculas, sem acento) num arranjo ordenado,
+de forma que uma busca por prefixo é um bisect seguido da leitura de
+poucas entradas, sem consultar o banco.
+
+O índice acompanha a geração 'produto' do cache (caching.py), que é
+incrementada a cada alteração de produto ou venda. Quando ela muda, só
+os produtos alterados recentemente são relidos; exclusões avançam a
+geração 'produto_exclusao' (sinal post_delete) e levam a uma
+reconstrução completa.
+
+As buscas não usam trava: as palavras e os ids ficam numa única tupla,
+e cada sincronização edita cópias das listas e troca a tupla inteira.
+"""
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Max
+
+from .caching import geracoes
+
+# Releitura com folga para não perder transações confirmadas depois de
+# gravarem atualizado_em
+MARGEM_RELEITURA = timedelta(seconds=30)
+
+MAXIMO_CANDIDATOS = 5000
+
+# Reconstrução completa periódica, para casos que a releitura não vê
+# (um produto excluído e outro criado entre duas verificações)
+RECONSTRUCAO_PERIODICA = 300
+
+
+_SEPARADOR = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos"""
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# O cache também faz palavras repetidas entre produtos compartilharem
+# o mesmo objeto str
+_normalizar_palavra = lru_cache(maxsize=200000)(normalizar)
+
+
+def palavras(texto):
+    """Palavras normalizadas do texto"""
+    return [
+        normalizada for normalizada in map(_normalizar_palavra, _SEPARADOR.split(texto))
+        if normalizada
+    ]
+
+
+class IndiceAutocomplete:
+    """Palavras ordenadas (com o id do produto) + dados dos produtos"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        # (produtos, palavras, ids), trocados sempre juntos
+        self._estado = ({}, [], array('q'))
+        self.geracao = None
+        self.marca = None
+        self.ultima_verificacao = 0.0
+        self.ultima_reconstrucao = 0.0
+
+    # Construção ------------------------------------------------------
+
+    def construir(self, linhas):
+        """Monta o índice a partir de tuplas (id, nome, preco, estoque)"""
+        produtos = {}
+        entradas = []
+        for pk, nome, preco, estoque in linhas:
+            produtos[pk] = (nome, str(preco), estoque)
+            entradas.extend((palavra, pk) for palavra in set(palavras(nome)))
+        entradas.sort()
+
+        self._estado = (
+            produtos,
+            [palavra for palavra, _ in entradas],
+            array('q', (pk for _, pk in entradas)),
+        )
+
+    @property
+    def produtos(self):
+        return self._estado[0]
+
+    @property
+    def palavras(self):
+        return self._estado[1]
+
+    @property
+    def ids(self):
+        return self._estado[2]
+
+    def aplicar(self, alterados):
+        """
+        Atualiza os produtos (tuplas id, nome, preco, estoque, ativo),
+        removendo os inativos. As palavras são editadas em cópias, que
+        substituem as listas atuais de uma vez.
+        """
+        produtos, lista, ids = self._estado
+        copias = None
+        for pk, nome, preco, estoque, ativo in alterados:
+            atual = produtos.get(pk)
+            if ativo and atual is not None and atual[0] == nome:
+                # Só preço/estoque mudaram: as palavras continuam as mesmas
+                produtos[pk] = (nome, str(preco), estoque)
+                continue
+            if copias is None:
+                copias = lista[:], array('q', ids)
+            if atual is not None:
+                _remover(*copias, pk, atual[0])
+            if ativo:
+                _inserir(*copias, pk, nome)
+                produtos[pk] = (nome, str(preco), estoque)
+        if copias is not None:
+            self._estado = (produtos, *copias)
+        # Removidos dos dados só depois de saírem das palavras; as buscas
+        # ignoram ids sem dados
+        for pk, _, _, _, ativo in alterados:
+            if not ativo:
+                produtos.pop(pk, None)
+
+    # Sincronização com o banco ----------------------------------------
+
+    def atualizar(self):
+        """Relê o que mudou desde a última sincronização, se algo mudou"""
+        intervalo = settings.ECOMMERCE_SETTINGS.get('AUTOCOMPLETE_INTERVALO', 1.0)
+        agora = time.monotonic()
+        if self.geracao is not None and agora - self.ultima_verificacao < intervalo:
+            return
+        self.ultima_verificacao = agora
+
+        geracao = tuple(geracoes('produto', 'produto_exclusao'))
+        if geracao == self.geracao:
+            return
+
+        with self._trava:
+            if geracao == self.geracao:
+                return
+            if (
+                self.marca is None
+                or geracao[1] != self.geracao[1]
+                or agora - self.ultima_reconstrucao > RECONSTRUCAO_PERIODICA
+            ):
+                self._reconstruir()
+            else:
+                self._sincronizar()
+            self.geracao = geracao
+
+    def _reconstruir(self):
+        from .models import Produto
+
+        ativos = Produto.objects.filter(ativo=True)
+        self.marca = Produto.objects.aggregate(marca=Max('atualizado_em'))['marca']
+        self.construir(
+            ativos.values_list('id', 'nome', 'preco', 'estoque').iterator(chunk_size=5000)
+        )
+        self.ultima_reconstrucao = time.monotonic()
+
+    def _sincronizar(self):
+        from .models import Produto
+
+        alterados = Produto.objects.filter(
+            atualizado_em__gte=self.marca - MARGEM_RELEITURA
+        ).values_list('id', 'nome', 'preco', 'estoque', 'ativo', 'atualizado_em')
+        linhas = list(alterados)
+        self.aplicar([linha[:5] for linha in linhas])
+        self.marca = max([self.marca, *(linha[5] for linha in linhas)])
+
+    # Consulta -----------------------------------------------------------
+
+    def buscar(self, texto, limite=10):
+        """
+        Produtos cujo nome tem uma palavra começando pela última palavra
+        da busca e contém as demais, em ordem alfabética da palavra.
+        """
+        termos = palavras(texto)
+        if not termos:
+            return []
+        prefixo, completas = termos[-1], termos[:-1]
+
+        # Uma única leitura: palavras e ids sempre da mesma versão
+        produtos, lista, ids = self._estado
+        inicio = bisect_left(lista, prefixo)
+        fim = min(len(lista), inicio + MAXIMO_CANDIDATOS)
+
+        # Faixa de cada palavra completa; dentro dela os ids estão ordenados
+        faixas = []
+        for palavra in set(completas):
+            comeco = bisect_left(lista, palavra)
+            faixas.append((comeco, bisect_left(lista, palavra + '\0', comeco)))
+
+        resultado = []
+        vistos = set()
+        for posicao in range(inicio, fim):
+            if not lista[posicao].startswith(prefixo):
+                break
+            pk = ids[posicao]
+            if pk in vistos:
+                continue
+            vistos.add(pk)
+
+            dados = produtos.get(pk)
+            if dados is None:
+                continue
+            if not all(_contem(ids, pk, comeco, final) for comeco, final in faixas):
+                continue
+
+            nome, preco, estoque = dados
+            resultado.append({'id': pk, 'nome': nome, 'preco': preco, 'estoque': estoque})
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+
+def _posicao(lista, ids, palavra, pk):
+    # Entradas ordenadas por (palavra, id)
+    inicio = bisect_left(lista, palavra)
+    fim = bisect_left(lista, palavra + '\0', inicio)
+    return bisect_left(ids, pk, inicio, fim)
+
+
+def _remover(lista, ids, pk, nome):
+    for palavra in set(palavras(nome)):
+        posicao = _posicao(lista, ids, palavra, pk)
+        del lista[posicao]
+        del ids[posicao]
+
+
+def _inserir(lista, ids, pk, nome):
+    for palavra in set(palavras(nome)):
+        posicao = _posicao(lista, ids, palavra, pk)
+        lista.insert(posicao, palavra)
+        ids.insert(posicao, pk)
+
+
+def _contem(ids, pk, inicio, fim):
+    posicao = bisect_left(ids, pk, inicio, fim)
+    return posicao < fim and ids[posicao] == pk
+
+
+indice = IndiceAutocomplete()
+
+
+def sugerir(texto, limite=10):
+    """Sugestões do autocomplete a partir do índice do processo"""
+    indice.atualizar()
+    return indice.buscar(texto, limite)
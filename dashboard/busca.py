@@ -0,0 +1,200 @@
+"""
+Busca textual de produtos (nome e descrição).
+
+- PostgreSQL: índice GIN sobre to_tsvector('portuguese', unaccent(...)),
+  com ranking por ts_rank.
+- SQLite: tabela FTS5 (dashboard_produto_fts) com remove_diacritics,
+  mantida por triggers e ranqueada por bm25.
+- Outros bancos: icontains, como antes.
+
+A última palavra é tratada como prefixo ("cafe" encontra "Cafeteira" e
+"café"), então a mesma busca serve para a listagem e para o autocomplete.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Func, Lookup, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = 'dashboard_produto_fts'
+
+# Deve ser idêntica à expressão do índice produto_busca_gin (migração 0007)
+DOCUMENTO_PG = (
+    "to_tsvector('portuguese', dashboard_unaccent("
+    "coalesce(dashboard_produto.nome, '') || ' ' || coalesce(dashboard_produto.descricao, '')))"
+)
+CONSULTA_PG = "to_tsquery('portuguese', dashboard_unaccent(%s))"
+
+# Tabela FTS5 com conteúdo externo: o texto fica só em dashboard_produto.
+# Os índices de prefixo de 2 a 4 letras atendem as primeiras teclas do
+# autocomplete, que de outra forma combinariam milhares de termos.
+SQLITE_TABELA = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        nome, descricao,
+        content='dashboard_produto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+"""
+
+# Triggers em vez de sinais: queryset.update() e bulk_create também
+# passam por eles. Mudanças de estoque não reindexam o produto.
+# A migração 0007 cria cópias literais destes comandos; mudanças aqui
+# precisam de uma migração nova.
+SQLITE_TRIGGERS = {
+    f'{TABELA_FTS}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON dashboard_produto BEGIN
+            INSERT INTO {TABELA_FTS}(rowid, nome, descricao)
+            VALUES (new.id, new.nome, new.descricao);
+        END
+    """,
+    f'{TABELA_FTS}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON dashboard_produto BEGIN
+            INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, descricao)
+            VALUES ('delete', old.id, old.nome, old.descricao);
+        END
+    """,
+    f'{TABELA_FTS}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF nome, descricao ON dashboard_produto BEGIN
+            INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, descricao)
+            VALUES ('delete', old.id, old.nome, old.descricao);
+            INSERT INTO {TABELA_FTS}(rowid, nome, descricao)
+            VALUES (new.id, new.nome, new.descricao);
+        END
+    """,
+}
+
+_fts_sqlite = {}
+
+
+class ColunaFts(TextField):
+    """Coluna oculta de uma tabela FTS5 (com o nome da tabela), alvo do MATCH e do bm25"""
+
+
+@ColunaFts.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+def sincronizar_fts_sqlite(conexao):
+    """
+    Recria os triggers da busca no SQLite se tiverem sumido e, nesse caso,
+    reconstrói o índice. Necessário porque as migrações do SQLite recriam
+    a tabela de produtos (e apagam seus triggers) ao alterar colunas.
+    """
+    with conexao.cursor() as cursor:
+        if TABELA_FTS not in conexao.introspection.table_names(cursor):
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        faltando = [sql for nome, sql in SQLITE_TRIGGERS.items() if nome not in existentes]
+        for sql in faltando:
+            cursor.execute(sql)
+        if faltando:
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def termos(busca):
+    """Palavras da busca, sem pontuação nem operadores"""
+    return re.findall(r'\w+', busca or '')
+
+
+def _tem_fts(alias):
+    # A tabela não existe se o SQLite não tiver FTS5
+    if alias not in _fts_sqlite:
+        with connections[alias].cursor() as cursor:
+            _fts_sqlite[alias] = TABELA_FTS in connections[alias].introspection.table_names(cursor)
+    return _fts_sqlite[alias]
+
+
+def _consulta_fts(palavras, coluna=None):
+    # Só a última palavra pode estar incompleta; buscar as demais como
+    # prefixo obrigaria o FTS5 a juntar as listas de muitos termos
+    consulta = ' '.join(f'"{palavra}"' for palavra in palavras[:-1])
+    consulta = f'{consulta} "{palavras[-1]}"*'.strip()
+    return f'{{{coluna}}} : ({consulta})' if coluna else consulta
+
+
+def buscar_produtos(queryset, busca):
+    """Filtra o queryset de produtos pela busca, do mais relevante ao menos"""
+    palavras = termos(busca)
+    if not palavras:
+        return queryset.none()
+
+    alias = queryset.db
+    vendor = connections[alias].vendor
+
+    if vendor == 'postgresql':
+        consulta = ' & '.join(palavras[:-1] + [f'{palavras[-1]}:*'])
+        return queryset.filter(
+            RawSQL(f'{DOCUMENTO_PG} @@ {CONSULTA_PG}', [consulta], output_field=BooleanField())
+        ).annotate(
+            relevancia=RawSQL(f'ts_rank({DOCUMENTO_PG}, {CONSULTA_PG})', [consulta], output_field=FloatField())
+        ).order_by('-relevancia', '-criado_em')
+
+    if vendor == 'sqlite' and _tem_fts(alias):
+        # Junção com a tabela FTS (modelo ProdutoIndiceBusca) para o MATCH
+        # guiar a consulta e o bm25 ficar disponível; o nome pesa mais que a
+        # descrição
+        return queryset.filter(indice_busca__documento__match=_consulta_fts(palavras)).annotate(
+            relevancia=-Func(
+                'indice_busca__documento', Value(10.0), Value(1.0), function='bm25', output_field=FloatField()
+            )
+        ).order_by('-relevancia', '-criado_em')
+
+    filtro = Q()
+    for palavra in palavras:
+        filtro &= Q(nome__icontains=palavra) | Q(descricao__icontains=palavra)
+    return queryset.filter(filtro).order_by('-criado_em')
+
+
+def _candidatos(alias, consulta, antes_de, quantidade):
+    # Uma página de ids que casam com a consulta, dos mais recentes aos mais antigos
+    sql = f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s'
+    parametros = [consulta]
+    if antes_de is not None:
+        sql += ' AND rowid < %s'
+        parametros.append(antes_de)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'{sql} ORDER BY rowid DESC LIMIT %s', [*parametros, quantidade])
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def sugerir_produtos(queryset, busca, limite=10):
+    """
+    Sugestões para o autocomplete.
+
+    No SQLite evita o bm25, que percorre todas as ocorrências de termos
+    muito comuns: primeiro vêm os produtos cujo nome casa com a busca e
+    depois os que casam só pela descrição, os mais recentes primeiro.
+    Os candidatos são lidos do índice em páginas de algumas dezenas e
+    filtrados pelo queryset (ex.: só ativos), até completar o limite.
+    """
+    palavras = termos(busca)
+    alias = queryset.db
+    if not palavras or connections[alias].vendor != 'sqlite' or not _tem_fts(alias):
+        return list(buscar_produtos(queryset, busca)[:limite])
+
+    sugestoes = []
+    vistos = set()
+    por_pagina = limite * 5
+    for coluna in ('nome', None):
+        consulta = _consulta_fts(palavras, coluna)
+        antes_de = None
+        while len(sugestoes) < limite:
+            ids = _candidatos(alias, consulta, antes_de, por_pagina)
+            for sugestao in queryset.filter(id__in=ids).order_by('-id'):
+                if sugestao['id'] not in vistos and len(sugestoes) < limite:
+                    vistos.add(sugestao['id'])
+                    sugestoes.append(sugestao)
+            if len(ids) < por_pagina:
+                break
+            antes_de = ids[-1]
+        if len(sugestoes) >= limite:
+            break
+    return sugestoes
@@ -0,0 +1,173 @@
+"""
+Cache em disco dos relatórios PDF, endereçado pelo conteúdo.
+
+A chave de um relatório é o hash do tipo, dos parâmetros normalizados e
+de uma versão dos dados lida do banco (contagem, maior id e última
+alteração das linhas que entram no relatório). Enquanto os dados não
+mudam, a chave é a mesma e o PDF é servido do disco; ela também é usada
+como ETag. O diretório tem tamanho limitado e descarta primeiro os
+arquivos usados há mais tempo (LRU pela data de modificação).
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .metricas import registrar_cache
+from .relatorios import (
+    PARAMETROS, gerar_relatorio, periodo_vendas,
+    produtos_do_relatorio, vendas_do_relatorio,
+)
+
+TAMANHO_MAXIMO_PADRAO = 200 * 1024 * 1024
+
+
+def diretorio():
+    """Diretório dos PDFs em cache"""
+    padrao = Path(settings.BASE_DIR) / 'cache' / 'relatorios'
+    return Path(settings.ECOMMERCE_SETTINGS.get('RELATORIOS_CACHE_DIR', padrao))
+
+
+def tamanho_maximo():
+    """Tamanho máximo do diretório de cache, em bytes"""
+    return settings.ECOMMERCE_SETTINGS.get('RELATORIOS_CACHE_TAMANHO_MAXIMO', TAMANHO_MAXIMO_PADRAO)
+
+
+def _parametros_normalizados(tipo, parametros):
+    normalizados = {
+        nome: str(parametros.get(nome) or '')
+        for nome in PARAMETROS[tipo]
+    }
+    if tipo == 'vendas':
+        # O período padrão depende do dia, então entra já resolvido
+        normalizados['data_inicio'], normalizados['data_fim'] = periodo_vendas(parametros)
+    if tipo == 'estoque':
+        normalizados['apenas_baixo'] = normalizados['apenas_baixo'].lower()
+    return normalizados
+
+
+def _versao_dados(tipo, parametros):
+    if tipo == 'vendas':
+        # Os nomes de produto e categoria também aparecem no relatório
+        versao = vendas_do_relatorio(parametros).aggregate(
+            quantidade=Count('id'),
+            ultimo_id=Max('id'),
+            alterada=Max('atualizado_em'),
+            produto_alterado=Max('produto__atualizado_em'),
+            categoria_alterada=Max('produto__categoria__atualizado_em'),
+        )
+    else:
+        versao = produtos_do_relatorio(parametros).aggregate(
+            quantidade=Count('id'),
+            ultimo_id=Max('id'),
+            alterado=Max('atualizado_em'),
+            categoria_alterada=Max('categoria__atualizado_em'),
+        )
+    return {nome: str(valor) for nome, valor in versao.items()}
+
+
+def chave(tipo, parametros):
+    """Impressão digital do relatório para os parâmetros e dados atuais"""
+    conteudo = json.dumps({
+        'tipo': tipo,
+        'parametros': _parametros_normalizados(tipo, parametros),
+        'versao': _versao_dados(tipo, parametros),
+    }, sort_keys=True)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def _caminhos(chave_relatorio):
+    base = diretorio()
+    return base / f'{chave_relatorio}.pdf', base / f'{chave_relatorio}.json'
+
+
+def _gravar_atomico(caminho, conteudo):
+    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def obter(chave_relatorio):
+    """Abre o PDF em cache; retorna (arquivo, nome_do_arquivo) ou None"""
+    caminho_pdf, caminho_meta = _caminhos(chave_relatorio)
+    try:
+        # Aberto antes de qualquer descarte concorrente
+        arquivo = open(caminho_pdf, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        meta = json.loads(caminho_meta.read_text())
+    except (FileNotFoundError, ValueError):
+        arquivo.close()
+        return None
+
+    # Marca como usado recentemente
+    try:
+        os.utime(caminho_pdf)
+    except FileNotFoundError:
+        pass
+    return arquivo, meta['nome_arquivo']
+
+
+def guardar(chave_relatorio, pdf, nome_arquivo):
+    """Grava um PDF no cache e descarta os mais antigos se passar do limite"""
+    caminho_pdf, caminho_meta = _caminhos(chave_relatorio)
+    caminho_pdf.parent.mkdir(parents=True, exist_ok=True)
+    # Metadados primeiro: um PDF visível sempre tem o nome do arquivo
+    _gravar_atomico(caminho_meta, json.dumps({'nome_arquivo': nome_arquivo}).encode())
+    _gravar_atomico(caminho_pdf, pdf)
+    descartar_antigos()
+
+
+def descartar_antigos(limite=None):
+    """Remove os PDFs usados há mais tempo até o diretório caber no limite"""
+    if limite is None:
+        limite = tamanho_maximo()
+
+    arquivos = []
+    for entrada in os.scandir(diretorio()):
+        if entrada.name.endswith('.pdf'):
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, Path(entrada.path)))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite:
+            break
+        for antigo in (caminho, caminho.with_suffix('.json')):
+            try:
+                antigo.unlink()
+            except FileNotFoundError:
+                pass
+        total -= tamanho
+
+
+def obter_ou_gerar(tipo, parametros, chave_relatorio=None):
+    """
+    Retorna (arquivo, nome_do_arquivo) do relatório, gerando o PDF só
+    quando não houver uma cópia para a versão atual dos dados.
+    """
+    if chave_relatorio is None:
+        chave_relatorio = chave(tipo, parametros)
+
+    encontrado = obter(chave_relatorio)
+    registrar_cache('pdf', encontrado is not None)
+    if encontrado is not None:
+        return encontrado
+
+    pdf, nome_arquivo = gerar_relatorio(tipo, parametros)
+    guardar(chave_relatorio, pdf, nome_arquivo)
+    return io.BytesIO(pdf), nome_arquivo
@@ -0,0 +1,153 @@
+"""
+Cache das APIs do dashboard com invalidação por contadores de geração.
+
+Cada tabela (produto, venda, categoria) tem um contador no cache que é
+incrementado quando seus dados mudam. A chave de uma resposta em cache
+inclui as gerações das tabelas das quais ela depende, então qualquer
+escrita torna as respostas antigas inalcançáveis sem precisar apagá-las.
+A mesma chave serve de ETag, então GETs condicionais são respondidos com
+304 sem tocar no banco.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from .metricas import registrar_cache
+
+PREFIXO_GERACAO = 'dashboard:geracao:'
+PREFIXO_RESPOSTA = 'dashboard:resposta:'
+
+
+def _chave_geracao(tabela):
+    return f'{PREFIXO_GERACAO}{tabela}'
+
+
+def _geracao_inicial():
+    # Parte de um valor único para não colidir com gerações de antes de
+    # uma limpeza do cache (ou de outro processo, no cache local)
+    return time.time_ns()
+
+
+def geracoes(*tabelas):
+    """Retorna as gerações atuais das tabelas, na ordem pedida"""
+    chaves = [_chave_geracao(tabela) for tabela in tabelas]
+    valores = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in valores:
+            cache.add(chave, _geracao_inicial(), timeout=None)
+            valores[chave] = cache.get(chave)
+    return [valores[chave] for chave in chaves]
+
+
+def _incrementar(tabelas):
+    for tabela in tabelas:
+        chave = _chave_geracao(tabela)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.add(chave, _geracao_inicial(), timeout=None)
+
+
+def invalidar(*tabelas):
+    """
+    Avança a geração das tabelas quando a transação atual for confirmada.
+
+    Incrementar antes do commit permitiria que uma leitura concorrente
+    guardasse dados antigos já com a geração nova.
+    """
+    transaction.on_commit(lambda: _incrementar(tabelas))
+
+
+def _chave(nome, tabelas, request, kwargs):
+    """Chave da resposta: view, dia, gerações das tabelas e parâmetros"""
+    parametros = sorted(request.GET.lists())
+    partes = [
+        nome,
+        timezone.localdate().isoformat(),
+        *map(str, geracoes(*tabelas)),
+        repr(parametros),
+        repr(sorted(kwargs.items())),
+    ]
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+
+def _etag(chave, request):
+    # JSON e API navegável são representações diferentes
+    renderer = getattr(request, 'accepted_renderer', None)
+    return f'"{chave}-{getattr(renderer, "format", "")}"'
+
+
+def _nao_modificado(request, etag):
+    """Resposta 304 se o If-None-Match do GET já tiver esta ETag"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is not None:
+        resposta['ETag'] = etag
+    return resposta
+
+
+def cache_por_geracao(*tabelas):
+    """
+    Decorator para views de API (abaixo de @api_view) cujas respostas
+    dependem apenas das tabelas informadas, dos parâmetros e do dia atual.
+
+    As respostas levam uma ETag derivada da mesma chave, e um GET com
+    If-None-Match igual recebe 304 sem ler o cache nem executar a view.
+    """
+    def decorador(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            chave = _chave(view.__name__, tabelas, request, kwargs)
+            etag = _etag(chave, request)
+            nao_modificado = _nao_modificado(request, etag)
+            if nao_modificado is not None:
+                return nao_modificado
+
+            dados = cache.get(PREFIXO_RESPOSTA + chave)
+            registrar_cache('api', dados is not None)
+            if dados is not None:
+                resposta = Response(dados)
+            else:
+                resposta = view(request, *args, **kwargs)
+                if resposta.status_code == 200:
+                    cache.set(PREFIXO_RESPOSTA + chave, resposta.data, settings.CACHE_TTL)
+            if resposta.status_code == 200:
+                resposta['ETag'] = etag
+            return resposta
+        return wrapper
+    return decorador
+
+
+class GeracaoCondicionalMixin:
+    """
+    GETs condicionais para ViewSets: list e retrieve respondem com uma
+    ETag derivada das gerações de `tabelas_geracao`, e um If-None-Match
+    igual recebe 304 sem consultar o banco nem serializar.
+    """
+    tabelas_geracao = ()
+
+    def _condicional(self, handler, request, *args, **kwargs):
+        chave = _chave(f'{self.basename}-{self.action}', self.tabelas_geracao, request, kwargs)
+        etag = _etag(chave, request)
+        nao_modificado = _nao_modificado(request, etag)
+        if nao_modificado is not None:
+            return nao_modificado
+
+        resposta = handler(request, *args, **kwargs)
+        if resposta.status_code == 200:
+            resposta['ETag'] = etag
+        return resposta
+
+    def list(self, request, *args, **kwargs):
+        return self._condicional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._condicional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,348 @@
+"""
+Manutenção incremental dos relatórios consolidados de vendas.
+
+Cada venda gravada soma (ou subtrai) seus valores na linha do dia em
+RelatorioVendas e na linha do dia/produto em RelatorioVendasProduto,
+de forma que o dashboard e os relatórios leiam poucas linhas
+consolidadas em vez de agregar toda a tabela de vendas.
+
+Os totais de cada produto (faturamento, número de vendas, unidades e
+data da última venda) ficam no próprio Produto e são mantidos da mesma
+forma, com UPDATEs atômicos. Os de cada categoria ficam em
+RelatorioCategoria, que também acompanha quantos produtos da categoria
+já venderam e quantos estão ativos; por isso produtos que mudam de
+categoria ou de situação também o ajustam.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .caching import invalidar
+from .models import (
+    CONTADORES_VENDAS, Categoria, Produto, RelatorioCategoria, RelatorioVendas,
+    RelatorioVendasProduto, Venda,
+)
+from .utils import filtro_periodo
+
+
+def _aplicar(queryset, criar, total, quantidade_vendas, produtos_vendidos):
+    """Soma os deltas na linha consolidada, criando-a se ainda não existir"""
+    deltas = {
+        'total_vendas': F('total_vendas') + total,
+        'quantidade_vendas': F('quantidade_vendas') + quantidade_vendas,
+        'produtos_vendidos': F('produtos_vendidos') + produtos_vendidos,
+    }
+    if queryset.update(**deltas):
+        return
+
+    # Não há o que subtrair de uma linha inexistente
+    if quantidade_vendas <= 0:
+        return
+
+    try:
+        with transaction.atomic():
+            criar(
+                total_vendas=total,
+                quantidade_vendas=quantidade_vendas,
+                produtos_vendidos=produtos_vendidos,
+            )
+    except IntegrityError:
+        # Outra transação criou a linha do dia ao mesmo tempo
+        queryset.update(**deltas)
+
+
+def aplicar_delta_dia(data, total, quantidade_vendas, produtos_vendidos):
+    """Aplica um delta no consolidado diário"""
+    _aplicar(
+        RelatorioVendas.objects.filter(data=data),
+        lambda **valores: RelatorioVendas.objects.create(data=data, **valores),
+        total, quantidade_vendas, produtos_vendidos,
+    )
+
+
+def aplicar_delta_produto(data, produto_id, total, quantidade_vendas, produtos_vendidos):
+    """Aplica um delta no consolidado diário do produto"""
+    _aplicar(
+        RelatorioVendasProduto.objects.filter(data=data, produto_id=produto_id),
+        lambda **valores: RelatorioVendasProduto.objects.create(
+            data=data, produto_id=produto_id, **valores
+        ),
+        total, quantidade_vendas, produtos_vendidos,
+    )
+
+
+def aplicar_delta_contadores(produto_id, total, quantidade_vendas, produtos_vendidos, data_venda):
+    """
+    Aplica um delta nos contadores de vendas do produto. Em somas,
+    data_venda é a venda mais recente do delta; em subtrações a última
+    venda é relida da tabela de vendas.
+
+    Retorna (categoria_id, delta de produtos com vendas) para o
+    consolidado da categoria do produto: +1 quando o produto vende pela
+    primeira vez, -1 quando perde a última venda.
+    """
+    deltas = {
+        'total_vendas': F('total_vendas') + total,
+        'quantidade_vendas': F('quantidade_vendas') + quantidade_vendas,
+        'produtos_vendidos': F('produtos_vendidos') + produtos_vendidos,
+    }
+    if quantidade_vendas > 0:
+        deltas['ultima_venda'] = Greatest(Coalesce('ultima_venda', data_venda), data_venda)
+    else:
+        deltas['ultima_venda'] = Subquery(
+            Venda.objects.filter(produto_id=OuterRef('pk')).order_by('-data_venda').values('data_venda')[:1]
+        )
+    produto = Produto.objects.filter(pk=produto_id)
+    produto.update(**deltas)
+
+    # A linha do produto segue travada pelo UPDATE, então a releitura
+    # enxerga exatamente o efeito deste delta
+    atual = produto.values_list('categoria_id', 'quantidade_vendas').first()
+    if atual is None:
+        return None, 0
+    categoria_id, vendas = atual
+    if quantidade_vendas > 0 and vendas == quantidade_vendas:
+        return categoria_id, 1
+    if quantidade_vendas < 0 and vendas == 0:
+        return categoria_id, -1
+    return categoria_id, 0
+
+
+def aplicar_delta_categoria(categoria_id, total=0, quantidade_vendas=0, produtos_vendidos=0,
+                            produtos_com_vendas=0, produtos_ativos=0):
+    """Aplica um delta no consolidado da categoria, criando sua linha se ainda não existir"""
+    valores = {
+        'total_vendas': total,
+        'quantidade_vendas': quantidade_vendas,
+        'produtos_vendidos': produtos_vendidos,
+        'produtos_com_vendas': produtos_com_vendas,
+        'produtos_ativos': produtos_ativos,
+    }
+    deltas = {campo: F(campo) + valor for campo, valor in valores.items() if valor}
+    if not deltas:
+        return
+    linha = RelatorioCategoria.objects.filter(categoria_id=categoria_id)
+    if linha.update(**deltas):
+        return
+
+    # Não há o que subtrair de uma linha inexistente
+    if any(valor < 0 for valor in valores.values()):
+        return
+
+    try:
+        with transaction.atomic():
+            RelatorioCategoria.objects.create(categoria_id=categoria_id, **valores)
+    except IntegrityError:
+        # Outra transação criou a linha da categoria ao mesmo tempo
+        linha.update(**deltas)
+
+
+def _participacao(produto, sinal):
+    """O que um produto (dicionário com categoria, situação e contadores) soma na sua categoria"""
+    return {
+        'total': sinal * produto['total_vendas'],
+        'quantidade_vendas': sinal * produto['quantidade_vendas'],
+        'produtos_vendidos': sinal * produto['produtos_vendidos'],
+        'produtos_com_vendas': sinal * (produto['quantidade_vendas'] > 0),
+        'produtos_ativos': sinal * produto['ativo'],
+    }
+
+
+def atualizar_categoria_do_produto(anterior, atual):
+    """
+    Ajusta o consolidado por categoria a um produto criado (anterior é
+    None), movido de categoria ou ativado/desativado. anterior e atual
+    têm categoria_id, ativo, total_vendas, quantidade_vendas e
+    produtos_vendidos do produto.
+    """
+    if anterior is None:
+        aplicar_delta_categoria(atual['categoria_id'], **_participacao(atual, 1))
+    elif anterior['categoria_id'] != atual['categoria_id']:
+        aplicar_delta_categoria(anterior['categoria_id'], **_participacao(anterior, -1))
+        aplicar_delta_categoria(atual['categoria_id'], **_participacao(atual, 1))
+    elif anterior['ativo'] != atual['ativo']:
+        aplicar_delta_categoria(atual['categoria_id'], produtos_ativos=1 if atual['ativo'] else -1)
+
+
+def recontar_produtos_ativos(categoria_ids):
+    """Recalcula os produtos ativos das categorias (após UPDATEs em massa de Produto.ativo)"""
+    categoria_ids = set(categoria_ids)
+    RelatorioCategoria.objects.bulk_create(
+        [RelatorioCategoria(categoria_id=categoria_id) for categoria_id in categoria_ids],
+        ignore_conflicts=True,
+    )
+    ativos = Produto.objects.filter(categoria_id=OuterRef('categoria_id'), ativo=True).order_by().values(
+        'categoria_id'
+    ).annotate(total=Count('id')).values('total')
+    RelatorioCategoria.objects.filter(categoria_id__in=categoria_ids).update(
+        produtos_ativos=Coalesce(Subquery(ativos), 0)
+    )
+
+
+def aplicar_delta(data, produto_id, total, quantidade_vendas, produtos_vendidos):
+    """Aplica um delta no consolidado diário e no consolidado por produto"""
+    aplicar_delta_dia(data, total, quantidade_vendas, produtos_vendidos)
+    aplicar_delta_produto(data, produto_id, total, quantidade_vendas, produtos_vendidos)
+
+
+def registrar_venda(venda):
+    """Soma uma venda gravada nos relatórios consolidados e nos contadores do produto e da categoria"""
+    aplicar_delta(
+        timezone.localdate(venda.data_venda),
+        venda.produto_id,
+        venda.valor_total,
+        1,
+        venda.quantidade,
+    )
+    categoria_id, produtos_com_vendas = aplicar_delta_contadores(
+        venda.produto_id, venda.valor_total, 1, venda.quantidade, venda.data_venda
+    )
+    if categoria_id is not None:
+        aplicar_delta_categoria(categoria_id, venda.valor_total, 1, venda.quantidade, produtos_com_vendas)
+
+
+def remover_venda(venda):
+    """Subtrai uma venda excluída ou alterada dos consolidados e dos contadores do produto e da categoria"""
+    aplicar_delta(
+        timezone.localdate(venda.data_venda),
+        venda.produto_id,
+        -venda.valor_total,
+        -1,
+        -venda.quantidade,
+    )
+    categoria_id, produtos_com_vendas = aplicar_delta_contadores(
+        venda.produto_id, -venda.valor_total, -1, -venda.quantidade, venda.data_venda
+    )
+    if categoria_id is not None:
+        aplicar_delta_categoria(categoria_id, -venda.valor_total, -1, -venda.quantidade, produtos_com_vendas)
+
+
+@transaction.atomic
+def reconstruir(data_inicio=None, data_fim=None):
+    """
+    Recalcula os relatórios consolidados a partir da tabela de vendas.
+
+    Sem datas, reconstrói todo o histórico. Retorna o número de dias gerados.
+    """
+    vendas = Venda.objects.filter(filtro_periodo('data_venda', data_inicio, data_fim))
+    dias = RelatorioVendas.objects.all()
+    dias_produto = RelatorioVendasProduto.objects.all()
+
+    if data_inicio:
+        dias = dias.filter(data__gte=data_inicio)
+        dias_produto = dias_produto.filter(data__gte=data_inicio)
+    if data_fim:
+        dias = dias.filter(data__lte=data_fim)
+        dias_produto = dias_produto.filter(data__lte=data_fim)
+
+    dias.delete()
+    dias_produto.delete()
+
+    por_produto = vendas.annotate(
+        dia=TruncDate('data_venda', tzinfo=timezone.get_current_timezone())
+    ).values('dia', 'produto_id').annotate(
+        total=Sum('valor_total'),
+        numero=Count('id'),
+        itens=Sum('quantidade'),
+    ).order_by('dia', 'produto_id')
+
+    linhas_produto = []
+    linhas_dia = {}
+    for item in por_produto.iterator(chunk_size=2000):
+        linhas_produto.append(RelatorioVendasProduto(
+            data=item['dia'],
+            produto_id=item['produto_id'],
+            total_vendas=item['total'],
+            quantidade_vendas=item['numero'],
+            produtos_vendidos=item['itens'],
+        ))
+        dia = linhas_dia.setdefault(item['dia'], RelatorioVendas(
+            data=item['dia'],
+            total_vendas=Decimal('0'),
+            quantidade_vendas=0,
+            produtos_vendidos=0,
+        ))
+        dia.total_vendas += item['total']
+        dia.quantidade_vendas += item['numero']
+        dia.produtos_vendidos += item['itens']
+
+        if len(linhas_produto) >= 2000:
+            RelatorioVendasProduto.objects.bulk_create(linhas_produto)
+            linhas_produto = []
+
+    RelatorioVendasProduto.objects.bulk_create(linhas_produto)
+    RelatorioVendas.objects.bulk_create(linhas_dia.values(), batch_size=2000)
+    invalidar('venda')
+
+    return len(linhas_dia)
+
+
+@transaction.atomic
+def reconciliar_contadores():
+    """
+    Recalcula os contadores de vendas dos produtos a partir da tabela de
+    vendas e corrige os que divergirem. Retorna os ids corrigidos.
+    """
+    por_produto = {
+        item['produto_id']: (item['total'], item['numero'], item['itens'], item['ultima'])
+        for item in Venda.objects.values('produto_id').annotate(
+            total=Sum('valor_total'),
+            numero=Count('id'),
+            itens=Sum('quantidade'),
+            ultima=Max('data_venda'),
+        ).order_by().iterator(chunk_size=2000)
+    }
+    zerado = (Decimal('0'), 0, 0, None)
+
+    corrigidos = []
+    atuais = Produto.objects.select_for_update().values_list('id', *CONTADORES_VENDAS)
+    for produto_id, *valores in atuais.iterator(chunk_size=2000):
+        esperado = por_produto.get(produto_id, zerado)
+        if tuple(valores) != esperado:
+            corrigidos.append(Produto(id=produto_id, **dict(zip(CONTADORES_VENDAS, esperado))))
+
+    Produto.objects.bulk_update(corrigidos, CONTADORES_VENDAS, batch_size=1000)
+    if corrigidos:
+        invalidar('produto')
+    return [produto.id for produto in corrigidos]
+
+
+@transaction.atomic
+def reconstruir_categorias():
+    """
+    Recalcula o consolidado por categoria a partir da tabela de vendas e
+    dos produtos. Retorna o número de categorias.
+    """
+    por_categoria = {
+        item['produto__categoria_id']: item
+        for item in Venda.objects.values('produto__categoria_id').annotate(
+            total=Sum('valor_total'),
+            numero=Count('id'),
+            itens=Sum('quantidade'),
+            produtos=Count('produto_id', distinct=True),
+        ).order_by()
+    }
+    ativos = dict(
+        Produto.objects.filter(ativo=True).values('categoria_id').annotate(
+            total=Count('id')
+        ).values_list('categoria_id', 'total').order_by()
+    )
+
+    RelatorioCategoria.objects.all().delete()
+    linhas = []
+    for categoria_id in Categoria.objects.values_list('id', flat=True):
+        item = por_categoria.get(categoria_id, {})
+        linhas.append(RelatorioCategoria(
+            categoria_id=categoria_id,
+            total_vendas=item.get('total', Decimal('0')),
+            quantidade_vendas=item.get('numero', 0),
+            produtos_vendidos=item.get('itens', 0),
+            produtos_com_vendas=item.get('produtos', 0),
+            produtos_ativos=ativos.get(categoria_id, 0),
+        ))
+    RelatorioCategoria.objects.bulk_create(linhas, batch_size=1000)
+    invalidar('categoria')
+    return len(linhas)
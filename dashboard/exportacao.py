@@ -0,0 +1,112 @@
+"""
+Exportação de vendas em CSV e XLSX.
+
+As linhas são lidas com values_list().iterator(), em blocos, e escritas
+à medida que são consumidas: o CSV sai por um StreamingHttpResponse e o
+XLSX é montado pelo openpyxl em modo write-only num arquivo temporário.
+O uso de memória não cresce com o número de vendas exportadas.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+TAMANHO_BLOCO = 2000
+
+# Limite de linhas de uma planilha do Excel (contando o cabeçalho)
+LINHAS_POR_PLANILHA = 1048576
+
+COLUNAS = [
+    ('ID', 'id'),
+    ('Data', 'data_venda'),
+    ('Produto', 'produto__nome'),
+    ('Categoria', 'produto__categoria__nome'),
+    ('Quantidade', 'quantidade'),
+    ('Preço Unitário', 'preco_unitario'),
+    ('Valor Total', 'valor_total'),
+    ('Observações', 'observacoes'),
+]
+
+FORMATOS = ('csv', 'xlsx')
+
+_CAMPOS = [campo for _, campo in COLUNAS]
+_POSICAO_DATA = _CAMPOS.index('data_venda')
+
+
+def _linhas(queryset):
+    """Linhas da exportação, com a data no fuso local e sem tzinfo"""
+    for linha in queryset.values_list(*_CAMPOS).iterator(chunk_size=TAMANHO_BLOCO):
+        linha = list(linha)
+        linha[_POSICAO_DATA] = timezone.localtime(linha[_POSICAO_DATA]).replace(tzinfo=None)
+        yield linha
+
+
+def _nome_arquivo(extensao):
+    return f'vendas_{timezone.localtime().strftime("%Y%m%d_%H%M%S")}.{extensao}'
+
+
+class _Eco:
+    """Pseudo-buffer: devolve o que o csv.writer escreve"""
+
+    def write(self, valor):
+        return valor
+
+
+def _csv(queryset):
+    escritor = csv.writer(_Eco())
+    # BOM para o Excel reconhecer o UTF-8
+    bloco = ['\ufeff' + escritor.writerow([titulo for titulo, _ in COLUNAS])]
+    for linha in _linhas(queryset):
+        linha[_POSICAO_DATA] = linha[_POSICAO_DATA].strftime('%Y-%m-%d %H:%M:%S')
+        bloco.append(escritor.writerow(linha))
+        # Envia várias linhas por vez em vez de uma escrita por linha
+        if len(bloco) >= 500:
+            yield ''.join(bloco)
+            bloco = []
+    yield ''.join(bloco)
+
+
+def exportar_csv(queryset):
+    """Resposta com as vendas em CSV, gerada sob demanda"""
+    response = StreamingHttpResponse(_csv(queryset), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_nome_arquivo("csv")}"'
+    return response
+
+
+def exportar_xlsx(queryset):
+    """Resposta com as vendas em XLSX (openpyxl write-only)"""
+    planilha = Workbook(write_only=True)
+    cabecalho = [titulo for titulo, _ in COLUNAS]
+
+    aba = None
+    linhas_na_aba = LINHAS_POR_PLANILHA
+    for linha in _linhas(queryset):
+        if linhas_na_aba >= LINHAS_POR_PLANILHA:
+            aba = planilha.create_sheet(f'Vendas {len(planilha.worksheets) + 1}')
+            aba.append(cabecalho)
+            linhas_na_aba = 1
+        aba.append(linha)
+        linhas_na_aba += 1
+
+    if aba is None:
+        planilha.create_sheet('Vendas 1').append(cabecalho)
+
+    # O arquivo temporário é apagado quando a resposta é fechada
+    arquivo = tempfile.TemporaryFile()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=_nome_arquivo('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def exportar(queryset, formato='csv'):
+    """Exporta as vendas no formato pedido ('csv' ou 'xlsx')"""
+    if formato == 'xlsx':
+        return exportar_xlsx(queryset)
+    return exportar_csv(queryset)
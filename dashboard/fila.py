@@ -0,0 +1,140 @@
+"""
+Fila de geração de relatórios PDF.
+
+Os pedidos ficam na tabela RelatorioJob, então não é preciso um broker
+externo: a API apenas enfileira o pedido e os workers do comando
+processar_relatorios reservam os jobs com um UPDATE condicional, geram
+o PDF e gravam o arquivo em MEDIA_ROOT/relatorios/. Jobs terminados há
+mais de RELATORIOS_JOBS_RETENCAO segundos são apagados pelos próprios
+workers, com os arquivos.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RelatorioJob
+from . import cache_pdf
+
+logger = logging.getLogger(__name__)
+
+TEMPO_LIMITE_PADRAO = 600
+RETENCAO_PADRAO = 24 * 60 * 60
+
+# Segundos entre duas limpezas de jobs antigos feitas por um worker
+INTERVALO_LIMPEZA = 300
+
+
+def tempo_limite():
+    """Segundos após os quais um job em processamento é considerado abandonado"""
+    return settings.ECOMMERCE_SETTINGS.get('RELATORIOS_TEMPO_LIMITE', TEMPO_LIMITE_PADRAO)
+
+
+def retencao():
+    """Segundos que um job terminado (e o seu PDF) fica disponível para download"""
+    return settings.ECOMMERCE_SETTINGS.get('RELATORIOS_JOBS_RETENCAO', RETENCAO_PADRAO)
+
+
+def descartar_jobs_antigos():
+    """Apaga os jobs terminados há mais tempo que a retenção, e os seus arquivos"""
+    limite = timezone.now() - timedelta(seconds=retencao())
+    antigos = RelatorioJob.objects.filter(status__in=('concluido', 'erro'), concluido_em__lt=limite)
+    apagados = 0
+    for job in antigos.only('pk', 'arquivo').iterator():
+        if job.arquivo:
+            job.arquivo.delete(save=False)
+        apagados += RelatorioJob.objects.filter(pk=job.pk).delete()[0]
+    return apagados
+
+
+def enfileirar(tipo, parametros):
+    """
+    Cria um job pendente e retorna-o. Se o PDF já estiver no cache em
+    disco, o job é concluído na hora, sem passar pelos workers.
+    
+    Parâmetros inválidos levantam ValueError ou ValidationError antes de
+    o job ser criado.
+    """
+    chave_relatorio = cache_pdf.chave(tipo, parametros)
+    job = RelatorioJob.objects.create(tipo=tipo, parametros=parametros)
+    encontrado = cache_pdf.obter(chave_relatorio)
+    if encontrado is not None:
+        arquivo, nome_arquivo = encontrado
+        with arquivo:
+            _concluir(job, arquivo.read(), nome_arquivo)
+    return job
+
+
+def _disponiveis():
+    # Pendentes, ou em processamento por um worker que morreu
+    limite = timezone.now() - timedelta(seconds=tempo_limite())
+    return Q(status='pendente') | Q(status='processando', iniciado_em__lt=limite)
+
+
+def reservar_proximo():
+    """Reserva o job disponível mais antigo para este worker (ou None)"""
+    candidatos = RelatorioJob.objects.filter(_disponiveis()).order_by(
+        'criado_em'
+    ).values_list('pk', flat=True)[:10]
+
+    for pk in candidatos:
+        # Só um worker consegue mudar o status; os demais tentam o próximo
+        reservado = RelatorioJob.objects.filter(_disponiveis(), pk=pk).update(
+            status='processando',
+            iniciado_em=timezone.now(),
+        )
+        if reservado:
+            return RelatorioJob.objects.get(pk=pk)
+    return None
+
+
+def processar(job):
+    """Gera o PDF do job e grava o resultado"""
+    try:
+        arquivo, nome_arquivo = cache_pdf.obter_ou_gerar(job.tipo, job.parametros)
+        with arquivo:
+            pdf = arquivo.read()
+    except Exception as e:
+        logger.exception('Erro ao gerar relatório %s', job.pk)
+        RelatorioJob.objects.filter(pk=job.pk).update(
+            status='erro',
+            erro=str(e),
+            concluido_em=timezone.now(),
+        )
+        return
+
+    _concluir(job, pdf, nome_arquivo)
+
+
+def _concluir(job, pdf, nome_arquivo):
+    job.arquivo.save(nome_arquivo, ContentFile(pdf), save=False)
+    job.nome_arquivo = nome_arquivo
+    job.status = 'concluido'
+    job.concluido_em = timezone.now()
+    job.save(update_fields=['arquivo', 'nome_arquivo', 'status', 'concluido_em'])
+
+
+def executar_trabalhador(intervalo=1.0, parar_quando_vazia=False):
+    """Laço de um worker: processa jobs até a fila esvaziar (ou para sempre)"""
+    processados = 0
+    ultima_limpeza = None
+    while True:
+        close_old_connections()
+        job = reservar_proximo()
+        if job is None:
+            # Fila vazia: hora de apagar os jobs expirados
+            if ultima_limpeza is None or time.monotonic() - ultima_limpeza >= INTERVALO_LIMPEZA:
+                descartar_jobs_antigos()
+                ultima_limpeza = time.monotonic()
+            if parar_quando_vazia:
+                return processados
+            time.sleep(intervalo)
+            continue
+
+        processar(job)
+        processados += 1
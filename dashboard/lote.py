@@ -0,0 +1,171 @@
+"""
+Registro de vendas em lote.
+
+Valida todos os itens contra um único mapa de produtos, agrupa a baixa de
+estoque por produto e grava as vendas com bulk_create, tudo em uma única
+transação. Itens inválidos são devolvidos com o índice e o motivo do erro.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidar
+from .consolidacao import (
+    aplicar_delta_categoria, aplicar_delta_contadores, aplicar_delta_dia, aplicar_delta_produto,
+)
+from .models import Produto, Venda, EstoqueInsuficiente
+
+LIMITE_PADRAO = 10000
+
+
+def limite_lote():
+    """Número máximo de vendas aceitas por requisição"""
+    return settings.ECOMMERCE_SETTINGS.get('VENDAS_LOTE_LIMITE', LIMITE_PADRAO)
+
+
+def _inteiro_positivo(valor):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(valor, float) and valor != numero:
+        return None
+    return numero if numero >= 1 else None
+
+
+def _validar_item(item, produtos):
+    """Valida um item do lote; retorna (dados, erros)"""
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ['Item deve ser um objeto.']}
+
+    erros = {}
+    produto = None
+    produto_id = _inteiro_positivo(item.get('produto'))
+    if produto_id is None:
+        erros['produto'] = ['Este campo é obrigatório.']
+    else:
+        produto = produtos.get(produto_id)
+        if produto is None:
+            erros['produto'] = [f'Produto {produto_id} não encontrado.']
+        elif not produto.ativo:
+            erros['produto'] = ['Não é possível vender um produto inativo.']
+
+    quantidade = _inteiro_positivo(item.get('quantidade'))
+    if quantidade is None:
+        erros['quantidade'] = ['Informe um número inteiro maior que zero.']
+
+    preco_unitario = item.get('preco_unitario')
+    if preco_unitario in (None, ''):
+        preco_unitario = produto.preco if produto else None
+    else:
+        try:
+            preco_unitario = Decimal(str(preco_unitario)).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            preco_unitario = None
+        if preco_unitario is None or preco_unitario <= 0 or preco_unitario >= Decimal('1e8'):
+            erros['preco_unitario'] = ['Informe um preço válido.']
+
+    if erros:
+        return None, erros
+
+    return {
+        'produto': produto,
+        'quantidade': quantidade,
+        'preco_unitario': preco_unitario,
+        'observacoes': item.get('observacoes') or None,
+    }, None
+
+
+@transaction.atomic
+def registrar_vendas_em_lote(itens):
+    """
+    Registra uma lista de vendas.
+
+    Retorna (vendas_criadas, erros), onde erros é uma lista de
+    {'indice': posição do item, 'erros': {campo: [mensagens]}}.
+    """
+    ids = {_inteiro_positivo(item.get('produto')) for item in itens if isinstance(item, dict)}
+    ids.discard(None)
+    produtos = Produto.objects.select_for_update().in_bulk(ids)
+
+    erros = []
+    validos = []
+    restante = {pk: produto.estoque for pk, produto in produtos.items()}
+    for indice, item in enumerate(itens):
+        dados, erro = _validar_item(item, produtos)
+        if erro is None and restante[dados['produto'].id] < dados['quantidade']:
+            erro = {'non_field_errors': [
+                f"Estoque insuficiente. Disponível: {restante[dados['produto'].id]} unidades."
+            ]}
+        if erro is not None:
+            erros.append({'indice': indice, 'erros': erro})
+            continue
+        restante[dados['produto'].id] -= dados['quantidade']
+        validos.append((indice, dados))
+
+    # Uma baixa de estoque por produto
+    baixas = defaultdict(int)
+    for _, dados in validos:
+        baixas[dados['produto'].id] += dados['quantidade']
+    recusados = set()
+    for produto_id, quantidade in baixas.items():
+        try:
+            Produto.objects.baixar_estoque(produto_id, quantidade)
+        except EstoqueInsuficiente as e:
+            # O estoque mudou entre a leitura e a gravação
+            recusados.add(produto_id)
+            erros.extend(
+                {'indice': indice, 'erros': {'non_field_errors': [str(e)]}}
+                for indice, dados in validos if dados['produto'].id == produto_id
+            )
+        else:
+            produtos[produto_id].estoque -= quantidade
+
+    vendas = [
+        Venda(
+            produto=dados['produto'],
+            quantidade=dados['quantidade'],
+            preco_unitario=dados['preco_unitario'],
+            valor_total=dados['preco_unitario'] * dados['quantidade'],
+            observacoes=dados['observacoes'],
+        )
+        for _, dados in validos if dados['produto'].id not in recusados
+    ]
+    Venda.objects.bulk_create(vendas, batch_size=1000)
+
+    # Consolidado: um delta por dia, um por dia/produto, um por produto e um por categoria
+    por_dia = defaultdict(lambda: [Decimal('0'), 0, 0])
+    por_produto = defaultdict(lambda: [Decimal('0'), 0, 0])
+    contadores = defaultdict(lambda: [Decimal('0'), 0, 0])
+    ultima_venda = {}
+    for venda in vendas:
+        dia = timezone.localdate(venda.data_venda)
+        for delta in (por_dia[dia], por_produto[(dia, venda.produto_id)], contadores[venda.produto_id]):
+            delta[0] += venda.valor_total
+            delta[1] += 1
+            delta[2] += venda.quantidade
+        ultima_venda[venda.produto_id] = max(venda.data_venda, ultima_venda.get(venda.produto_id, venda.data_venda))
+    for dia, delta in por_dia.items():
+        aplicar_delta_dia(dia, *delta)
+    for (dia, produto_id), delta in por_produto.items():
+        aplicar_delta_produto(dia, produto_id, *delta)
+    por_categoria = defaultdict(lambda: [Decimal('0'), 0, 0, 0])
+    for produto_id, delta in contadores.items():
+        categoria_id, produtos_com_vendas = aplicar_delta_contadores(
+            produto_id, *delta, ultima_venda[produto_id]
+        )
+        categoria = por_categoria[categoria_id]
+        for posicao, valor in enumerate((*delta, produtos_com_vendas)):
+            categoria[posicao] += valor
+    for categoria_id, delta in por_categoria.items():
+        aplicar_delta_categoria(categoria_id, *delta)
+
+    # bulk_create e update não disparam sinais
+    if vendas:
+        invalidar('venda', 'produto')
+
+    erros.sort(key=lambda erro: erro['indice'])
+    return vendas, erros
@@ -0,0 +1,346 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from math import ceil
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from dashboard.consolidacao import reconciliar_contadores, reconstruir, reconstruir_categorias
+from dashboard.models import Categoria, Produto, Venda
+
+ESCALAS_PADRAO = [1000, 100000, 1000000]
+
+# (nome, url, máximo de repetições); {produto}, {inicio} e {fim} são
+# preenchidos com um produto e um período da massa de dados
+ENDPOINTS = [
+    ('produtos', '/api/produtos/', None),
+    ('produtos_busca', '/api/produtos/?busca=cafeteira', None),
+    ('produto_detalhe', '/api/produtos/{produto}/', None),
+    ('categorias', '/api/categorias/', None),
+    ('vendas', '/api/vendas/', None),
+    ('vendas_cursor', '/api/vendas/?paginacao=cursor', None),
+    ('vendas_periodo', '/api/vendas/?data_inicio={inicio}&data_fim={fim}', None),
+    ('vendas_export_csv', '/api/vendas/export/?formato=csv', 3),
+    ('dashboard_stats', '/api/dashboard/stats/', None),
+    ('grafico_vendas', '/api/dashboard/grafico-vendas/?dias=30', None),
+    ('grafico_vendas_semanal', '/api/dashboard/grafico-vendas/?dias=365&granularity=week', None),
+    ('grafico_produtos', '/api/dashboard/grafico-produtos/?limite=10', None),
+    ('grafico_categorias', '/api/dashboard/grafico-categorias/', None),
+    ('autocomplete', '/api/ajax/produtos/buscar/?q=caf', None),
+    ('relatorios', '/api/relatorios/', None),
+    ('relatorio_vendas_pdf', '/api/relatorios/vendas/pdf/', 3),
+    ('relatorio_estoque_pdf', '/api/relatorios/estoque/pdf/', 3),
+]
+
+NOMES = ['Cafeteira', 'Caneca', 'Fone', 'Teclado', 'Mouse', 'Monitor', 'Cadeira', 'Mesa', 'Panela', 'Lâmpada']
+ATRIBUTOS = ['Elétrico', 'Portátil', 'Inox', 'Sem Fio', 'Gamer', 'Azul', 'Preto', 'Premium', 'Básico']
+
+
+def semear(vendas, semente=42):
+    """
+    Cria 20 categorias, max(100, vendas / 100) produtos e `vendas` vendas
+    espalhadas pelos últimos 365 dias. A mesma semente gera sempre os
+    mesmos dados (com datas relativas ao momento da execução).
+    """
+    aleatorio = random.Random(semente)
+    categorias = Categoria.objects.bulk_create(
+        Categoria(nome=f'Categoria {numero:02d}') for numero in range(20)
+    )
+    produtos = Produto.objects.bulk_create(
+        (
+            Produto(
+                nome=f'{aleatorio.choice(NOMES)} {aleatorio.choice(ATRIBUTOS)} {numero}',
+                categoria=aleatorio.choice(categorias),
+                preco=Decimal(aleatorio.randrange(100, 100000)) / 100,
+                estoque=aleatorio.randrange(200),
+            )
+            for numero in range(max(100, vendas // 100))
+        ),
+        batch_size=2000,
+    )
+
+    agora = timezone.now().replace(microsecond=0)
+    segundos = 365 * 24 * 60 * 60
+    nome = connection.ops.quote_name
+    atualizar_data = (
+        f'UPDATE {nome(Venda._meta.db_table)} SET {nome("data_venda")} = %s WHERE {nome("id")} = %s'
+    )
+    adaptar = connection.ops.adapt_datetimefield_value
+    for inicio in range(0, vendas, 5000):
+        lote, datas = [], []
+        for _ in range(min(5000, vendas - inicio)):
+            produto = aleatorio.choice(produtos)
+            quantidade = aleatorio.randrange(1, 6)
+            lote.append(Venda(
+                produto=produto,
+                quantidade=quantidade,
+                preco_unitario=produto.preco,
+                valor_total=produto.preco * quantidade,
+            ))
+            datas.append(agora - timedelta(seconds=aleatorio.randrange(segundos)))
+        # data_venda é auto_now_add: as datas passadas são gravadas depois do INSERT
+        with transaction.atomic(), connection.cursor() as cursor:
+            Venda.objects.bulk_create(lote)
+            cursor.executemany(
+                atualizar_data,
+                [(adaptar(data), venda.pk) for venda, data in zip(lote, datas)],
+            )
+
+    reconstruir()
+    reconciliar_contadores()
+    reconstruir_categorias()
+    return {'categorias': len(categorias), 'produtos': len(produtos), 'vendas': vendas}
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) pelo método do posto mais próximo"""
+    return valores_ordenados[max(0, ceil(p / 100 * len(valores_ordenados)) - 1)]
+
+
+def _consumir(resposta):
+    """Lê a resposta inteira e retorna o tamanho do corpo em bytes"""
+    # Respostas em streaming (CSV, PDF) só são geradas ao serem lidas
+    if resposta.streaming:
+        tamanho = sum(len(parte) for parte in resposta.streaming_content)
+    else:
+        tamanho = len(resposta.content)
+    resposta.close()
+    return tamanho
+
+
+def _requisitar(cliente, url, vezes, antes, **cabecalhos):
+    # Latências (ms) e CPU média (ms) de `vezes` requisições
+    tempos = []
+    cpu = 0.0
+    for _ in range(vezes):
+        antes()
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        resposta = cliente.get(url, **cabecalhos)
+        tamanho = _consumir(resposta)
+        cpu += time.thread_time() - inicio_cpu
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return resposta, tamanho, tempos, cpu * 1000 / vezes
+
+
+def medir(cliente, url, repeticoes, esfriar=None):
+    """
+    Requisita `url` `repeticoes` vezes (após uma de aquecimento) e
+    retorna status, latências em ms (p50/p95/p99/média), CPU média,
+    tamanho da resposta, consultas por requisição e pico de memória
+    Python (numa execução à parte, com tracemalloc). `esfriar` é chamado
+    antes de cada requisição.
+
+    Se a resposta tiver ETag, mede também as mesmas requisições com
+    If-None-Match (em 'condicional').
+    """
+    esfriar = esfriar or (lambda: None)
+    esfriar()
+    _consumir(cliente.get(url))
+
+    resposta, tamanho, tempos, cpu = _requisitar(cliente, url, repeticoes, esfriar)
+    medida = {
+        'status': resposta.status_code,
+        'repeticoes': repeticoes,
+        'p50_ms': round(percentil(tempos, 50), 3),
+        'p95_ms': round(percentil(tempos, 95), 3),
+        'p99_ms': round(percentil(tempos, 99), 3),
+        'media_ms': round(sum(tempos) / len(tempos), 3),
+        'cpu_ms': round(cpu, 3),
+        'bytes': tamanho,
+    }
+
+    esfriar()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as consultas:
+            _consumir(cliente.get(url))
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    medida.update(consultas=len(consultas), memoria_pico_kib=round(pico / 1024))
+
+    # Sem esfriar: a ETag depende das gerações guardadas no cache
+    if resposta.has_header('ETag'):
+        etag = cliente.get(url)['ETag']
+        resposta, tamanho, tempos, cpu = _requisitar(
+            cliente, url, repeticoes, lambda: None, HTTP_IF_NONE_MATCH=etag
+        )
+        medida['condicional'] = {
+            'status': resposta.status_code,
+            'p50_ms': round(percentil(tempos, 50), 3),
+            'cpu_ms': round(cpu, 3),
+            'bytes': tamanho,
+        }
+    return medida
+
+
+def _commit():
+    try:
+        saida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return saida.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência, as consultas e a memória de cada endpoint da API com massas de dados '
+        'determinísticas, num banco de teste criado e apagado para cada escala'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas', type=int, nargs='+', default=ESCALAS_PADRAO,
+            help='Números de vendas das massas de dados'
+        )
+        parser.add_argument('--repeticoes', type=int, default=30, help='Requisições medidas por endpoint')
+        parser.add_argument(
+            '--endpoints', nargs='+', choices=[nome for nome, _, _ in ENDPOINTS],
+            help='Mede só estes endpoints'
+        )
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument(
+            '--com-cache', action='store_true',
+            help='Mantém os caches entre as requisições (padrão: cache limpo antes de cada uma)'
+        )
+        parser.add_argument('--saida', help='Arquivo JSON de resultados (padrão: bench-<commit>.json)')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar o p50')
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser maior que zero')
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+
+        commit = _commit()
+        resultados = {
+            'commit': commit,
+            'data': timezone.now().isoformat(timespec='seconds'),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'semente': options['semente'],
+            'cache': options['com_cache'],
+            'escalas': {},
+        }
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['endpoints'] or endpoint[0] in options['endpoints']
+        ]
+
+        diretorio_pdf = tempfile.mkdtemp(prefix='bench-relatorios-')
+        configuracao = {
+            'ALLOWED_HOSTS': ['testserver'],
+            'DEBUG': False,
+            'MIDDLEWARE': [classe for classe in settings.MIDDLEWARE if 'debug_toolbar' not in classe],
+            # Cache local: o padrão sem --com-cache o limpa a cada requisição
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+            'ECOMMERCE_SETTINGS': {**settings.ECOMMERCE_SETTINGS, 'RELATORIOS_CACHE_DIR': diretorio_pdf},
+        }
+
+        def esfriar():
+            cache.clear()
+            shutil.rmtree(diretorio_pdf, ignore_errors=True)
+
+        try:
+            with override_settings(**configuracao):
+                for escala in options['escalas']:
+                    resultados['escalas'][str(escala)] = self._medir_escala(
+                        escala, endpoints, options, None if options['com_cache'] else esfriar
+                    )
+        finally:
+            shutil.rmtree(diretorio_pdf, ignore_errors=True)
+
+        saida = options['saida'] or f'bench-{commit or "local"}.json'
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2, sort_keys=True, ensure_ascii=False)
+            arquivo.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Resultados em {saida}'))
+
+        if anterior is not None:
+            self._comparar(anterior, resultados)
+
+    def _medir_escala(self, escala, endpoints, options, esfriar):
+        # Banco de teste próprio (SQLite em arquivo, para medir E/S real)
+        teste = connection.settings_dict.setdefault('TEST', {})
+        nome_teste = teste.get('NAME')
+        if connection.vendor == 'sqlite' and not nome_teste:
+            teste['NAME'] = os.path.join(tempfile.gettempdir(), 'bench_ecommerce.sqlite3')
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            inicio = time.perf_counter()
+            dados = semear(escala, options['semente'])
+            dados['semeadura_s'] = round(time.perf_counter() - inicio, 1)
+            self.stdout.write(
+                f'\n{escala} vendas ({dados["produtos"]} produtos), semeadas em {dados["semeadura_s"]}s'
+            )
+            self.stdout.write(
+                f'  {"endpoint":24} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"CPU ms":>8} {"consultas":>9} '
+                f'{"pico KiB":>9} {"KiB":>8} {"304 ms":>7} {"304 CPU":>7}'
+            )
+
+            hoje = timezone.localdate()
+            valores = {
+                'produto': Produto.objects.order_by('pk').values_list('pk', flat=True).first(),
+                'inicio': hoje - timedelta(days=7),
+                'fim': hoje,
+            }
+            cliente = Client()
+            medidas = {}
+            for nome, url, maximo in endpoints:
+                repeticoes = min(options['repeticoes'], maximo or options['repeticoes'])
+                medida = medir(cliente, url.format(**valores), repeticoes, esfriar)
+                medidas[nome] = medida
+                aviso = '' if medida['status'] == 200 else f'  (status {medida["status"]})'
+                condicional = medida.get('condicional')
+                if condicional and condicional['status'] == 304:
+                    colunas_304 = f'{condicional["p50_ms"]:7.2f} {condicional["cpu_ms"]:7.2f}'
+                else:
+                    colunas_304 = f'{"-":>7} {"-":>7}'
+                self.stdout.write(
+                    f'  {nome:24} {medida["p50_ms"]:9.2f} {medida["p95_ms"]:9.2f} {medida["p99_ms"]:9.2f} '
+                    f'{medida["cpu_ms"]:8.2f} {medida["consultas"]:9} {medida["memoria_pico_kib"]:9} '
+                    f'{medida["bytes"] / 1024:8.1f} {colunas_304}{aviso}'
+                )
+            return {'dados': dados, 'endpoints': medidas}
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teste['NAME'] = nome_teste
+
+    def _comparar(self, anterior, atual):
+        self.stdout.write(f'\nComparação do p50 com {anterior.get("commit") or "a execução anterior"}:')
+        comparados = 0
+        for escala, medidas in atual['escalas'].items():
+            antes = anterior.get('escalas', {}).get(escala, {}).get('endpoints', {})
+            for nome, medida in medidas['endpoints'].items():
+                if nome not in antes or not antes[nome]['p50_ms']:
+                    continue
+                variacao = (medida['p50_ms'] / antes[nome]['p50_ms'] - 1) * 100
+                estilo = self.style.ERROR if variacao > 10 else self.style.SUCCESS if variacao < -10 else str
+                self.stdout.write(estilo(
+                    f'  {escala:>8} {nome:24} {antes[nome]["p50_ms"]:9.2f} -> {medida["p50_ms"]:9.2f} ms '
+                    f'({variacao:+.0f}%)'
+                ))
+                comparados += 1
+        if not comparados:
+            self.stdout.write('  nenhuma escala/endpoint em comum')
@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from dashboard.autocomplete import IndiceAutocomplete, _normalizar_palavra
+
+NOMES = [
+    'Cafeteira', 'Caneca', 'Chaleira', 'Fone', 'Teclado', 'Mouse', 'Monitor', 'Cadeira',
+    'Mesa', 'Lâmpada', 'Ventilador', 'Geladeira', 'Fogão', 'Panela', 'Liquidificador',
+]
+ATRIBUTOS = [
+    'Elétrico', 'Portátil', 'Inox', 'Térmico', 'Sem Fio', 'Gamer', 'Azul', 'Preto',
+    'Grande', 'Médio', 'Pequeno', 'Premium', 'Básico', 'Ação', 'Coração',
+]
+BUSCAS = ['ca', 'caf', 'cafet', 'lamp', 'fogao', 'termico azul', 'mod', 'modelo12', 'gamer tec', 'xyz']
+
+
+def produtos_sinteticos(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    for pk in range(1, quantidade + 1):
+        nome = ' '.join([
+            aleatorio.choice(NOMES),
+            aleatorio.choice(ATRIBUTOS),
+            aleatorio.choice(ATRIBUTOS),
+            f'Modelo{aleatorio.randrange(20000)}',
+        ])
+        yield pk, nome, Decimal(aleatorio.randrange(100, 100000)) / 100, aleatorio.randrange(200)
+
+
+class Command(BaseCommand):
+    help = 'Mede memória e latência do índice de autocomplete em memória (dados sintéticos, sem banco)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=500000, help='Número de produtos')
+        parser.add_argument('--repeticoes', type=int, default=2000, help='Buscas por termo')
+
+    def handle(self, *args, **options):
+        quantidade = options['produtos']
+        linhas = list(produtos_sinteticos(quantidade))
+
+        inicio = time.perf_counter()
+        IndiceAutocomplete().construir(linhas)
+        construcao = time.perf_counter() - inicio
+
+        # Memória medida numa segunda construção (o tracemalloc deixa tudo
+        # mais lento), com nomes novos como viriam do banco
+        del linhas
+        _normalizar_palavra.cache_clear()
+        tracemalloc.start()
+        indice = IndiceAutocomplete()
+        indice.construir(produtos_sinteticos(quantidade))
+        memoria, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f'{quantidade} produtos, {len(indice.palavras)} entradas: '
+            f'construção {construcao:.2f}s, memória {memoria / 1024 / 1024:.1f} MiB'
+        )
+
+        for busca in BUSCAS:
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                resultado = indice.buscar(busca)
+                tempos.append((time.perf_counter() - inicio) * 1e6)
+            tempos.sort()
+            self.stdout.write(
+                f'  {busca!r:16} {len(resultado):2} resultados  '
+                f'p50 {statistics.median(tempos):7.1f}µs  p99 {tempos[int(len(tempos) * 0.99)]:7.1f}µs'
+            )
+
+        # Atualização incremental: renomear produtos (pior caso: todas as palavras mudam)
+        aleatorio = random.Random(7)
+        tempos = []
+        for pk in aleatorio.sample(range(1, quantidade + 1), 200):
+            inicio = time.perf_counter()
+            indice.aplicar([(pk, f'Produto Renomeado {pk}', Decimal('10.00'), 5, True)])
+            tempos.append((time.perf_counter() - inicio) * 1e3)
+        self.stdout.write(f'  renomear um produto: p50 {statistics.median(tempos):.2f}ms')
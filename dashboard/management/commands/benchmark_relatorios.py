@@ -0,0 +1,149 @@
+import gc
+import os
+import pickle
+import random
+import resource
+import sys
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from dashboard.models import Categoria, Produto
+from dashboard.pdf import folha_de_estilos
+from dashboard.relatorios import gerar_relatorio_estoque, html_relatorio_estoque
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a montagem do HTML e a renderização do relatório de estoque '
+        '(os produtos são criados numa transação desfeita ao final)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas', type=int, nargs='+', default=[10000, 50000, 100000],
+            help='Quantidades de produtos a medir'
+        )
+        parser.add_argument('--sem-pdf', action='store_true', help='Mede só a montagem do HTML')
+        parser.add_argument(
+            '--segmento', type=int, default=2000,
+            help='Produtos por segmento no modo segmentado (0 mede só o documento único)'
+        )
+        parser.add_argument('--processos', type=int, default=1, help='Processos do modo segmentado')
+        parser.add_argument(
+            '--memoria', action='store_true',
+            help=(
+                'Mede o pico de memória residente (RSS, inclui a memória nativa do '
+                'WeasyPrint) gerando cada PDF num processo filho'
+            )
+        )
+
+    def handle(self, *args, **options):
+        folha_de_estilos()
+        for linhas in options['linhas']:
+            with transaction.atomic():
+                self._criar_produtos(linhas)
+                self._medir(linhas, options)
+                transaction.set_rollback(True)
+
+    def _criar_produtos(self, quantidade):
+        aleatorio = random.Random(42)
+        categorias = Categoria.objects.bulk_create(
+            Categoria(nome=f'Benchmark {numero}') for numero in range(20)
+        )
+        Produto.objects.all().update(ativo=False)
+        Produto.objects.bulk_create(
+            (
+                Produto(
+                    nome=f'Produto <{numero}> & cia',
+                    categoria=aleatorio.choice(categorias),
+                    preco=Decimal(aleatorio.randrange(100, 1000000)) / 100,
+                    estoque=aleatorio.randrange(50),
+                )
+                for numero in range(quantidade)
+            ),
+            batch_size=5000,
+        )
+
+    def _medir(self, linhas, options):
+        inicio = time.perf_counter()
+        html = html_relatorio_estoque({})
+        montagem = time.perf_counter() - inicio
+        self.stdout.write(f'{linhas:>7} linhas: HTML {montagem:6.2f}s ({len(html) / 1024 / 1024:.1f} MiB)')
+        del html
+        if options['sem_pdf']:
+            return
+
+        modos = [('documento único', 0, 1)]
+        if options['segmento']:
+            modos.append((
+                f'segmentos de {options["segmento"]} ({options["processos"]} processo(s))',
+                options['segmento'], options['processos']
+            ))
+        for nome, segmento, processos in modos:
+            configuracao = {
+                **settings.ECOMMERCE_SETTINGS,
+                'RELATORIOS_LINHAS_POR_SEGMENTO': segmento,
+                'RELATORIOS_PROCESSOS': processos,
+            }
+            with override_settings(ECOMMERCE_SETTINGS=configuracao):
+                if options['memoria']:
+                    (duracao, tamanho), pico, pico_filhos = _em_processo_filho(_gerar)
+                else:
+                    duracao, tamanho = _gerar()
+            mensagem = f'         {nome:40} PDF {duracao:7.2f}s ({tamanho / 1024 / 1024:.1f} MiB)'
+            if options['memoria']:
+                mensagem += f', pico RSS {pico / 1024 / 1024:.0f} MiB'
+                if pico_filhos:
+                    mensagem += f' (processos de renderização: {pico_filhos / 1024 / 1024:.0f} MiB)'
+            self.stdout.write(mensagem)
+
+
+def _gerar():
+    inicio = time.perf_counter()
+    pdf, _ = gerar_relatorio_estoque({})
+    return time.perf_counter() - inicio, len(pdf)
+
+
+def _maxrss(uso):
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    return uso.ru_maxrss if sys.platform == 'darwin' else uso.ru_maxrss * 1024
+
+
+def _em_processo_filho(funcao):
+    """
+    Executa funcao() num processo filho (fork, que herda a conexão e a
+    transação com os produtos de teste) e retorna (resultado, pico de RSS
+    do filho, maior pico de RSS dos processos criados por ele), em bytes.
+    """
+    leitura, escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(leitura)
+        try:
+            try:
+                resposta = (funcao(), None)
+            except BaseException as e:
+                resposta = (None, e.with_traceback(None))
+            # Fecha o que a exceção deixou aberto (ex.: o pool de processos)
+            # antes do os._exit, que não roda finalizadores
+            gc.collect()
+            filhos = _maxrss(resource.getrusage(resource.RUSAGE_CHILDREN))
+            with os.fdopen(escrita, 'wb') as saida:
+                pickle.dump((resposta, filhos), saida)
+        finally:
+            # Sem rodar os finalizadores do Django no filho (a conexão é do pai)
+            os._exit(0)
+
+    os.close(escrita)
+    with os.fdopen(leitura, 'rb') as entrada:
+        dados = entrada.read()
+    _, _, uso = os.wait4(pid, 0)
+    (resultado, erro), filhos = pickle.loads(dados)
+    if erro is not None:
+        raise erro
+    return resultado, _maxrss(uso), filhos
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from dashboard import viacep
+
+
+def servidor_falso(latencia):
+    """ViaCEP local que responde qualquer CEP após `latencia` segundos"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latencia)
+            cep = self.path.strip('/').split('/')[-2]
+            corpo = json.dumps({'cep': cep, 'localidade': 'São Paulo', 'uf': 'SP'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+class Command(BaseCommand):
+    help = 'Compara a validação de CEPs em sequência e em paralelo contra um ViaCEP local com latência'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ceps', type=int, default=200, help='Número de CEPs distintos')
+        parser.add_argument('--latencia', type=float, default=0.1, help='Latência do servidor falso (s)')
+        parser.add_argument('--concorrencia', type=int, default=None, help='Padrão: VIACEP_CONCORRENCIA')
+        parser.add_argument('--taxa', type=float, default=0, help='Requisições por segundo (0 = sem limite)')
+
+    def handle(self, *args, **options):
+        servidor = servidor_falso(options['latencia'])
+        configuracao = {
+            **settings.ECOMMERCE_SETTINGS,
+            'VIACEP_URL': f'http://127.0.0.1:{servidor.server_port}/ws/',
+            'VIACEP_REQUISICOES_POR_SEGUNDO': options['taxa'],
+        }
+        if options['concorrencia']:
+            configuracao['VIACEP_CONCORRENCIA'] = options['concorrencia']
+
+        ceps = [f'{numero:08d}' for numero in range(1000000, 1000000 + options['ceps'])]
+        try:
+            with override_settings(ECOMMERCE_SETTINGS=configuracao):
+                self._medir('sequencial', lambda: [viacep.validar_cep(cep) for cep in ceps], ceps)
+                self._medir('paralelo', lambda: viacep.validar_ceps(ceps), ceps)
+                self._medir('paralelo (cache)', lambda: viacep.validar_ceps(ceps), ceps, limpar=False)
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+
+    def _medir(self, nome, funcao, ceps, limpar=True):
+        if limpar:
+            cache.delete_many([viacep.PREFIXO_CEP + cep for cep in ceps])
+        inicio = time.perf_counter()
+        resultados = funcao()
+        duracao = time.perf_counter() - inicio
+        validos = sum(1 for resultado in resultados if resultado['status'] == 'valido')
+        self.stdout.write(
+            f'{nome:18} {len(ceps)} CEPs ({validos} válidos) em {duracao:.2f}s '
+            f'({len(ceps) / duracao:.0f} CEPs/s)'
+        )
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _trabalhador(*argumentos):
+    # Com spawn/forkserver (padrão no macOS, no Windows e, a partir do
+    # Python 3.14, no Linux) o processo filho começa do zero: o Django
+    # precisa ser configurado antes de importar os models da fila
+    django.setup()
+    from dashboard.fila import executar_trabalhador
+    return executar_trabalhador(*argumentos)
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de relatórios PDF com um pool de processos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Número de processos geradores (padrão: número de CPUs)'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Segundos de espera quando a fila está vazia'
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Processa os jobs pendentes e encerra'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        argumentos = (options['intervalo'], options['uma_vez'])
+
+        self.stdout.write(f'Iniciando {workers} worker(s) de relatórios...')
+
+        if workers == 1:
+            processados = _trabalhador(*argumentos)
+            self.stdout.write(self.style.SUCCESS(f'{processados} relatório(s) gerado(s).'))
+            return
+
+        # Cada processo abre suas próprias conexões com o banco
+        connections.close_all()
+        processos = [
+            multiprocessing.Process(target=_trabalhador, args=argumentos, daemon=True)
+            for _ in range(workers)
+        ]
+        for processo in processos:
+            processo.start()
+        try:
+            for processo in processos:
+                processo.join()
+        except KeyboardInterrupt:
+            for processo in processos:
+                processo.terminate()
+        self.stdout.write(self.style.SUCCESS('Workers de relatórios encerrados.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.consolidacao import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de vendas dos produtos a partir da tabela de vendas'
+
+    def handle(self, *args, **options):
+        corrigidos = reconciliar_contadores()
+        if corrigidos:
+            ids = ', '.join(map(str, corrigidos[:20])) + (' ...' if len(corrigidos) > 20 else '')
+            self.stdout.write(self.style.WARNING(f'{len(corrigidos)} produto(s) corrigido(s): {ids}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Contadores de vendas em dia.'))
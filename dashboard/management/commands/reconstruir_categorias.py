@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.consolidacao import reconstruir_categorias
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o consolidado de vendas por categoria a partir das vendas e dos produtos'
+
+    def handle(self, *args, **options):
+        categorias = reconstruir_categorias()
+        self.stdout.write(self.style.SUCCESS(f'{categorias} categoria(s) consolidadas.'))
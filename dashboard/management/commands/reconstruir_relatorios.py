@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.consolidacao import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os relatórios consolidados de vendas a partir do histórico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', help='Data final (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            inicio = date.fromisoformat(options['inicio']) if options['inicio'] else None
+            fim = date.fromisoformat(options['fim']) if options['fim'] else None
+        except ValueError as e:
+            raise CommandError(f'Data inválida: {e}')
+
+        dias = reconstruir(inicio, fim)
+        self.stdout.write(self.style.SUCCESS(f'{dias} dia(s) de vendas consolidados.'))
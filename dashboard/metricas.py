@@ -0,0 +1,121 @@
+"""
+Métricas da API no formato texto do Prometheus, expostas em /api/metrics/.
+
+MetricasMiddleware mede, por view, a duração e o tempo de CPU de cada
+requisição e o número e o tempo das consultas SQL (com um execute_wrapper
+na conexão). Os caches (respostas das APIs, PDFs e CEPs) contam acertos e
+faltas, e os relatórios medem o tempo de renderização do WeasyPrint.
+
+Com vários processos (gunicorn), defina PROMETHEUS_MULTIPROC_DIR com um
+diretório vazio antes de iniciar o servidor: cada processo grava suas
+métricas em arquivos mapeados em memória nesse diretório e /api/metrics/
+soma os de todos eles.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# Rótulo das requisições que não chegaram a uma view (404)
+SEM_VIEW = 'nenhuma'
+
+DURACAO_REQUISICAO = Histogram(
+    'dashboard_request_duration_seconds', 'Duração das requisições, por view',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CPU_REQUISICAO = Counter(
+    'dashboard_request_cpu_seconds', 'Tempo de CPU gasto pelas requisições, por view',
+    ['view', 'method'],
+)
+REQUISICOES = Counter(
+    'dashboard_requests', 'Requisições respondidas, por view e status',
+    ['view', 'method', 'status'],
+)
+CONSULTAS_POR_REQUISICAO = Histogram(
+    'dashboard_db_queries_per_request', 'Consultas SQL por requisição, por view',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500),
+)
+TEMPO_SQL = Counter(
+    'dashboard_db_query_seconds', 'Tempo gasto em consultas SQL, por view',
+    ['view'],
+)
+CACHE = Counter(
+    'dashboard_cache_requests', 'Leituras de cache, por cache e resultado (hit ou miss)',
+    ['cache', 'result'],
+)
+RENDERIZACAO_PDF = Histogram(
+    'dashboard_pdf_render_seconds', 'Duração da renderização dos relatórios PDF',
+    ['relatorio'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+class _ConsultasSql:
+    """execute_wrapper que conta as consultas e soma o tempo delas"""
+
+    def __init__(self):
+        self.quantidade = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.quantidade += 1
+
+
+class MetricasMiddleware:
+    """Registra duração, CPU e consultas SQL de cada requisição"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = _ConsultasSql()
+        inicio = time.perf_counter()
+        cpu = time.thread_time()
+        with connection.execute_wrapper(consultas):
+            response = self.get_response(request)
+        cpu = time.thread_time() - cpu
+        duracao = time.perf_counter() - inicio
+
+        # Nome da rota (ex.: api_dashboard_stats, produto-list), com
+        # cardinalidade fixa ao contrário do caminho
+        rota = getattr(request, 'resolver_match', None)
+        view = rota.view_name if rota is not None else SEM_VIEW
+        DURACAO_REQUISICAO.labels(view, request.method).observe(duracao)
+        CPU_REQUISICAO.labels(view, request.method).inc(cpu)
+        REQUISICOES.labels(view, request.method, str(response.status_code)).inc()
+        CONSULTAS_POR_REQUISICAO.labels(view).observe(consultas.quantidade)
+        TEMPO_SQL.labels(view).inc(consultas.tempo)
+        return response
+
+
+def registrar_cache(cache, acerto):
+    """Conta uma leitura do cache `cache` (acerto ou falta)"""
+    CACHE.labels(cache, 'hit' if acerto else 'miss').inc()
+
+
+@contextmanager
+def medir_renderizacao(relatorio):
+    """Mede a renderização do PDF de um relatório"""
+    with RENDERIZACAO_PDF.labels(relatorio).time():
+        yield
+
+
+def exportar():
+    """(conteúdo, content type) das métricas, somando todos os processos no modo multiprocesso"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
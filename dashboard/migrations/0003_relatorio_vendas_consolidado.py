@@ -0,0 +1,74 @@
+# Generated by Django 4.2.24 on 2026-10-17 06:50
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def consolidar_historico(apps, schema_editor):
+    """Gera os consolidados diários para as vendas já existentes"""
+    Venda = apps.get_model('dashboard', 'Venda')
+    RelatorioVendas = apps.get_model('dashboard', 'RelatorioVendas')
+    RelatorioVendasProduto = apps.get_model('dashboard', 'RelatorioVendasProduto')
+
+    RelatorioVendas.objects.all().delete()
+    por_produto = Venda.objects.annotate(
+        dia=TruncDate('data_venda', tzinfo=timezone.get_current_timezone())
+    ).values('dia', 'produto_id').annotate(
+        total=Sum('valor_total'),
+        numero=Count('id'),
+        itens=Sum('quantidade'),
+    ).order_by('dia')
+
+    dias = {}
+    linhas = []
+    for item in por_produto:
+        linhas.append(RelatorioVendasProduto(
+            data=item['dia'], produto_id=item['produto_id'],
+            total_vendas=item['total'], quantidade_vendas=item['numero'],
+            produtos_vendidos=item['itens'],
+        ))
+        dia = dias.setdefault(item['dia'], RelatorioVendas(
+            data=item['dia'], total_vendas=0, quantidade_vendas=0, produtos_vendidos=0,
+        ))
+        dia.total_vendas += item['total']
+        dia.quantidade_vendas += item['numero']
+        dia.produtos_vendidos += item['itens']
+
+    RelatorioVendasProduto.objects.bulk_create(linhas, batch_size=2000)
+    RelatorioVendas.objects.bulk_create(dias.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_configuracaoloja'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatoriovendas',
+            name='data',
+            field=models.DateField(unique=True),
+        ),
+        migrations.CreateModel(
+            name='RelatorioVendasProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('total_vendas', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('quantidade_vendas', models.PositiveIntegerField()),
+                ('produtos_vendidos', models.PositiveIntegerField()),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatorios', to='dashboard.produto')),
+            ],
+            options={
+                'verbose_name': 'Relatório de Vendas por Produto',
+                'verbose_name_plural': 'Relatórios de Vendas por Produto',
+                'ordering': ['-data'],
+                'unique_together': {('data', 'produto')},
+            },
+        ),
+        migrations.RunPython(consolidar_historico, migrations.RunPython.noop),
+    ]
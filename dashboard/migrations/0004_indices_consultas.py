@@ -0,0 +1,37 @@
+# Generated by Django 4.2.24 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_relatorio_vendas_consolidado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'estoque'], name='produto_ativo_estoque_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', '-criado_em'], name='produto_ativo_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['-criado_em'], name='produto_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True), ('estoque__lt', 10)), fields=['estoque'], name='produto_estoque_baixo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data_venda'], name='venda_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['produto', 'data_venda'], name='venda_produto_data_idx'),
+        ),
+    ]
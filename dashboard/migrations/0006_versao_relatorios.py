@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-17 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_relatorio_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,105 @@
+from django.db import migrations
+
+
+POSTGRES_CRIAR = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() não é IMMUTABLE, então não pode ir direto num índice
+    """
+    CREATE OR REPLACE FUNCTION dashboard_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS produto_busca_gin ON dashboard_produto USING GIN (
+        to_tsvector('portuguese', dashboard_unaccent(
+            coalesce(dashboard_produto.nome, '') || ' ' || coalesce(dashboard_produto.descricao, '')))
+    )
+    """,
+]
+
+SQLITE_CRIAR = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS dashboard_produto_fts USING fts5(
+        nome, descricao,
+        content='dashboard_produto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_produto_fts_ai AFTER INSERT ON dashboard_produto BEGIN
+        INSERT INTO dashboard_produto_fts(rowid, nome, descricao)
+        VALUES (new.id, new.nome, new.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_produto_fts_ad AFTER DELETE ON dashboard_produto BEGIN
+        INSERT INTO dashboard_produto_fts(dashboard_produto_fts, rowid, nome, descricao)
+        VALUES ('delete', old.id, old.nome, old.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dashboard_produto_fts_au AFTER UPDATE OF nome, descricao ON dashboard_produto BEGIN
+        INSERT INTO dashboard_produto_fts(dashboard_produto_fts, rowid, nome, descricao)
+        VALUES ('delete', old.id, old.nome, old.descricao);
+        INSERT INTO dashboard_produto_fts(rowid, nome, descricao)
+        VALUES (new.id, new.nome, new.descricao);
+    END
+    """,
+    "INSERT INTO dashboard_produto_fts(dashboard_produto_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS dashboard_produto_fts_ai',
+    'DROP TRIGGER IF EXISTS dashboard_produto_fts_ad',
+    'DROP TRIGGER IF EXISTS dashboard_produto_fts_au',
+    'DROP TABLE IF EXISTS dashboard_produto_fts',
+]
+
+POSTGRES_REMOVER = [
+    'DROP INDEX IF EXISTS produto_busca_gin',
+    'DROP FUNCTION IF EXISTS dashboard_unaccent(text)',
+]
+
+
+def criar_indice_busca(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == 'postgresql':
+        comandos = POSTGRES_CRIAR
+    elif conexao.vendor == 'sqlite':
+        with conexao.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            opcoes = {linha[0] for linha in cursor.fetchall()}
+        # Sem FTS5 a busca continua usando icontains
+        if 'ENABLE_FTS5' not in opcoes:
+            return
+        comandos = SQLITE_CRIAR
+    else:
+        return
+
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+def remover_indice_busca(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == 'postgresql':
+        comandos = POSTGRES_REMOVER
+    elif conexao.vendor == 'sqlite':
+        comandos = SQLITE_REMOVER
+    else:
+        return
+
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_versao_relatorios'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
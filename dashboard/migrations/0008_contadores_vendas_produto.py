@@ -0,0 +1,65 @@
+# Generated by Django 4.2.24 on 2026-10-17 07:44
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def preencher_contadores(apps, schema_editor):
+    """Calcula os contadores de vendas dos produtos a partir das vendas existentes"""
+    Venda = apps.get_model('dashboard', 'Venda')
+    Produto = apps.get_model('dashboard', 'Produto')
+
+    por_produto = Venda.objects.values('produto_id').annotate(
+        total=Sum('valor_total'),
+        numero=Count('id'),
+        itens=Sum('quantidade'),
+        ultima=Max('data_venda'),
+    ).order_by()
+
+    produtos = [
+        Produto(
+            id=item['produto_id'], total_vendas=item['total'], quantidade_vendas=item['numero'],
+            produtos_vendidos=item['itens'], ultima_venda=item['ultima'],
+        )
+        for item in por_produto.iterator(chunk_size=2000)
+    ]
+    Produto.objects.bulk_update(
+        produtos, ['total_vendas', 'quantidade_vendas', 'produtos_vendidos', 'ultima_venda'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_busca_produtos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='produtos_vendidos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Unidades vendidas'),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='quantidade_vendas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='total_vendas',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=15, verbose_name='Faturamento'),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='ultima_venda',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['-produtos_vendidos'], name='produto_vendidos_idx'),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.24 on 2026-10-17 07:50
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def preencher_categorias(apps, schema_editor):
+    """Calcula o consolidado por categoria a partir das vendas e produtos existentes"""
+    Categoria = apps.get_model('dashboard', 'Categoria')
+    Produto = apps.get_model('dashboard', 'Produto')
+    Venda = apps.get_model('dashboard', 'Venda')
+    RelatorioCategoria = apps.get_model('dashboard', 'RelatorioCategoria')
+
+    por_categoria = {
+        item['produto__categoria_id']: item
+        for item in Venda.objects.values('produto__categoria_id').annotate(
+            total=Sum('valor_total'),
+            numero=Count('id'),
+            itens=Sum('quantidade'),
+            produtos=Count('produto_id', distinct=True),
+        ).order_by()
+    }
+    ativos = dict(
+        Produto.objects.filter(ativo=True).values('categoria_id').annotate(
+            total=Count('id')
+        ).values_list('categoria_id', 'total').order_by()
+    )
+
+    RelatorioCategoria.objects.bulk_create(
+        [
+            RelatorioCategoria(
+                categoria_id=categoria_id,
+                total_vendas=por_categoria.get(categoria_id, {}).get('total', Decimal('0')),
+                quantidade_vendas=por_categoria.get(categoria_id, {}).get('numero', 0),
+                produtos_vendidos=por_categoria.get(categoria_id, {}).get('itens', 0),
+                produtos_com_vendas=por_categoria.get(categoria_id, {}).get('produtos', 0),
+                produtos_ativos=ativos.get(categoria_id, 0),
+            )
+            for categoria_id in Categoria.objects.values_list('id', flat=True)
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_contadores_vendas_produto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='relatorio', serialize=False, to='dashboard.categoria')),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=15)),
+                ('quantidade_vendas', models.PositiveIntegerField(default=0)),
+                ('produtos_vendidos', models.PositiveIntegerField(default=0)),
+                ('produtos_com_vendas', models.PositiveIntegerField(default=0)),
+                ('produtos_ativos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Relatório de Vendas por Categoria',
+                'verbose_name_plural': 'Relatórios de Vendas por Categoria',
+                'ordering': ['-total_vendas'],
+            },
+        ),
+        migrations.RunPython(preencher_categorias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.24 on 2026-10-17 08:28
+
+import dashboard.busca
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_relatorio_categoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoIndiceBusca',
+            fields=[
+                ('produto', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_busca', serialize=False, to='dashboard.produto')),
+                ('documento', dashboard.busca.ColunaFts(db_column='dashboard_produto_fts')),
+            ],
+            options={
+                'db_table': 'dashboard_produto_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
+import uuid
+
+from .busca import TABELA_FTS, ColunaFts
+
+
+class EstoqueInsuficiente(ValueError):
+    """Erro lançado quando o produto não tem estoque para a venda"""
 
 
 class Categoria(models.Model):
@@ -9,6 +18,7 @@ class Categoria(models.Model):
     descricao = models.TextField(blank=True, null=True)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = "Categoria"
@@ -19,6 +29,30 @@ class Categoria(models.Model):
         return self.nome
 
 
+CONTADORES_VENDAS = ('total_vendas', 'quantidade_vendas', 'produtos_vendidos', 'ultima_venda')
+
+
+class ProdutoQuerySet(models.QuerySet):
+    """Operações de estoque atômicas (não sobrescrevem as demais colunas)"""
+    
+    def baixar_estoque(self, produto_id, quantidade):
+        """Reduz o estoque apenas se houver unidades suficientes"""
+        atualizados = self.filter(pk=produto_id, estoque__gte=quantidade).update(
+            estoque=F('estoque') - quantidade,
+            atualizado_em=timezone.now()
+        )
+        if not atualizados:
+            disponivel = self.filter(pk=produto_id).values_list('estoque', flat=True).first()
+            raise EstoqueInsuficiente(f"Estoque insuficiente. Disponível: {disponivel or 0}")
+    
+    def repor_estoque(self, produto_id, quantidade):
+        """Devolve unidades ao estoque do produto"""
+        self.filter(pk=produto_id).update(
+            estoque=F('estoque') + quantidade,
+            atualizado_em=timezone.now()
+        )
+
+
 class Produto(models.Model):
     """Modelo para produtos do e-commerce"""
     nome = models.CharField(max_length=200)
@@ -38,14 +72,73 @@ class Produto(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
     
+    # Contadores de vendas, mantidos por consolidacao.py a cada venda
+    total_vendas = models.DecimalField(
+        max_digits=15, decimal_places=2, default=Decimal('0'), editable=False,
+        verbose_name='Faturamento'
+    )
+    quantidade_vendas = models.PositiveIntegerField(default=0, editable=False)
+    produtos_vendidos = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Unidades vendidas'
+    )
+    ultima_venda = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = ProdutoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['ativo', 'estoque'], name='produto_ativo_estoque_idx'),
+            models.Index(fields=['ativo', '-criado_em'], name='produto_ativo_criado_idx'),
+            models.Index(fields=['-criado_em'], name='produto_criado_idx'),
+            # Top N produtos mais vendidos
+            models.Index(fields=['-produtos_vendidos'], name='produto_vendidos_idx'),
+            # Índice parcial: só os produtos ativos com estoque baixo
+            models.Index(
+                fields=['estoque'],
+                name='produto_estoque_baixo_idx',
+                condition=models.Q(ativo=True, estoque__lt=10),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.nome} - R$ {self.preco}"
     
+    def save(self, *args, **kwargs):
+        """Não sobrescreve os contadores de vendas com os valores da instância"""
+        from .consolidacao import atualizar_categoria_do_produto
+
+        # Eles só mudam por UPDATEs com F(); uma instância carregada antes
+        # de uma venda os gravaria desatualizados
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in CONTADORES_VENDAS
+            ]
+
+        with transaction.atomic():
+            # Categoria, situação e contadores gravados antes da alteração,
+            # para ajustar o consolidado por categoria
+            anterior = None
+            if not self._state.adding:
+                anterior = Produto.objects.select_for_update().filter(pk=self.pk).values(
+                    'categoria_id', 'ativo', *CONTADORES_VENDAS[:3]
+                ).first()
+            super().save(*args, **kwargs)
+
+            gravados = kwargs.get('update_fields')
+            if anterior is None:
+                atual = {campo: getattr(self, campo) for campo in CONTADORES_VENDAS[:3]}
+            else:
+                atual = dict(anterior)
+            if anterior is None or gravados is None or {'categoria', 'categoria_id'} & set(gravados):
+                atual['categoria_id'] = self.categoria_id
+            if anterior is None or gravados is None or 'ativo' in gravados:
+                atual['ativo'] = self.ativo
+            atualizar_categoria_do_produto(anterior, atual)
+    
     @property
     def estoque_baixo(self):
         """Verifica se o estoque está baixo (menor que 10)"""
@@ -57,6 +150,26 @@ class Produto(models.Model):
         return self.ativo and self.estoque > 0
 
 
+class ProdutoIndiceBusca(models.Model):
+    """
+    Tabela FTS5 da busca de produtos no SQLite (criada pela migração 0007,
+    não gerenciada pelo Django). Existe só para juntar os produtos ao
+    índice nas consultas de busca.buscar_produtos.
+    """
+    produto = models.OneToOneField(
+        Produto,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='indice_busca'
+    )
+    documento = ColunaFts(db_column=TABELA_FTS)
+
+    class Meta:
+        managed = False
+        db_table = TABELA_FTS
+
+
 class Venda(models.Model):
     """Modelo para registrar vendas"""
     produto = models.ForeignKey(
@@ -78,18 +191,25 @@ class Venda(models.Model):
         editable=False  # Será calculado automaticamente
     )
     data_venda = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
     observacoes = models.TextField(blank=True, null=True)
     
     class Meta:
         verbose_name = "Venda"
         verbose_name_plural = "Vendas"
         ordering = ['-data_venda']
+        indexes = [
+            models.Index(fields=['data_venda'], name='venda_data_idx'),
+            models.Index(fields=['produto', 'data_venda'], name='venda_produto_data_idx'),
+        ]
     
     def __str__(self):
         return f"{self.produto.nome} - {self.quantidade}x - R$ {self.valor_total}"
     
     def save(self, *args, **kwargs):
         """Sobrescreve o método save para calcular o valor total e atualizar estoque"""
+        from .consolidacao import registrar_venda, remover_venda
+
         # Se não foi definido o preço unitário, usar o preço atual do produto
         if not self.preco_unitario:
             self.preco_unitario = self.produto.preco
@@ -97,28 +217,57 @@ class Venda(models.Model):
         # Calcula o valor total
         self.valor_total = self.preco_unitario * self.quantidade
         
-        # Se é uma nova venda (não existe pk), atualiza o estoque
-        if not self.pk:
-            if self.produto.estoque < self.quantidade:
-                raise ValueError(f"Estoque insuficiente. Disponível: {self.produto.estoque}")
+        with transaction.atomic():
+            anterior = None
+            if not self.pk:
+                # Nova venda: reserva o estoque com um UPDATE condicional
+                Produto.objects.baixar_estoque(self.produto_id, self.quantidade)
+                self._descontar_em_memoria(self.quantidade)
+            else:
+                # Estado gravado antes da alteração, para ajustar estoque e consolidado
+                anterior = Venda.objects.select_for_update().filter(pk=self.pk).first()
+                if anterior is not None:
+                    self._ajustar_estoque(anterior)
+            
+            super().save(*args, **kwargs)
             
-            # Reduz o estoque do produto
-            self.produto.estoque -= self.quantidade
-            self.produto.save()
+            # Mantém os relatórios consolidados em dia
+            if anterior is not None:
+                remover_venda(anterior)
+            registrar_venda(self)
+    
+    def _ajustar_estoque(self, anterior):
+        """Aplica no estoque a diferença entre a venda gravada e a alterada"""
+        if anterior.produto_id != self.produto_id:
+            Produto.objects.repor_estoque(anterior.produto_id, anterior.quantidade)
+            Produto.objects.baixar_estoque(self.produto_id, self.quantidade)
+            self._descontar_em_memoria(self.quantidade)
+            return
         
-        super().save(*args, **kwargs)
+        diferenca = self.quantidade - anterior.quantidade
+        if diferenca > 0:
+            Produto.objects.baixar_estoque(self.produto_id, diferenca)
+        elif diferenca < 0:
+            Produto.objects.repor_estoque(self.produto_id, -diferenca)
+        self._descontar_em_memoria(diferenca)
+    
+    def _descontar_em_memoria(self, quantidade):
+        """Mantém coerente o estoque do produto já carregado, sem nova consulta"""
+        if Venda.produto.is_cached(self):
+            self.produto.estoque -= quantidade
     
     def delete(self, *args, **kwargs):
         """Sobrescreve o método delete para restaurar o estoque"""
         # Restaura o estoque quando a venda é excluída
-        self.produto.estoque += self.quantidade
-        self.produto.save()
-        super().delete(*args, **kwargs)
+        # (o consolidado é ajustado pelo sinal post_delete)
+        with transaction.atomic():
+            Produto.objects.repor_estoque(self.produto_id, self.quantidade)
+            return super().delete(*args, **kwargs)
 
 
 class RelatorioVendas(models.Model):
-    """Modelo para relatórios de vendas (view materializada)"""
-    data = models.DateField()
+    """Modelo para relatórios de vendas (view materializada, uma linha por dia)"""
+    data = models.DateField(unique=True)
     total_vendas = models.DecimalField(max_digits=15, decimal_places=2)
     quantidade_vendas = models.PositiveIntegerField()
     produtos_vendidos = models.PositiveIntegerField()
@@ -131,6 +280,87 @@ class RelatorioVendas(models.Model):
     def __str__(self):
         return f"Relatório {self.data} - R$ {self.total_vendas}"
 
+
+class RelatorioVendasProduto(models.Model):
+    """Consolidado diário de vendas por produto"""
+    data = models.DateField()
+    produto = models.ForeignKey(
+        Produto,
+        on_delete=models.CASCADE,
+        related_name='relatorios'
+    )
+    total_vendas = models.DecimalField(max_digits=15, decimal_places=2)
+    quantidade_vendas = models.PositiveIntegerField()
+    produtos_vendidos = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = "Relatório de Vendas por Produto"
+        verbose_name_plural = "Relatórios de Vendas por Produto"
+        ordering = ['-data']
+        unique_together = [('data', 'produto')]
+    
+    def __str__(self):
+        return f"Relatório {self.data} - {self.produto_id} - R$ {self.total_vendas}"
+
+
+class RelatorioCategoria(models.Model):
+    """Consolidado de vendas e produtos por categoria (uma linha por categoria)"""
+    categoria = models.OneToOneField(
+        Categoria,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='relatorio'
+    )
+    total_vendas = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0'))
+    quantidade_vendas = models.PositiveIntegerField(default=0)
+    produtos_vendidos = models.PositiveIntegerField(default=0)
+    produtos_com_vendas = models.PositiveIntegerField(default=0)
+    produtos_ativos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Relatório de Vendas por Categoria"
+        verbose_name_plural = "Relatórios de Vendas por Categoria"
+        ordering = ['-total_vendas']
+
+    def __str__(self):
+        return f"Relatório {self.categoria_id} - R$ {self.total_vendas}"
+
+class RelatorioJob(models.Model):
+    """Pedido de geração de relatório PDF processado em segundo plano"""
+    TIPO_CHOICES = [
+        ('vendas', 'Relatório de Vendas'),
+        ('estoque', 'Relatório de Estoque'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    arquivo = models.FileField(upload_to='relatorios/%Y/%m/', blank=True)
+    nome_arquivo = models.CharField(max_length=200, blank=True)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(blank=True, null=True)
+    concluido_em = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = "Job de Relatório"
+        verbose_name_plural = "Jobs de Relatórios"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='relatoriojob_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.get_status_display()}"
+
+
 class ConfiguracaoLoja(models.Model):
     # Dados da empresa
     nome_empresa = models.CharField(max_length=200)
@@ -0,0 +1,217 @@
+"""
+Paginação das APIs.
+
+PaginacaoPadrao é a paginação por número de página usada por padrão,
+agora respeitando ?page_size= (com limite). As listagens de vendas e
+produtos aceitam também uma paginação por cursor (keyset), ativada com
+?paginacao=cursor: cada página filtra a partir da última linha da
+anterior pela chave (data, id), então a página 10.000 custa o mesmo
+que a primeira e não há COUNT(*) nem OFFSET.
+"""
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+PAGINACAO_MAXIMA_PADRAO = 100
+CONTAGEM_TTL_PADRAO = 60
+
+
+def tamanho_maximo_pagina():
+    """Maior page_size aceito"""
+    return settings.ECOMMERCE_SETTINGS.get('PAGINACAO_MAXIMA', PAGINACAO_MAXIMA_PADRAO)
+
+
+def contagem_aproximada(queryset):
+    """
+    Número aproximado de linhas do queryset.
+
+    Sem filtros no PostgreSQL usa a estimativa do planner (reltuples);
+    nos demais casos usa um COUNT(*) guardado em cache por alguns segundos.
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor == 'postgresql' and not queryset.query.where:
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            linha = cursor.fetchone()
+        # reltuples é -1 (ou 0) enquanto a tabela não foi analisada
+        if linha and linha[0] > 0:
+            return linha[0]
+
+    sql, parametros = queryset.order_by().query.sql_with_params()
+    chave = 'dashboard:contagem:' + hashlib.sha1(f'{sql}|{parametros}'.encode()).hexdigest()
+    total = cache.get(chave)
+    if total is None:
+        total = queryset.count()
+        cache.set(chave, total, settings.ECOMMERCE_SETTINGS.get('CONTAGEM_CACHE_TTL', CONTAGEM_TTL_PADRAO))
+    return total
+
+
+class PaginacaoPadrao(PageNumberPagination):
+    """PageNumberPagination com ?page_size= limitado"""
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return tamanho_maximo_pagina()
+
+
+class PaginacaoKeyset(BasePagination):
+    """
+    Paginação por cursor sobre (campo, id), ambos em ordem decrescente.
+
+    O cursor guarda o valor do campo e o id da linha de fronteira, então a
+    próxima página é uma busca por intervalo no índice do campo.
+    """
+    campo = None
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    contagem_query_param = 'contagem'
+    display_page_controls = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.queryset_total = queryset
+        self.base_url = request.build_absolute_uri()
+        self.tamanho = self.get_page_size(request)
+        self.campo_modelo = campo = queryset.model._meta.get_field(self.campo)
+
+        self.anterior = False
+        posicao = self.decodificar_cursor(request, campo)
+        if posicao is not None:
+            valor, pk, self.anterior = posicao
+            if self.anterior:
+                # Linhas "acima" da fronteira, lidas na ordem inversa
+                queryset = queryset.filter(
+                    Q(**{f'{self.campo}__gte': valor}),
+                    Q(**{f'{self.campo}__gt': valor}) | Q(pk__gt=pk),
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.campo}__lte': valor}),
+                    Q(**{f'{self.campo}__lt': valor}) | Q(pk__lt=pk),
+                )
+
+        ordem = (self.campo, 'pk') if self.anterior else (f'-{self.campo}', '-pk')
+        linhas = list(queryset.order_by(*ordem)[:self.tamanho + 1])
+
+        mais = len(linhas) > self.tamanho
+        linhas = linhas[:self.tamanho]
+        if self.anterior:
+            linhas.reverse()
+            self.tem_anterior, self.tem_proxima = mais, True
+        else:
+            self.tem_anterior, self.tem_proxima = posicao is not None, mais
+
+        self.linhas = linhas
+        return linhas
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=tamanho_maximo_pagina()
+            )
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def decodificar_cursor(self, request, campo):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None
+        try:
+            valor, pk, anterior = json.loads(base64.urlsafe_b64decode(codificado.encode()))
+            return campo.to_python(valor), int(pk), bool(anterior)
+        except Exception:
+            raise NotFound('Cursor inválido.')
+
+    def codificar_cursor(self, linha, anterior):
+        # value_to_string mantém os microssegundos (o DjangoJSONEncoder corta)
+        valor = self.campo_modelo.value_to_string(linha)
+        conteudo = json.dumps([valor, linha.pk, anterior])
+        cursor = base64.urlsafe_b64encode(conteudo.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.tem_proxima or not self.linhas:
+            return None
+        return self.codificar_cursor(self.linhas[-1], anterior=False)
+
+    def get_previous_link(self):
+        if not self.tem_anterior:
+            return None
+        if not self.linhas:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.codificar_cursor(self.linhas[0], anterior=True)
+
+    def get_paginated_response(self, data):
+        resposta = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.request.query_params.get(self.contagem_query_param, '').lower() == 'true':
+            # Total de todas as páginas, sem o filtro do cursor
+            resposta['count_aproximado'] = contagem_aproximada(self.queryset_total)
+        resposta['results'] = data
+        return Response(resposta)
+
+
+class PaginacaoHibrida(PaginacaoPadrao):
+    """
+    Paginação por número de página, ou por cursor com ?paginacao=cursor
+    (ou quando um ?cursor= é enviado).
+    """
+    campo_cursor = None
+    # Parâmetros que ordenam o resultado por outro critério: o cursor
+    # reordenaria por campo_cursor, então a combinação é recusada
+    parametros_sem_cursor = ()
+
+    def _usa_cursor(self, request):
+        return (
+            request.query_params.get('paginacao') == 'cursor'
+            or PaginacaoKeyset.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self._usa_cursor(request):
+            self.keyset = None
+            return super().paginate_queryset(queryset, request, view)
+
+        conflitantes = [nome for nome in self.parametros_sem_cursor if request.query_params.get(nome)]
+        if conflitantes:
+            raise ValidationError({
+                nome: 'Não pode ser combinado com a paginação por cursor.' for nome in conflitantes
+            })
+
+        self.display_page_controls = False
+        self.keyset = PaginacaoKeyset()
+        self.keyset.campo = self.campo_cursor
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PaginacaoVendas(PaginacaoHibrida):
+    campo_cursor = 'data_venda'
+
+
+class PaginacaoProdutos(PaginacaoHibrida):
+    campo_cursor = 'criado_em'
+    # A busca ordena por relevância
+    parametros_sem_cursor = ('busca',)
@@ -0,0 +1,87 @@
+"""
+Renderização de HTML em PDF com o WeasyPrint.
+
+A memória do layout do WeasyPrint cresce com o tamanho do documento, então
+relatórios muito grandes são renderizados em segmentos independentes (de
+tamanho fixo, opcionalmente num pool de processos) e os PDFs resultantes
+são juntados com o pypdf. Sem o pypdf instalado os relatórios continuam
+saindo num único documento.
+
+Este módulo não importa models: as funções executadas nos processos do
+pool não dependem do Django estar configurado.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from weasyprint import CSS, HTML
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
+CSS_RELATORIOS = Path(__file__).parent / 'templates' / 'dashboard' / 'relatorios' / 'relatorios.css'
+
+
+@lru_cache(maxsize=None)
+def folha_de_estilos():
+    """CSS dos relatórios, interpretado pelo WeasyPrint uma única vez"""
+    return CSS(string=CSS_RELATORIOS.read_text(encoding='utf-8'))
+
+
+def renderizar_pdf(html):
+    """Converte o HTML de um relatório em PDF"""
+    return HTML(string=html).write_pdf(stylesheets=[folha_de_estilos()])
+
+
+def pode_segmentar():
+    """Se os PDFs de vários segmentos podem ser juntados (pypdf instalado)"""
+    return PdfWriter is not None
+
+
+def juntar_pdfs(partes):
+    """Junta PDFs (bytes), na ordem, num único PDF"""
+    escritor = PdfWriter()
+    for parte in partes:
+        escritor.append(PdfReader(BytesIO(parte)))
+    saida = BytesIO()
+    escritor.write(saida)
+    return saida.getvalue()
+
+
+def _renderizar_em_sequencia(segmentos):
+    for html in segmentos:
+        yield renderizar_pdf(html)
+
+
+def _renderizar_em_processos(segmentos, processos):
+    # No máximo dois segmentos por processo em andamento, para que o HTML
+    # dos segmentos seguintes não se acumule na memória. Processos novos
+    # (spawn) não herdam as conexões com o banco nem as threads do worker.
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+        pendentes = deque()
+        for html in segmentos:
+            pendentes.append(executor.submit(renderizar_pdf, html))
+            if len(pendentes) >= processos * 2:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def renderizar_segmentos(segmentos, processos=1):
+    """
+    Renderiza cada HTML de `segmentos` (um iterável, consumido aos poucos)
+    como um PDF independente e junta todos, na ordem.
+    """
+    if not pode_segmentar():
+        raise RuntimeError('pypdf não está instalado')
+    if processos > 1:
+        partes = _renderizar_em_processos(segmentos, processos)
+    else:
+        partes = _renderizar_em_sequencia(segmentos)
+    return juntar_pdfs(partes)
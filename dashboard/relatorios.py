@@ -0,0 +1,286 @@
+"""
+Geração dos relatórios em PDF (WeasyPrint).
+
+As funções recebem os parâmetros de filtro (QueryDict ou dict) e
+retornam (pdf, nome_do_arquivo), para serem usadas tanto pelas views
+síncronas quanto pelos workers da fila de relatórios.
+
+O HTML sai dos templates em templates/dashboard/relatorios/. As linhas
+das tabelas, que podem ser centenas de milhares, são formatadas direto
+das tuplas de values_list() e juntadas uma única vez: o {% for %} dos
+templates custaria dezenas de microssegundos por linha. Relatórios de
+estoque grandes são renderizados em segmentos (ver pdf.py).
+"""
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Produto, Venda, RelatorioVendasProduto
+from .metricas import medir_renderizacao
+from .pdf import pode_segmentar, renderizar_pdf, renderizar_segmentos
+from .utils import filtro_periodo
+
+logger = logging.getLogger(__name__)
+
+
+# Uma linha de cada tabela (os textos devem vir escapados)
+LINHA_VENDA = (
+    '<tr><td>{}</td><td>{}</td><td>{}</td><td class="text-center">{}</td>'
+    '<td class="text-right">R$ {}</td><td class="text-right">R$ {}</td></tr>\n'
+)
+LINHA_ESTOQUE = (
+    '<tr><td>{}</td><td>{}</td><td class="text-right">R$ {}</td>'
+    '<td class="text-center">{}</td><td class="text-center {}">{}</td></tr>\n'
+)
+
+LINHAS_POR_SEGMENTO_PADRAO = 2000
+
+
+def linhas_por_segmento():
+    """Produtos por segmento do relatório de estoque (0 desativa a segmentação)"""
+    return settings.ECOMMERCE_SETTINGS.get('RELATORIOS_LINHAS_POR_SEGMENTO', LINHAS_POR_SEGMENTO_PADRAO)
+
+
+def periodo_vendas(parametros):
+    """Período do relatório de vendas (últimos 30 dias se não especificado)"""
+    data_inicio = parametros.get('data_inicio')
+    data_fim = parametros.get('data_fim')
+    if not data_inicio:
+        data_inicio = (timezone.now().date() - timedelta(days=30)).strftime('%Y-%m-%d')
+    if not data_fim:
+        data_fim = timezone.now().date().strftime('%Y-%m-%d')
+    return data_inicio, data_fim
+
+
+def vendas_do_relatorio(parametros):
+    """Vendas consideradas pelo relatório de vendas (sem ordenação)"""
+    data_inicio, data_fim = periodo_vendas(parametros)
+    categoria_id = parametros.get('categoria')
+    produto_id = parametros.get('produto')
+
+    vendas = Venda.objects.filter(filtro_periodo('data_venda', data_inicio, data_fim))
+    if categoria_id:
+        vendas = vendas.filter(produto__categoria_id=categoria_id)
+    if produto_id:
+        vendas = vendas.filter(produto_id=produto_id)
+    return vendas
+
+
+def produtos_do_relatorio(parametros):
+    """Produtos cujas alterações podem mudar o relatório de estoque"""
+    produtos = Produto.objects.all()
+    categoria_id = parametros.get('categoria')
+    if categoria_id:
+        produtos = produtos.filter(categoria_id=categoria_id)
+    return produtos
+
+
+def _moeda(valor):
+    return f'{valor:,.2f}'
+
+
+def _juntar(linhas):
+    # As linhas já saem escapadas
+    return mark_safe(''.join(linhas))
+
+
+def _linhas_vendas(vendas):
+    colunas = vendas.values_list(
+        'data_venda', 'produto__nome', 'produto__categoria__nome',
+        'quantidade', 'preco_unitario', 'valor_total'
+    )
+    for data, produto, categoria, quantidade, preco_unitario, valor_total in colunas:
+        yield LINHA_VENDA.format(
+            timezone.localtime(data).strftime('%d/%m/%Y'), escape(produto), escape(categoria),
+            quantidade, _moeda(preco_unitario), _moeda(valor_total)
+        )
+
+
+def html_relatorio_vendas(parametros):
+    """HTML do relatório de vendas"""
+    # Parâmetros de filtro
+    data_inicio, data_fim = periodo_vendas(parametros)
+    categoria_id = parametros.get('categoria')
+    produto_id = parametros.get('produto')
+
+    # Query base
+    vendas = vendas_do_relatorio(parametros).order_by('-data_venda')
+
+    # Totais e top produtos saem do consolidado diário por produto
+    consolidado = RelatorioVendasProduto.objects.filter(
+        data__gte=data_inicio,
+        data__lte=data_fim
+    )
+    if categoria_id:
+        consolidado = consolidado.filter(produto__categoria_id=categoria_id)
+    if produto_id:
+        consolidado = consolidado.filter(produto_id=produto_id)
+
+    # Calcular totais
+    totais = consolidado.aggregate(
+        total_valor=Sum('total_vendas'),
+        total_quantidade=Sum('produtos_vendidos'),
+        total_vendas=Sum('quantidade_vendas')
+    )
+
+    # Top produtos
+    top_produtos = consolidado.values(
+        'produto__nome', 'produto__categoria__nome'
+    ).annotate(
+        total_vendido=Sum('produtos_vendidos'),
+        valor_total=Sum('total_vendas')
+    ).order_by('-valor_total')[:10]
+
+    total_valor = totais['total_valor'] or 0
+    context = {
+        'linhas': _juntar(_linhas_vendas(vendas[:100])),  # Limitar a 100 vendas
+        'totais': {
+            'total_vendas': totais['total_vendas'] or 0,
+            'total_valor': _moeda(total_valor),
+            'total_quantidade': totais['total_quantidade'] or 0,
+            'ticket_medio': _moeda(total_valor / max(totais['total_vendas'] or 1, 1)),
+        },
+        'top_produtos': top_produtos,
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'data_geracao': timezone.now(),
+        'filtros': {
+            'categoria_id': categoria_id,
+            'produto_id': produto_id,
+        }
+    }
+    return render_to_string('dashboard/relatorios/vendas.html', context)
+
+
+def gerar_relatorio_vendas(parametros):
+    """Gera o relatório de vendas; retorna (pdf, nome_do_arquivo)"""
+    data_inicio, data_fim = periodo_vendas(parametros)
+    html = html_relatorio_vendas(parametros)
+    with medir_renderizacao('vendas'):
+        pdf = renderizar_pdf(html)
+    filename = f'relatorio_vendas_{data_inicio}_{data_fim}.pdf'
+    return pdf, filename
+
+
+def _linhas_estoque(produtos):
+    colunas = produtos.values_list('nome', 'categoria__nome', 'preco', 'estoque')
+    for nome, categoria, preco, estoque in colunas.iterator(chunk_size=2000):
+        if estoque == 0:
+            status_class, status_text = 'sem', 'SEM ESTOQUE'
+        elif estoque < 10:
+            status_class, status_text = 'baixo', 'BAIXO'
+        else:
+            status_class, status_text = 'ok', 'OK'
+        yield LINHA_ESTOQUE.format(
+            escape(nome), escape(categoria), _moeda(preco), estoque, status_class, status_text
+        )
+
+
+def produtos_estoque(parametros):
+    """Produtos do relatório de estoque (ordenados) e estatísticas"""
+    # Parâmetros
+    apenas_baixo = parametros.get('apenas_baixo', 'false').lower() == 'true'
+    categoria_id = parametros.get('categoria')
+
+    # Query base
+    produtos = Produto.objects.filter(ativo=True)
+
+    # Filtros
+    if apenas_baixo:
+        produtos = produtos.filter(estoque__lt=10)
+    if categoria_id:
+        produtos = produtos.filter(categoria_id=categoria_id)
+
+    # Estatísticas (uma consulta só)
+    stats = produtos.aggregate(
+        total_produtos=Count('id'),
+        produtos_sem_estoque=Count('id', filter=Q(estoque=0)),
+        produtos_estoque_baixo=Count('id', filter=Q(estoque__lt=10, estoque__gt=0)),
+        produtos_ok=Count('id', filter=Q(estoque__gte=10)),
+    )
+    return produtos.order_by('estoque', 'nome'), stats
+
+
+def _html_estoque(linhas, stats, data_geracao, continuacao=False):
+    return render_to_string('dashboard/relatorios/estoque.html', {
+        'linhas': _juntar(linhas),
+        'stats': stats,
+        'data_geracao': data_geracao,
+        'continuacao': continuacao,
+    })
+
+
+def html_relatorio_estoque(parametros):
+    """HTML do relatório de estoque"""
+    produtos, stats = produtos_estoque(parametros)
+    return _html_estoque(_linhas_estoque(produtos), stats, timezone.now())
+
+
+def _segmentos_estoque(produtos, stats, data_geracao, tamanho):
+    # HTML em partes de `tamanho` produtos, geradas sob demanda; só a
+    # primeira traz o cabeçalho e o resumo
+    linhas = _linhas_estoque(produtos)
+    bloco = list(islice(linhas, tamanho))
+    yield _html_estoque(bloco, stats, data_geracao)
+    while True:
+        bloco = list(islice(linhas, tamanho))
+        if not bloco:
+            return
+        yield _html_estoque(bloco, stats, data_geracao, continuacao=True)
+
+
+def gerar_relatorio_estoque(parametros):
+    """
+    Gera o relatório de estoque; retorna (pdf, nome_do_arquivo).
+
+    Acima de RELATORIOS_LINHAS_POR_SEGMENTO produtos o PDF é montado em
+    segmentos, para que a memória não cresça com o tamanho do catálogo.
+    """
+    produtos, stats = produtos_estoque(parametros)
+    data_geracao = timezone.now()
+    tamanho = linhas_por_segmento()
+
+    segmentar = bool(tamanho) and stats['total_produtos'] > tamanho
+    if segmentar and not pode_segmentar():
+        logger.warning(
+            'pypdf não instalado: relatório de %s produtos renderizado num único documento',
+            stats['total_produtos']
+        )
+        segmentar = False
+
+    if segmentar:
+        # Os segmentos são montados enquanto os anteriores renderizam,
+        # então a medida inclui a montagem do HTML
+        processos = settings.ECOMMERCE_SETTINGS.get('RELATORIOS_PROCESSOS', 1)
+        with medir_renderizacao('estoque'):
+            pdf = renderizar_segmentos(_segmentos_estoque(produtos, stats, data_geracao, tamanho), processos)
+    else:
+        html = _html_estoque(_linhas_estoque(produtos), stats, data_geracao)
+        with medir_renderizacao('estoque'):
+            pdf = renderizar_pdf(html)
+
+    filename = f'relatorio_estoque_{data_geracao.strftime("%Y%m%d_%H%M%S")}.pdf'
+    return pdf, filename
+
+# Parâmetros aceitos por cada relatório
+PARAMETROS = {
+    'vendas': ['data_inicio', 'data_fim', 'categoria', 'produto'],
+    'estoque': ['apenas_baixo', 'categoria'],
+}
+
+GERADORES = {
+    'vendas': gerar_relatorio_vendas,
+    'estoque': gerar_relatorio_estoque,
+}
+
+
+def gerar_relatorio(tipo, parametros):
+    """Gera o relatório do tipo informado ('vendas' ou 'estoque')"""
+    return GERADORES[tipo](parametros)
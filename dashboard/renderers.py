@@ -0,0 +1,43 @@
+"""
+Formato em colunas (?format=columns) das APIs de gráficos.
+
+Em vez de uma lista de objetos, a resposta traz listas paralelas
+('labels' e uma lista por valor), montadas direto das consultas, sem
+serializers por linha, com valores monetários como números. É o formato
+que o Chart.js consome, sem repetir os nomes dos campos a cada ponto.
+
+O ganho vem só do formato da resposta: o renderer é o JSONRenderer
+comum, e as views convertem cada coluna (datas() e numeros()) uma vez,
+antes de renderizar, de modo que o encoder recebe só tipos nativos.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import ISO_8601, api_settings
+
+FORMATO_COLUNAS = 'columns'
+
+
+class ColunasRenderer(JSONRenderer):
+    """JSONRenderer comum, registrado com o formato 'columns'"""
+    format = FORMATO_COLUNAS
+
+
+def em_colunas(request):
+    """Se a requisição pediu ?format=columns"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return getattr(renderer, 'format', None) == FORMATO_COLUNAS
+
+
+def datas(valores):
+    """Datas no mesmo formato das respostas em linhas (DATE_FORMAT do DRF)"""
+    formato = api_settings.DATE_FORMAT
+    if formato is None or formato.lower() == ISO_8601:
+        return [valor.isoformat() for valor in valores]
+    return [valor.strftime(formato) for valor in valores]
+
+
+def numeros(valores):
+    """Coluna de decimais como números JSON (floats)"""
+    return list(map(float, valores))
+
+
+RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColunasRenderer]
@@ -0,0 +1,133 @@
+"""
+Várias requisições GET da API respondidas numa só (POST /api/batch/).
+
+Cada sub-requisição é resolvida nas rotas de dashboard.urls e executada
+diretamente pela view, no mesmo processo e na mesma conexão com o banco,
+reaproveitando a sessão e o usuário já carregados pela requisição
+externa. Uma página que precisa de N recursos paga os middlewares
+(sessão, CORS, autenticação) e ocupa um worker uma vez só, em vez de N.
+
+Só GETs (somente leitura) das rotas de ROTAS_JSON são aceitos: PDFs,
+exportações e métricas são recusados antes de executar a view.
+"""
+import copy
+import json
+import logging
+from urllib.parse import urlsplit
+
+from django.http import Http404, QueryDict
+from django.urls import Resolver404, resolve, reverse
+from django.utils.datastructures import MultiValueDict
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+URLCONF = 'dashboard.urls'
+
+# Rotas (nomes em dashboard.urls) que respondem JSON a um GET
+ROTAS_JSON = frozenset({
+    'categoria-list', 'categoria-detail',
+    'produto-list', 'produto-detail', 'produto-estoque-baixo',
+    'venda-list', 'venda-detail',
+    'api_dashboard_stats', 'api_grafico_vendas', 'api_grafico_produtos', 'api_grafico_categorias',
+    'ajax_produtos_buscar',
+    'relatorios_disponiveis', 'relatorio_job_status',
+    'configuracoes_loja',
+    'buscar_cep',
+})
+
+# Cabeçalhos da requisição externa que não valem para as sub-requisições
+_CABECALHOS_EXTERNOS = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+)
+
+
+def _base():
+    # Caminho em que dashboard.urls está montado (ex.: /api/)
+    return reverse('api_batch').removesuffix('batch/')
+
+
+def _sub_requisicao(original, caminho, query, etag):
+    """Cópia da requisição externa como um GET em `caminho`"""
+    sub = copy.copy(original)
+    sub.method = 'GET'
+    sub.path = sub.path_info = caminho
+    sub.GET = QueryDict(query)
+    sub._post, sub._files = QueryDict(), MultiValueDict()
+    sub.META = {
+        chave: valor for chave, valor in original.META.items() if chave not in _CABECALHOS_EXTERNOS
+    }
+    sub.META.update(
+        REQUEST_METHOD='GET', PATH_INFO=caminho, QUERY_STRING=query, HTTP_ACCEPT='application/json'
+    )
+    if etag:
+        sub.META['HTTP_IF_NONE_MATCH'] = etag
+    return sub
+
+
+def _resultado(url, resposta):
+    resultado = {'url': url, 'status': resposta.status_code}
+    if resposta.has_header('ETag'):
+        resultado['etag'] = resposta['ETag']
+
+    if resposta.status_code == 304:
+        return resultado
+    if isinstance(resposta, Response):
+        # Os dados ainda não renderizados: o JSON é gerado uma vez só, no fim
+        resultado['data'] = resposta.data
+    else:
+        resultado['data'] = json.loads(resposta.content)
+    resposta.close()
+    return resultado
+
+
+def executar(request, itens):
+    """
+    Executa cada item ("/dashboard/stats/?x=1" ou {"url": ..., "etag": ...},
+    relativo a /api/) como um GET e retorna os resultados, na ordem:
+    {"url", "status", "etag"?, "data" ou "error"}.
+    """
+    base = _base()
+    resultados = []
+    for item in itens:
+        url, etag = (item, None) if isinstance(item, str) else (item.get('url'), item.get('etag'))
+        partes = urlsplit(url)
+        relativo = '/' + partes.path.lstrip('/')
+        try:
+            rota = resolve(relativo, urlconf=URLCONF)
+        except Resolver404:
+            resultados.append({'url': url, 'status': 404, 'error': 'Rota não encontrada'})
+            continue
+        if rota.url_name not in ROTAS_JSON:
+            resultados.append({'url': url, 'status': 400, 'error': 'Rota não disponível em lote'})
+            continue
+
+        sub = _sub_requisicao(request, base + relativo[1:], partes.query, etag)
+        sub.resolver_match = rota
+        try:
+            resposta = rota.func(sub, *rota.args, **rota.kwargs)
+        except Http404:
+            resultados.append({'url': url, 'status': 404, 'error': 'Não encontrado'})
+            continue
+        except Exception:
+            logger.exception('Erro na sub-requisição %s', url)
+            resultados.append({'url': url, 'status': 500, 'error': 'Erro interno'})
+            continue
+        resultados.append(_resultado(url, resposta))
+    return resultados
+
+
+def validar(itens):
+    """Mensagem de erro se `itens` não for uma lista de URLs, ou None"""
+    if not isinstance(itens, list) or not itens:
+        return 'Envie uma lista de URLs (ou {"requisicoes": [...]})'
+    for item in itens:
+        url = item if isinstance(item, str) else item.get('url') if isinstance(item, dict) else None
+        if not isinstance(url, str) or not url:
+            return 'Cada requisição deve ser uma URL ou {"url": ..., "etag": ...}'
+        etag = item.get('etag') if isinstance(item, dict) else None
+        if etag is not None and not isinstance(etag, str):
+            return 'etag deve ser um texto'
+        if urlsplit(url).scheme or urlsplit(url).netloc:
+            return 'Use caminhos relativos a /api/ (ex.: /dashboard/stats/)'
+    return None
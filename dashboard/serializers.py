@@ -1,7 +1,13 @@
 from rest_framework import serializers
 from django.db import transaction
+from datetime import date
 from decimal import Decimal
-from .models import Categoria, Produto, Venda, RelatorioVendas, ConfiguracaoLoja
+from django.urls import reverse
+from .models import (
+    Categoria, Produto, Venda, RelatorioVendas, RelatorioJob, ConfiguracaoLoja,
+    EstoqueInsuficiente
+)
+from .relatorios import PARAMETROS
 
 class CategoriaSerializer(serializers.ModelSerializer):
     """Serializer para o modelo Categoria"""
@@ -14,6 +20,9 @@ class CategoriaSerializer(serializers.ModelSerializer):
     
     def get_produtos_count(self, obj):
         """Retorna o número de produtos ativos da categoria"""
+        # Usa a anotação feita pelo CategoriaViewSet quando disponível
+        if hasattr(obj, 'produtos_count'):
+            return obj.produtos_count
         return obj.produtos.filter(ativo=True).count()
 
 
@@ -43,7 +52,7 @@ class ProdutoDetailSerializer(serializers.ModelSerializer):
     """Serializer completo para detalhes do produto"""
     categoria_nome = serializers.CharField(source='categoria.nome', read_only=True)
     categoria = serializers.PrimaryKeyRelatedField(queryset=Categoria.objects.filter(ativo=True))
-    total_vendido = serializers.SerializerMethodField()
+    total_vendido = serializers.IntegerField(source='produtos_vendidos', read_only=True)
     vendas_recentes = serializers.SerializerMethodField()
     
     class Meta:
@@ -59,13 +68,11 @@ class ProdutoDetailSerializer(serializers.ModelSerializer):
             'vendas_recentes', 'estoque_baixo', 'disponivel'
         ]
     
-    def get_total_vendido(self, obj):
-        """Retorna a quantidade total vendida do produto"""
-        return sum(venda.quantidade for venda in obj.vendas.all())
-    
     def get_vendas_recentes(self, obj):
         """Retorna as 5 vendas mais recentes do produto"""
-        vendas = obj.vendas.all()[:5]
+        vendas = getattr(obj, 'vendas_recentes_lista', None)
+        if vendas is None:
+            vendas = obj.vendas.select_related('produto__categoria')[:5]
         return VendaListSerializer(vendas, many=True).data
     
     def validate_preco(self, value):
@@ -110,8 +117,8 @@ class VendaDetailSerializer(serializers.ModelSerializer):
     
     def validate(self, attrs):
         """Validações customizadas para a venda"""
-        produto = attrs.get('produto')
-        quantidade = attrs.get('quantidade')
+        produto = attrs.get('produto', getattr(self.instance, 'produto', None))
+        quantidade = attrs.get('quantidade', getattr(self.instance, 'quantidade', None))
         
         # Verifica se o produto está ativo
         if not produto.ativo:
@@ -119,14 +126,17 @@ class VendaDetailSerializer(serializers.ModelSerializer):
                 "Não é possível vender um produto inativo."
             )
         
-        # Verifica estoque disponível
-        if produto.estoque < quantidade:
+        # Verifica estoque disponível (na alteração, a quantidade já vendida volta ao estoque)
+        disponivel = produto.estoque
+        if self.instance is not None and self.instance.produto_id == produto.id:
+            disponivel += self.instance.quantidade
+        if disponivel < quantidade:
             raise serializers.ValidationError(
-                f"Estoque insuficiente. Disponível: {produto.estoque} unidades."
+                f"Estoque insuficiente. Disponível: {disponivel} unidades."
             )
         
         # Se não foi informado o preço unitário, usar o preço atual do produto
-        if not attrs.get('preco_unitario'):
+        if not attrs.get('preco_unitario') and 'produto' in attrs:
             attrs['preco_unitario'] = produto.preco
         
         return attrs
@@ -134,23 +144,20 @@ class VendaDetailSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         """Cria uma nova venda com controle de estoque"""
-        return super().create(validated_data)
+        try:
+            return super().create(validated_data)
+        except EstoqueInsuficiente as e:
+            # Outra venda consumiu o estoque depois da validação
+            raise serializers.ValidationError(str(e))
     
     @transaction.atomic
     def update(self, instance, validated_data):
         """Atualiza uma venda existente"""
-        # Para atualizações, primeiro restaura o estoque da venda original
-        produto_original = instance.produto
-        quantidade_original = instance.quantidade
-        
-        # Restaura o estoque
-        produto_original.estoque += quantidade_original
-        produto_original.save()
-        
-        # Aplica as mudanças
-        instance = super().update(instance, validated_data)
-        
-        return instance
+        # Venda.save aplica no estoque apenas a diferença em relação à venda gravada
+        try:
+            return super().update(instance, validated_data)
+        except EstoqueInsuficiente as e:
+            raise serializers.ValidationError(str(e))
 
 
 class RelatorioVendasSerializer(serializers.ModelSerializer):
@@ -161,6 +168,67 @@ class RelatorioVendasSerializer(serializers.ModelSerializer):
         fields = ['data', 'total_vendas', 'quantidade_vendas', 'produtos_vendidos']
 
 
+class RelatorioJobSerializer(serializers.ModelSerializer):
+    """Serializer para os jobs da fila de relatórios"""
+    url_status = serializers.SerializerMethodField()
+    url_download = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = RelatorioJob
+        fields = [
+            'id', 'tipo', 'parametros', 'status', 'nome_arquivo', 'erro',
+            'criado_em', 'iniciado_em', 'concluido_em', 'url_status', 'url_download'
+        ]
+        read_only_fields = [
+            'id', 'status', 'nome_arquivo', 'erro', 'criado_em',
+            'iniciado_em', 'concluido_em'
+        ]
+    
+    def get_url_status(self, obj):
+        return reverse('relatorio_job_status', args=[obj.pk])
+    
+    def get_url_download(self, obj):
+        if obj.status != 'concluido':
+            return None
+        return reverse('relatorio_job_download', args=[obj.pk])
+    
+    def validate(self, attrs):
+        """Aceita apenas os parâmetros conhecidos do relatório"""
+        parametros = attrs.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            raise serializers.ValidationError({'parametros': 'Envie um objeto com os filtros'})
+        
+        desconhecidos = set(parametros) - set(PARAMETROS[attrs['tipo']])
+        if desconhecidos:
+            raise serializers.ValidationError({
+                'parametros': f"Parâmetros inválidos: {', '.join(sorted(desconhecidos))}"
+            })
+        
+        # Os geradores recebem os filtros como texto, igual à query string
+        parametros = {
+            chave: str(valor).lower() if isinstance(valor, bool) else str(valor)
+            for chave, valor in parametros.items()
+            if valor not in (None, '')
+        }
+        
+        # Valores inválidos não chegam aos workers
+        erros = {}
+        for chave in ('data_inicio', 'data_fim'):
+            if chave in parametros:
+                try:
+                    date.fromisoformat(parametros[chave])
+                except ValueError:
+                    erros[chave] = 'Data inválida, use AAAA-MM-DD'
+        for chave in ('categoria', 'produto'):
+            if chave in parametros and not parametros[chave].isdigit():
+                erros[chave] = 'Informe o id numérico'
+        if erros:
+            raise serializers.ValidationError({'parametros': erros})
+        
+        attrs['parametros'] = parametros
+        return attrs
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer para estatísticas do dashboard"""
     total_produtos = serializers.IntegerField()
@@ -194,6 +262,7 @@ class GraficoCategoriaSerializer(serializers.Serializer):
     """Serializer para dados dos gráficos por categoria"""
     categoria = serializers.CharField()
     total_produtos = serializers.IntegerField()
+    produtos_ativos = serializers.IntegerField()
     total_vendas = serializers.DecimalField(max_digits=15, decimal_places=2)
     quantidade_vendida = serializers.IntegerField()
 
@@ -0,0 +1,80 @@
+"""
+Séries temporais de vendas para os gráficos.
+
+As séries saem do consolidado diário (RelatorioVendas), agrupado por
+dia, semana ou mês no próprio banco, então o custo depende do número de
+dias do período e não do número de vendas. Períodos sem vendas aparecem
+zerados.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import RelatorioVendas
+
+GRANULARIDADES = ('day', 'week', 'month')
+
+_TRUNCAR = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def inicio_do_periodo(data, granularidade):
+    """Primeiro dia do período (dia, semana começando na segunda ou mês) da data"""
+    if granularidade == 'week':
+        return data - timedelta(days=data.weekday())
+    if granularidade == 'month':
+        return data.replace(day=1)
+    return data
+
+
+def proximo_periodo(data, granularidade):
+    """Início do período seguinte ao que começa em `data`"""
+    if granularidade == 'week':
+        return data + timedelta(days=7)
+    if granularidade == 'month':
+        return (data.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return data + timedelta(days=1)
+
+
+def colunas_vendas(data_inicio, data_fim, granularidade='day'):
+    """
+    Série de data_inicio a data_fim em colunas: (datas, totais,
+    quantidades), um item por período (identificado pelo seu primeiro dia).
+    O primeiro período é sempre completo: data_inicio recua até o início
+    da semana ou do mês.
+    """
+    data_inicio = inicio_do_periodo(data_inicio, granularidade)
+    dias = RelatorioVendas.objects.filter(data__gte=data_inicio, data__lte=data_fim)
+    if granularidade in _TRUNCAR:
+        linhas = dias.annotate(periodo=_TRUNCAR[granularidade]('data')).values('periodo').annotate(
+            total=Sum('total_vendas'), quantidade=Sum('quantidade_vendas')
+        ).values_list('periodo', 'total', 'quantidade').order_by()
+    else:
+        linhas = dias.values_list('data', 'total_vendas', 'quantidade_vendas').order_by()
+    valores = {periodo: (total, quantidade) for periodo, total, quantidade in linhas}
+
+    datas, totais, quantidades = [], [], []
+    periodo = data_inicio
+    zero = (Decimal('0.00'), 0)
+    while periodo <= data_fim:
+        total, quantidade = valores.get(periodo, zero)
+        datas.append(periodo)
+        totais.append(total)
+        quantidades.append(quantidade)
+        periodo = proximo_periodo(periodo, granularidade)
+    return datas, totais, quantidades
+
+
+def serie_vendas(data_inicio, data_fim, granularidade='day'):
+    """
+    Lista de {'data', 'total_vendas', 'quantidade_vendas'} de data_inicio
+    a data_fim, um item por período.
+    """
+    return [
+        {'data': data, 'total_vendas': total, 'quantidade_vendas': quantidade}
+        for data, total, quantidade in zip(*colunas_vendas(data_inicio, data_fim, granularidade))
+    ]
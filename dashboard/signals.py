@@ -0,0 +1,52 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .busca import sincronizar_fts_sqlite
+from .caching import invalidar
+from .consolidacao import aplicar_delta_categoria, remover_venda
+from .models import Categoria, Produto, Venda
+
+
+@receiver(post_delete, sender=Venda)
+def venda_excluida(sender, instance, **kwargs):
+    """Subtrai a venda excluída dos relatórios consolidados"""
+    remover_venda(instance)
+    invalidar('venda', 'produto')
+
+
+@receiver(post_save, sender=Venda)
+def venda_salva(sender, instance, **kwargs):
+    """Vendas alteram o estoque, então invalidam também os produtos"""
+    invalidar('venda', 'produto')
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def produto_alterado(sender, instance, **kwargs):
+    invalidar('produto')
+
+
+@receiver(post_delete, sender=Produto)
+def produto_excluido(sender, instance, **kwargs):
+    """
+    Um produto ativo excluído deixa de contar na sua categoria e sai do
+    índice de autocomplete (que reconstrói ao ver a geração nova)
+    """
+    invalidar('produto_exclusao')
+    # Os totais de vendas já saíram com as vendas excluídas em cascata
+    if instance.ativo:
+        aplicar_delta_categoria(instance.categoria_id, produtos_ativos=-1)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def categoria_alterada(sender, instance, **kwargs):
+    invalidar('categoria')
+
+
+@receiver(post_migrate)
+def migracoes_aplicadas(sender, using, **kwargs):
+    """Restaura os triggers da busca que uma migração possa ter apagado"""
+    if sender.name == 'dashboard' and connections[using].vendor == 'sqlite':
+        sincronizar_fts_sqlite(connections[using])
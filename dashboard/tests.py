@@ -1,3 +1,1329 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from prometheus_client import REGISTRY
+
+from . import autocomplete, cache_pdf, metricas, viacep
+from .busca import sincronizar_fts_sqlite, sugerir_produtos
+from .caching import invalidar
+from .consolidacao import reconciliar_contadores, recontar_produtos_ativos, reconstruir_categorias
+from .fila import descartar_jobs_antigos, executar_trabalhador, reservar_proximo
+from .lote import registrar_vendas_em_lote
+from .management.commands.bench import medir, semear
+from . import pdf
+from .pdf import folha_de_estilos
+from .relatorios import gerar_relatorio_estoque, html_relatorio_estoque, html_relatorio_vendas
+from .series import colunas_vendas
+from .utils import filtro_periodo
+from .models import (
+    Categoria, Produto, Venda, RelatorioVendas, RelatorioVendasProduto, RelatorioCategoria,
+    RelatorioJob, EstoqueInsuficiente
+)
+
+
+class DadosMixin:
+    """Cria uma categoria e um produto básicos para os testes"""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nome='Eletrônicos')
+        self.produto = Produto.objects.create(
+            nome='Fone', preco=Decimal('50.00'), estoque=100, categoria=self.categoria
+        )
+
+    def vender(self, quantidade, produto=None):
+        return Venda.objects.create(
+            produto=produto or self.produto,
+            quantidade=quantidade,
+            preco_unitario=(produto or self.produto).preco,
+        )
+
+
+class RelatorioConsolidadoTests(DadosMixin, TestCase):
+    """Manutenção incremental de RelatorioVendas"""
+
+    def test_venda_criada_alterada_e_excluida(self):
+        venda = self.vender(2)
+        self.vender(1)
+
+        dia = RelatorioVendas.objects.get(data=timezone.localdate())
+        self.assertEqual(dia.total_vendas, Decimal('150.00'))
+        self.assertEqual(dia.quantidade_vendas, 2)
+        self.assertEqual(dia.produtos_vendidos, 3)
+
+        venda.quantidade = 4
+        venda.save()
+        dia.refresh_from_db()
+        self.assertEqual(dia.total_vendas, Decimal('250.00'))
+        self.assertEqual(dia.produtos_vendidos, 5)
+
+        venda.delete()
+        dia.refresh_from_db()
+        self.assertEqual(dia.total_vendas, Decimal('50.00'))
+        self.assertEqual(dia.quantidade_vendas, 1)
+
+        por_produto = RelatorioVendasProduto.objects.get(produto=self.produto)
+        self.assertEqual(por_produto.produtos_vendidos, 1)
+
+    def test_reconstruir_relatorios(self):
+        self.vender(3)
+        self.vender(2)
+        esperado = list(RelatorioVendas.objects.values_list(
+            'data', 'total_vendas', 'quantidade_vendas', 'produtos_vendidos'
+        ))
+        RelatorioVendas.objects.all().delete()
+        RelatorioVendasProduto.objects.all().delete()
+
+        call_command('reconstruir_relatorios', stdout=StringIO())
+
+        self.assertEqual(list(RelatorioVendas.objects.values_list(
+            'data', 'total_vendas', 'quantidade_vendas', 'produtos_vendidos'
+        )), esperado)
+        self.assertEqual(RelatorioVendasProduto.objects.count(), 1)
+
+
+class EstoqueTests(DadosMixin, TestCase):
+    """Reserva de estoque na criação, alteração e exclusão de vendas"""
+
+    def test_venda_nao_ultrapassa_estoque(self):
+        self.produto.estoque = 3
+        self.produto.save()
+
+        self.vender(3)
+        with self.assertRaises(EstoqueInsuficiente):
+            self.vender(1)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque, 0)
+
+    def test_alteracao_e_exclusao_ajustam_estoque(self):
+        venda = self.vender(10)
+        venda.quantidade = 4
+        venda.save()
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque, 96)
+
+        venda.delete()
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque, 100)
+
+    def test_api_recusa_venda_sem_estoque(self):
+        resposta = self.client.post('/api/vendas/', {
+            'produto': self.produto.id, 'quantidade': 101, 'preco_unitario': '50.00'
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+        resposta = self.client.post('/api/vendas/', {
+            'produto': self.produto.id, 'quantidade': 5, 'preco_unitario': '50.00'
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()['produto_estoque'], 95)
+
+
+class ContadoresVendasTests(DadosMixin, TestCase):
+    """Contadores de vendas mantidos no Produto"""
+
+    def contadores(self, produto=None):
+        return Produto.objects.values_list(
+            'produtos_vendidos', 'quantidade_vendas', 'total_vendas'
+        ).get(pk=(produto or self.produto).pk)
+
+    def test_venda_alterada_e_excluida(self):
+        desatualizado = Produto.objects.get(pk=self.produto.pk)
+        primeira = self.vender(2)
+        segunda = self.vender(3)
+        self.assertEqual(self.contadores(), (5, 2, Decimal('250.00')))
+        self.assertEqual(Produto.objects.get(pk=self.produto.pk).ultima_venda, segunda.data_venda)
+
+        # Salvar uma instância carregada antes das vendas não zera os contadores
+        desatualizado.nome = 'Fone Bluetooth'
+        desatualizado.save()
+        self.assertEqual(self.contadores(), (5, 2, Decimal('250.00')))
+
+        primeira.quantidade = 4
+        primeira.save()
+        self.assertEqual(self.contadores(), (7, 2, Decimal('350.00')))
+
+        segunda.delete()
+        produto = Produto.objects.get(pk=self.produto.pk)
+        self.assertEqual(self.contadores(), (4, 1, Decimal('200.00')))
+        self.assertEqual(produto.ultima_venda, primeira.data_venda)
+
+    def test_lote_e_reconciliacao(self):
+        registrar_vendas_em_lote([
+            {'produto': self.produto.id, 'quantidade': 2},
+            {'produto': self.produto.id, 'quantidade': 1, 'preco_unitario': '40.00'},
+        ])
+        self.assertEqual(self.contadores(), (3, 2, Decimal('140.00')))
+        self.assertEqual(reconciliar_contadores(), [])
+
+        Produto.objects.filter(pk=self.produto.pk).update(produtos_vendidos=99)
+        saida = StringIO()
+        call_command('reconciliar_contadores', stdout=saida)
+        self.assertIn('1 produto(s) corrigido(s)', saida.getvalue())
+        self.assertEqual(self.contadores(), (3, 2, Decimal('140.00')))
+
+    def test_grafico_produtos_usa_contadores(self):
+        outro = Produto.objects.create(
+            nome='Cabo', preco=Decimal('10.00'), estoque=20, categoria=self.categoria
+        )
+        for _ in range(3):
+            self.vender(1)
+        self.vender(5, outro)
+
+        with self.assertNumQueries(1):
+            dados = self.client.get('/api/dashboard/grafico-produtos/?limite=1').json()
+        self.assertEqual(dados, [{
+            'nome': 'Cabo', 'categoria': 'Eletrônicos', 'total_vendido': 5,
+            'valor_total': '50.00', 'estoque_atual': 15,
+        }])
+
+
+class ConsolidadoCategoriaTests(DadosMixin, TestCase):
+    """Consolidado por categoria mantido pelas vendas e pelos produtos"""
+
+    def consolidado(self):
+        # Categorias sem vendas nem produtos ativos podem ou não ter linha
+        return {
+            linha[0]: linha[1:] for linha in RelatorioCategoria.objects.values_list(
+                'categoria_id', 'total_vendas', 'quantidade_vendas', 'produtos_vendidos',
+                'produtos_com_vendas', 'produtos_ativos'
+            ) if any(linha[1:])
+        }
+
+    def assertConsolidadoCorreto(self):
+        incremental = self.consolidado()
+        reconstruir_categorias()
+        self.assertEqual(incremental, self.consolidado())
+
+    def test_vendas_e_mudancas_de_produto(self):
+        casa = Categoria.objects.create(nome='Casa')
+        cabo = Produto.objects.create(nome='Cabo', preco=Decimal('10.00'), estoque=50, categoria=self.categoria)
+        venda = self.vender(2)
+        self.vender(1)
+        registrar_vendas_em_lote([
+            {'produto': cabo.id, 'quantidade': 3},
+            {'produto': self.produto.id, 'quantidade': 1},
+        ])
+        self.assertEqual(
+            self.consolidado()[self.categoria.id],
+            (Decimal('230.00'), 4, 7, 2, 2)
+        )
+        self.assertConsolidadoCorreto()
+
+        # Produto muda de categoria levando suas vendas
+        cabo.categoria = casa
+        cabo.save()
+        self.assertEqual(self.consolidado()[casa.id], (Decimal('30.00'), 1, 3, 1, 1))
+        self.assertConsolidadoCorreto()
+
+        # Venda trocada de produto, alterada e excluída
+        venda.produto = cabo
+        venda.preco_unitario = cabo.preco
+        venda.save()
+        self.assertConsolidadoCorreto()
+        venda.delete()
+        self.assertConsolidadoCorreto()
+
+        cabo.ativo = False
+        cabo.save()
+        self.assertEqual(self.consolidado()[casa.id][4], 0)
+        self.assertConsolidadoCorreto()
+
+        self.produto.delete()
+        self.assertNotIn(self.categoria.id, self.consolidado())
+        self.assertConsolidadoCorreto()
+
+    def test_recontar_produtos_ativos(self):
+        Produto.objects.create(nome='Cabo', preco=Decimal('10.00'), estoque=5, categoria=self.categoria)
+        Produto.objects.filter(pk=self.produto.pk).update(ativo=False)
+        recontar_produtos_ativos([self.categoria.id])
+        self.assertEqual(self.consolidado()[self.categoria.id][4], 1)
+        self.assertConsolidadoCorreto()
+
+    def test_graficos_leem_o_consolidado(self):
+        casa = Categoria.objects.create(nome='Casa')
+        vaso = Produto.objects.create(nome='Vaso', preco=Decimal('200.00'), estoque=10, categoria=casa)
+        self.vender(3)
+        self.vender(1, vaso)
+
+        with self.assertNumQueries(1):
+            dados = self.client.get('/api/dashboard/grafico-categorias/').json()
+        self.assertEqual(dados, [
+            {'categoria': 'Casa', 'total_produtos': 1, 'produtos_ativos': 1,
+             'total_vendas': '200.00', 'quantidade_vendida': 1},
+            {'categoria': 'Eletrônicos', 'total_produtos': 1, 'produtos_ativos': 1,
+             'total_vendas': '150.00', 'quantidade_vendida': 3},
+        ])
+        stats = self.client.get('/api/dashboard/stats/').json()
+        self.assertEqual(stats['categoria_mais_vendida'], 'Eletrônicos')
+
+
+class EstoqueConcorrenteTests(TransactionTestCase):
+    """Teste de estresse: várias threads vendendo o mesmo produto"""
+
+    threads = 8
+    vendas_por_thread = 25
+    estoque_inicial = 120
+
+    tentativas = 200
+
+    def _vender_em_paralelo(self, produto_id):
+        vendidas = []
+        # Vendas que esgotaram as tentativas por causa de banco travado
+        desistencias = []
+        lock = threading.Lock()
+
+        def comprar():
+            try:
+                for _ in range(self.vendas_por_thread):
+                    for tentativa in range(self.tentativas):
+                        try:
+                            Venda.objects.create(
+                                produto_id=produto_id, quantidade=1,
+                                preco_unitario=Decimal('10.00')
+                            )
+                        except EstoqueInsuficiente:
+                            break
+                        except OperationalError:
+                            # SQLite serializa escritas: aguarda e tenta de novo
+                            time.sleep(0.001 * (tentativa % 10 + 1))
+                            continue
+                        with lock:
+                            vendidas.append(1)
+                        break
+                    else:
+                        with lock:
+                            desistencias.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=comprar) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return len(vendidas), len(desistencias)
+
+    def test_sem_venda_acima_do_estoque(self):
+        categoria = Categoria.objects.create(nome='Estresse')
+        produto = Produto.objects.create(
+            nome='Disputado', preco=Decimal('10.00'),
+            estoque=self.estoque_inicial, categoria=categoria
+        )
+
+        vendidas, desistencias = self._vender_em_paralelo(produto.id)
+
+        produto.refresh_from_db()
+        # Toda venda terminou (vendida ou recusada por estoque), nenhuma por travamento
+        self.assertEqual(desistencias, 0)
+        self.assertEqual(vendidas, self.estoque_inicial)
+        self.assertEqual(produto.estoque, 0)
+        self.assertEqual(Venda.objects.filter(produto=produto).count(), self.estoque_inicial)
+
+
+class VendasEmLoteTests(DadosMixin, TestCase):
+    """POST /api/vendas/bulk/"""
+
+    def test_lote_com_erros_por_item(self):
+        outro = Produto.objects.create(
+            nome='Cabo', preco=Decimal('10.00'), estoque=5, categoria=self.categoria
+        )
+        itens = [
+            {'produto': self.produto.id, 'quantidade': 2},
+            {'produto': outro.id, 'quantidade': 4, 'preco_unitario': '9.50'},
+            {'produto': outro.id, 'quantidade': 2},
+            {'produto': 9999, 'quantidade': 1},
+            {'produto': self.produto.id, 'quantidade': 0},
+        ]
+
+        resposta = self.client.post(
+            '/api/vendas/bulk/', {'vendas': itens}, content_type='application/json'
+        )
+
+        self.assertEqual(resposta.status_code, 201)
+        dados = resposta.json()
+        self.assertEqual(dados['criadas'], 2)
+        self.assertEqual([erro['indice'] for erro in dados['erros']], [2, 3, 4])
+
+        self.produto.refresh_from_db()
+        outro.refresh_from_db()
+        self.assertEqual(self.produto.estoque, 98)
+        self.assertEqual(outro.estoque, 1)
+
+        dia = RelatorioVendas.objects.get(data=timezone.localdate())
+        self.assertEqual(dia.total_vendas, Decimal('138.00'))
+        self.assertEqual(dia.quantidade_vendas, 2)
+
+
+class CacheDashboardTests(DadosMixin, TestCase):
+    """Cache das APIs do dashboard invalidado por gerações"""
+
+    def test_stats_em_cache_ate_nova_venda(self):
+        self.client.get('/api/dashboard/stats/')
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/dashboard/stats/')
+        self.assertEqual(resposta.json()['quantidade_vendas_hoje'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(2)
+
+        resposta = self.client.get('/api/dashboard/stats/')
+        self.assertEqual(resposta.json()['quantidade_vendas_hoje'], 1)
+
+    def test_chave_inclui_parametros(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(1)
+        serie = self.client.get('/api/dashboard/grafico-vendas/?dias=7').json()
+        self.assertEqual([ponto['quantidade_vendas'] for ponto in serie], [0] * 7 + [1])
+        with self.assertNumQueries(1):
+            self.client.get('/api/dashboard/grafico-vendas/?dias=30')
+
+
+class GetCondicionalTests(DadosMixin, TestCase):
+    """ETag e 304 nas APIs de leitura"""
+
+    def test_lista_de_produtos(self):
+        resposta = self.client.get('/api/produtos/')
+        etag = resposta['ETag']
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/produtos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta['ETag'], etag)
+        self.assertEqual(resposta.content, b'')
+
+        # Outros parâmetros, outra representação
+        self.assertNotEqual(self.client.get('/api/produtos/?ativo=true')['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/produtos/', HTTP_ACCEPT='text/html')['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.nome = 'Fone Bluetooth'
+            self.produto.save()
+        resposta = self.client.get('/api/produtos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+
+    def test_detalhe_muda_com_nova_venda(self):
+        url = f'/api/produtos/{self.produto.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_dashboard(self):
+        etag = self.client.get('/api/dashboard/stats/')['ETag']
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/dashboard/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+        # A resposta vinda do cache leva a mesma ETag
+        self.assertEqual(self.client.get('/api/dashboard/stats/')['ETag'], etag)
+
+    def test_escrita_ignora_if_none_match(self):
+        etag = self.client.get('/api/categorias/')['ETag']
+        resposta = self.client.post(
+            '/api/categorias/', {'nome': 'Casa'}, content_type='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(resposta.status_code, 201)
+
+
+class GraficoVendasTests(TestCase):
+    """Séries do gráfico de vendas a partir do consolidado diário"""
+
+    def setUp(self):
+        cache.clear()
+        self.hoje = timezone.localdate()
+        for dias_atras, total in ((0, '10.00'), (1, '5.50'), (40, '7.00'), (400, '1.00')):
+            RelatorioVendas.objects.create(
+                data=self.hoje - timedelta(days=dias_atras), total_vendas=Decimal(total),
+                quantidade_vendas=1, produtos_vendidos=1
+            )
+
+    def serie(self, parametros):
+        resposta = self.client.get(f'/api/dashboard/grafico-vendas/?{parametros}')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_dias_sem_vendas_zerados(self):
+        serie = self.serie('dias=3')
+        self.assertEqual([ponto['data'] for ponto in serie], [
+            (self.hoje - timedelta(days=dias)).strftime('%d/%m/%Y') for dias in (3, 2, 1, 0)
+        ])
+        self.assertEqual([ponto['total_vendas'] for ponto in serie], ['0.00', '0.00', '5.50', '10.00'])
+
+    def test_semanas_e_meses(self):
+        semanas = self.serie('dias=60&granularity=week')
+        self.assertTrue(all(
+            datetime.strptime(ponto['data'], '%d/%m/%Y').weekday() == 0 for ponto in semanas
+        ))
+        self.assertEqual(sum(Decimal(ponto['total_vendas']) for ponto in semanas), Decimal('22.50'))
+        self.assertEqual(sum(ponto['quantidade_vendas'] for ponto in semanas), 3)
+
+        meses = self.serie('dias=730&granularity=month')
+        self.assertIn(len(meses), (24, 25))
+        self.assertTrue(all(ponto['data'].startswith('01/') for ponto in meses))
+        self.assertEqual(sum(Decimal(ponto['total_vendas']) for ponto in meses), Decimal('23.50'))
+
+        with self.assertNumQueries(1):
+            self.serie('dias=3650&granularity=day')
+
+    def test_primeiro_periodo_completo(self):
+        # Começando numa quarta-feira, a semana (e o mês) rotulada na
+        # segunda-feira 01/06 inclui as vendas de segunda e terça
+        for data, total in ((date(2026, 6, 1), '3.00'), (date(2026, 6, 2), '4.00'), (date(2026, 6, 8), '2.00')):
+            RelatorioVendas.objects.create(
+                data=data, total_vendas=Decimal(total), quantidade_vendas=1, produtos_vendidos=1
+            )
+        datas, totais, quantidades = colunas_vendas(date(2026, 6, 3), date(2026, 6, 9), 'week')
+        self.assertEqual(datas, [date(2026, 6, 1), date(2026, 6, 8)])
+        self.assertEqual(totais, [Decimal('7.00'), Decimal('2.00')])
+        self.assertEqual(quantidades, [2, 1])
+
+        datas, totais, _ = colunas_vendas(date(2026, 6, 3), date(2026, 6, 9), 'month')
+        self.assertEqual((datas, totais), ([date(2026, 6, 1)], [Decimal('9.00')]))
+
+    def test_parametros_invalidos(self):
+        for parametros in ('granularity=year', 'dias=abc', 'dias=-1', 'dias=100000'):
+            resposta = self.client.get(f'/api/dashboard/grafico-vendas/?{parametros}')
+            self.assertEqual(resposta.status_code, 400)
+
+    def test_formato_em_colunas(self):
+        linhas = self.serie('dias=60&granularity=week')
+        colunas = self.serie('dias=60&granularity=week&format=columns')
+        self.assertEqual(colunas['labels'], [ponto['data'] for ponto in linhas])
+        self.assertEqual(colunas['total_vendas'], [float(ponto['total_vendas']) for ponto in linhas])
+        self.assertEqual(colunas['quantidade_vendas'], [ponto['quantidade_vendas'] for ponto in linhas])
+
+        # Representações diferentes: ETags diferentes
+        etag = self.client.get('/api/dashboard/grafico-vendas/?dias=3')['ETag']
+        resposta = self.client.get('/api/dashboard/grafico-vendas/?dias=3&format=columns', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+
+
+class GraficosEmColunasTests(DadosMixin, TestCase):
+    """?format=columns nos gráficos de produtos e categorias"""
+
+    def comparar(self, url, rotulo, decimais):
+        self.vender(2)
+        linhas = self.client.get(url).json()
+        colunas = self.client.get(f'{url}?format=columns').json()
+        self.assertEqual(colunas['labels'], [linha[rotulo] for linha in linhas])
+        for campo in linhas[0]:
+            if campo == rotulo:
+                continue
+            esperado = [linha[campo] for linha in linhas]
+            if campo in decimais:
+                esperado = [float(valor) for valor in esperado]
+            self.assertEqual(colunas[campo], esperado, campo)
+
+    def test_produtos(self):
+        self.comparar('/api/dashboard/grafico-produtos/', 'nome', {'valor_total'})
+
+    def test_categorias(self):
+        self.comparar('/api/dashboard/grafico-categorias/', 'categoria', {'total_vendas'})
+
+    def test_sem_dados(self):
+        colunas = self.client.get('/api/dashboard/grafico-produtos/?format=columns').json()
+        self.assertEqual(colunas['labels'], [])
+        self.assertEqual(colunas['valor_total'], [])
+
+
+class DashboardStatsTests(DadosMixin, TestCase):
+    """Consultas de dashboard_stats_api"""
+
+    def test_numero_fixo_de_consultas(self):
+        outra = Categoria.objects.create(nome='Casa')
+        for indice in range(5):
+            produto = Produto.objects.create(
+                nome=f'Produto {indice}', preco=Decimal('10.00'), estoque=indice * 5,
+                categoria=outra
+            )
+            if produto.estoque:
+                self.vender(produto.estoque, produto=produto)
+        self.vender(3)
+
+        with self.assertNumQueries(4):
+            resposta = self.client.get('/api/dashboard/stats/')
+
+        dados = resposta.json()
+        self.assertEqual(dados['produtos_ativos'], 6)
+        self.assertEqual(dados['produtos_estoque_baixo'], 5)
+        self.assertEqual(dados['quantidade_vendas_hoje'], 5)
+        self.assertEqual(dados['produto_mais_vendido'], 'Produto 4')
+        self.assertEqual(dados['categoria_mais_vendida'], 'Casa')
+
+    def test_mais_vendidos_ordenados_e_limitados_no_banco(self):
+        self.vender(3)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/dashboard/stats/')
+        ordenadas = [consulta['sql'] for consulta in consultas if 'ORDER BY' in consulta['sql']]
+        self.assertEqual(len(ordenadas), 2)
+        self.assertTrue(all('LIMIT 1' in sql for sql in ordenadas), ordenadas)
+
+
+class IndicesTests(DadosMixin, TestCase):
+    """Os filtros quentes usam os índices declarados (via EXPLAIN)"""
+
+    def test_periodo_de_vendas_usa_indice_de_data(self):
+        hoje = timezone.localdate()
+        plano = Venda.objects.filter(filtro_periodo('data_venda', hoje, hoje)).explain()
+        self.assertIn('venda_data_idx', plano)
+
+    def test_vendas_do_produto_no_periodo(self):
+        hoje = timezone.localdate()
+        plano = Venda.objects.filter(
+            filtro_periodo('data_venda', hoje), produto=self.produto
+        ).explain()
+        self.assertIn('venda_produto_data_idx', plano)
+
+    def test_estoque_baixo_usa_indice(self):
+        plano = Produto.objects.filter(ativo=True, estoque__lt=10).order_by().explain()
+        self.assertRegex(plano, r'produto_(estoque_baixo|ativo_estoque)_idx')
+
+    def test_filtro_de_periodo_na_api(self):
+        self.vender(1)
+        hoje = timezone.localdate().isoformat()
+        resposta = self.client.get(f'/api/vendas/?data_inicio={hoje}&data_fim={hoje}')
+        self.assertEqual(resposta.json()['count'], 1)
+        resposta = self.client.get('/api/vendas/?data_inicio=ontem')
+        self.assertEqual(resposta.status_code, 400)
+
+
+class ConsultasConstantesTests(DadosMixin, TestCase):
+    """Listagens e detalhes sem N+1 consultas"""
+
+    def _popular(self, quantidade):
+        inicio = Categoria.objects.count()
+        for indice in range(inicio, inicio + quantidade):
+            categoria = Categoria.objects.create(nome=f'Categoria {indice}')
+            produto = Produto.objects.create(
+                nome=f'Produto {indice}', preco=Decimal('10.00'), estoque=8,
+                categoria=categoria
+            )
+            for _ in range(3):
+                self.vender(1, produto=produto)
+
+    def test_listagem_de_categorias(self):
+        self._popular(2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/categorias/')
+        self._popular(6)
+        with self.assertNumQueries(2):
+            resposta = self.client.get('/api/categorias/')
+        self.assertEqual(resposta.json()['results'][1]['produtos_count'], 1)
+
+    def test_detalhe_e_estoque_baixo_de_produtos(self):
+        self._popular(2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/produtos/estoque_baixo/')
+        self._popular(6)
+        with self.assertNumQueries(2):
+            resposta = self.client.get('/api/produtos/estoque_baixo/')
+        self.assertEqual(len(resposta.json()), 8)
+
+        produto = Produto.objects.get(nome='Produto 4')
+        with self.assertNumQueries(2):
+            resposta = self.client.get(f'/api/produtos/{produto.id}/')
+        dados = resposta.json()
+        self.assertEqual(dados['total_vendido'], 3)
+        self.assertEqual(len(dados['vendas_recentes']), 3)
+        self.assertEqual(dados['vendas_recentes'][0]['categoria_nome'], 'Categoria 4')
+
+
+class ArquivosTemporariosMixin:
+    """Usa diretórios temporários para MEDIA_ROOT e o cache de PDFs"""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(
+            MEDIA_ROOT=self.media,
+            ECOMMERCE_SETTINGS={
+                **settings.ECOMMERCE_SETTINGS,
+                'RELATORIOS_CACHE_DIR': f'{self.media}/cache',
+            },
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+
+class FilaRelatoriosTests(ArquivosTemporariosMixin, DadosMixin, TestCase):
+    """Geração de relatórios PDF em segundo plano"""
+
+    def test_enfileirar_processar_e_baixar(self):
+        resposta = self.client.post('/api/relatorios/jobs/', {
+            'tipo': 'estoque', 'parametros': {'apenas_baixo': True}
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 202)
+        job = resposta.json()
+        self.assertEqual(job['status'], 'pendente')
+        self.assertIsNone(job['url_download'])
+
+        self.assertEqual(executar_trabalhador(parar_quando_vazia=True), 1)
+
+        job = self.client.get(job['url_status']).json()
+        self.assertEqual(job['status'], 'concluido')
+        resposta = self.client.get(job['url_download'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(resposta.streaming_content).startswith(b'%PDF'))
+
+    def test_jobs_expirados_sao_apagados(self):
+        resposta = self.client.post('/api/relatorios/jobs/', {'tipo': 'estoque'}, content_type='application/json')
+        executar_trabalhador(parar_quando_vazia=True)
+        job = RelatorioJob.objects.get(pk=resposta.json()['id'])
+        caminho = job.arquivo.path
+        self.assertTrue(os.path.exists(caminho))
+
+        self.assertEqual(descartar_jobs_antigos(), 0)
+        RelatorioJob.objects.filter(pk=job.pk).update(concluido_em=timezone.now() - timedelta(days=2))
+        executar_trabalhador(parar_quando_vazia=True)
+        self.assertFalse(RelatorioJob.objects.filter(pk=job.pk).exists())
+        self.assertFalse(os.path.exists(caminho))
+
+    def test_job_reservado_por_um_unico_worker(self):
+        self.client.post('/api/relatorios/jobs/', {'tipo': 'vendas'}, content_type='application/json')
+        self.assertIsNotNone(reservar_proximo())
+        self.assertIsNone(reservar_proximo())
+
+    def test_parametros_invalidos(self):
+        resposta = self.client.post('/api/relatorios/jobs/', {
+            'tipo': 'estoque', 'parametros': {'data_inicio': '2024-01-01'}
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_valores_invalidos_nao_enfileiram(self):
+        for tipo, parametros in (
+            ('vendas', {'data_inicio': 'ontem'}),
+            ('vendas', {'data_fim': '2024-02-30'}),
+            ('vendas', {'produto': '1; DROP'}),
+            ('estoque', {'categoria': 'abc'}),
+        ):
+            resposta = self.client.post('/api/relatorios/jobs/', {
+                'tipo': tipo, 'parametros': parametros
+            }, content_type='application/json')
+            self.assertEqual(resposta.status_code, 400, parametros)
+            self.assertIn(next(iter(parametros)), resposta.json()['parametros'])
+        self.assertFalse(RelatorioJob.objects.exists())
+
+    def test_erro_na_chave_nao_deixa_job(self):
+        with mock.patch.object(cache_pdf, 'chave', side_effect=ValueError('data inválida')):
+            resposta = self.client.post('/api/relatorios/jobs/', {
+                'tipo': 'vendas', 'parametros': {'data_inicio': '2024-01-01'}
+            }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(RelatorioJob.objects.exists())
+
+
+class RelatoriosHtmlTests(DadosMixin, TestCase):
+
+    def test_estoque(self):
+        Produto.objects.create(
+            nome='Cabo <USB> & cia', preco=Decimal('1234.5'), estoque=0, categoria=self.categoria
+        )
+        with self.assertNumQueries(2):
+            html = html_relatorio_estoque({})
+        self.assertIn('<td>Cabo &lt;USB&gt; &amp; cia</td>', html)
+        self.assertIn('R$ 1,234.50', html)
+        self.assertIn('<td class="text-center sem">SEM ESTOQUE</td>', html)
+        self.assertEqual(html.count('<tr>'), 3)
+
+    def test_vendas(self):
+        self.vender(2)
+        html = html_relatorio_vendas({})
+        self.assertIn('<td>Fone</td><td>Eletrônicos</td><td class="text-center">2</td>', html)
+        self.assertIn('R$ 100.00', html)
+
+    def test_css_compilado_uma_vez(self):
+        self.assertIs(folha_de_estilos(), folha_de_estilos())
+
+
+class RelatorioSegmentadoTests(DadosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        for numero in range(4):
+            Produto.objects.create(
+                nome=f'Produto {numero}', preco=Decimal('10.00'), estoque=numero, categoria=self.categoria
+            )
+
+    @override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'RELATORIOS_LINHAS_POR_SEGMENTO': 2})
+    def test_segmentos(self):
+        with mock.patch('dashboard.relatorios.renderizar_segmentos', side_effect=lambda segmentos, _: list(segmentos)):
+            segmentos, _ = gerar_relatorio_estoque({})
+
+        self.assertEqual(len(segmentos), 3)
+        self.assertEqual([segmento.count('<tr>') for segmento in segmentos], [3, 3, 2])
+        self.assertIn('Resumo do Estoque', segmentos[0])
+        self.assertNotIn('Resumo do Estoque', segmentos[1])
+
+    @override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'RELATORIOS_LINHAS_POR_SEGMENTO': 2})
+    def test_sem_pypdf_gera_documento_unico(self):
+        with mock.patch('dashboard.relatorios.pode_segmentar', return_value=False), \
+                mock.patch('dashboard.relatorios.renderizar_segmentos') as segmentado:
+            conteudo, _ = gerar_relatorio_estoque({})
+        segmentado.assert_not_called()
+        self.assertTrue(conteudo.startswith(b'%PDF'))
+
+    @skipUnless(pdf.pode_segmentar(), 'pypdf não instalado')
+    def test_juntar_pdfs(self):
+        from pypdf import PdfReader, PdfWriter
+
+        partes = []
+        for paginas in (1, 2):
+            escritor, saida = PdfWriter(), BytesIO()
+            for _ in range(paginas):
+                escritor.add_blank_page(width=100, height=100)
+            escritor.write(saida)
+            partes.append(saida.getvalue())
+        self.assertEqual(len(PdfReader(BytesIO(pdf.juntar_pdfs(iter(partes)))).pages), 3)
+
+    @skipUnless(pdf.pode_segmentar(), 'pypdf não instalado')
+    def test_processos_mantem_a_ordem(self):
+        segmentos = [f'<p>{"x" * numero}</p>' for numero in range(6)]
+        with mock.patch('dashboard.pdf.juntar_pdfs', side_effect=list):
+            partes = pdf.renderizar_segmentos(iter(segmentos), processos=2)
+        self.assertEqual(partes, [pdf.renderizar_pdf(segmento) for segmento in segmentos])
+
+
+class CachePdfTests(ArquivosTemporariosMixin, DadosMixin, TestCase):
+    """Cache em disco dos relatórios PDF"""
+
+    def baixar(self, **cabecalhos):
+        return self.client.get('/api/relatorios/vendas/pdf/', **cabecalhos)
+
+    def test_download_repetido_nao_gera_novamente(self):
+        self.vender(2)
+        with mock.patch('dashboard.cache_pdf.gerar_relatorio', wraps=cache_pdf.gerar_relatorio) as gerar:
+            primeira = self.baixar()
+            segunda = self.baixar()
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(primeira['ETag'], segunda['ETag'])
+        self.assertEqual(
+            b''.join(primeira.streaming_content), b''.join(segunda.streaming_content)
+        )
+
+    def test_if_none_match_e_nova_versao(self):
+        etag = self.baixar()['ETag']
+        self.assertEqual(self.baixar(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Uma venda nova no período muda a versão dos dados
+        self.vender(1)
+        resposta = self.baixar(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+
+        # Alterar o nome da categoria também
+        etag = resposta['ETag']
+        self.categoria.nome = 'Áudio'
+        self.categoria.save()
+        self.assertNotEqual(self.baixar()['ETag'], etag)
+
+    def test_descarta_os_menos_usados(self):
+        for chave in ('a', 'b', 'c'):
+            cache_pdf.guardar(chave, b'x' * 100, f'{chave}.pdf')
+            time.sleep(0.01)
+        cache_pdf.obter('a')[0].close()
+
+        cache_pdf.descartar_antigos(limite=200)
+        restantes = sorted(p.name for p in cache_pdf.diretorio().glob('*.pdf'))
+        self.assertEqual(restantes, ['a.pdf', 'c.pdf'])
+
+
+class ExportacaoVendasTests(DadosMixin, TestCase):
+    """Exportação de vendas em CSV e XLSX"""
+
+    def setUp(self):
+        super().setUp()
+        outra = Categoria.objects.create(nome='Casa')
+        self.caneca = Produto.objects.create(
+            nome='Caneca', preco=Decimal('20.00'), estoque=50, categoria=outra
+        )
+        self.vender(2)
+        self.vender(1, self.caneca)
+
+    def test_csv_respeita_filtros(self):
+        resposta = self.client.get(f'/api/vendas/export/?categoria={self.categoria.id}')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        linhas = list(csv.reader(StringIO(conteudo)))
+        self.assertEqual(linhas[0][:3], ['ID', 'Data', 'Produto'])
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[1][2], 'Fone')
+        self.assertEqual(linhas[1][6], '100.00')
+
+    def test_xlsx(self):
+        resposta = self.client.get('/api/vendas/export/?formato=xlsx')
+        self.assertEqual(resposta.status_code, 200)
+        planilha = load_workbook(BytesIO(b''.join(resposta.streaming_content)))
+        linhas = list(planilha.active.values)
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual({linha[2] for linha in linhas[1:]}, {'Fone', 'Caneca'})
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/vendas/export/?formato=pdf').status_code, 400)
+
+
+class PaginacaoTests(DadosMixin, TestCase):
+    """Paginação por número de página e por cursor"""
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(25):
+            self.vender(1)
+        # Empates na data para exercitar o desempate pelo id
+        Venda.objects.filter(id__lte=Venda.objects.order_by('id')[9].id).update(
+            data_venda=timezone.now()
+        )
+
+    def test_page_size_respeitado_e_limitado(self):
+        self.assertEqual(len(self.client.get('/api/vendas/?page_size=5').json()['results']), 5)
+        with override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'PAGINACAO_MAXIMA': 7}):
+            self.assertEqual(len(self.client.get('/api/vendas/?page_size=50').json()['results']), 7)
+
+    def test_cursor_percorre_todas_as_vendas(self):
+        esperado = list(Venda.objects.order_by('-data_venda', '-id').values_list('id', flat=True))
+
+        paginas = []
+        url = '/api/vendas/?paginacao=cursor&page_size=4&contagem=true'
+        while url:
+            dados = self.client.get(url).json()
+            self.assertNotIn('count', dados)
+            self.assertEqual(dados['count_aproximado'], 25)
+            paginas.append(dados)
+            url = dados['next']
+        self.assertEqual([venda['id'] for pagina in paginas for venda in pagina['results']], esperado)
+
+        # Voltando da última página chega-se de novo à primeira
+        anterior = self.client.get(paginas[-1]['previous']).json()
+        self.assertEqual(anterior['results'], paginas[-2]['results'])
+        self.assertEqual(self.client.get(paginas[1]['previous']).json()['results'], paginas[0]['results'])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/api/produtos/?cursor=xyz').status_code, 404)
+
+    def test_busca_nao_combina_com_cursor(self):
+        # O cursor reordenaria por data e perderia a ordem por relevância
+        resposta = self.client.get('/api/produtos/?busca=produto&paginacao=cursor')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('busca', resposta.json())
+        self.assertEqual(self.client.get('/api/produtos/?busca=produto').status_code, 200)
+        self.assertEqual(self.client.get('/api/produtos/?busca=&paginacao=cursor').status_code, 200)
+
+
+class BuscaProdutosTests(DadosMixin, TestCase):
+    """Busca textual de produtos"""
+
+    def setUp(self):
+        super().setUp()
+        criar = lambda nome, descricao='': Produto.objects.create(
+            nome=nome, descricao=descricao, preco=Decimal('10.00'), estoque=5, categoria=self.categoria
+        )
+        self.cafeteira = criar('Cafeteira Elétrica', 'Faz café expresso')
+        self.caneca = criar('Caneca', 'Ideal para café')
+        self.chaleira = criar('Chaleira')
+
+    def buscar(self, termo):
+        resposta = self.client.get('/api/produtos/', {'busca': termo})
+        return [produto['nome'] for produto in resposta.json()['results']]
+
+    def test_sem_acento_prefixo_e_ranking(self):
+        # O nome pesa mais que a descrição
+        self.assertEqual(self.buscar('cafe'), ['Cafeteira Elétrica', 'Caneca'])
+        self.assertEqual(self.buscar('ELETRICA'), ['Cafeteira Elétrica'])
+        self.assertEqual(self.buscar('expresso caf'), ['Cafeteira Elétrica'])
+        self.assertEqual(self.buscar('"()*'), [])
+
+    def test_indice_acompanha_alteracoes(self):
+        Produto.objects.filter(pk=self.chaleira.pk).update(nome='Chaleira de Café')
+        self.assertIn('Chaleira de Café', self.buscar('cafe'))
+
+        self.caneca.delete()
+        self.assertNotIn('Caneca', self.buscar('cafe'))
+
+    def test_triggers_restaurados_apos_migracao(self):
+        # Migrações no SQLite recriam a tabela de produtos sem os triggers
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER dashboard_produto_fts_au')
+        Produto.objects.filter(pk=self.chaleira.pk).update(nome='Chaleira de Café')
+
+        sincronizar_fts_sqlite(connection)
+        self.assertIn('Chaleira de Café', self.buscar('cafe'))
+
+    @override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'AUTOCOMPLETE_EM_MEMORIA': False})
+    def test_autocomplete(self):
+        resposta = self.client.get('/api/ajax/produtos/buscar/', {'q': 'cane'})
+        self.assertEqual([p['nome'] for p in resposta.json()['produtos']], ['Caneca'])
+
+        # Quem casa pelo nome vem antes de quem casa só pela descrição
+        resposta = self.client.get('/api/ajax/produtos/buscar/', {'q': 'café'})
+        self.assertEqual(
+            [p['nome'] for p in resposta.json()['produtos']], ['Cafeteira Elétrica', 'Caneca']
+        )
+
+    def test_inativos_nao_tomam_o_lugar_dos_ativos(self):
+        # Mais inativos recentes que a primeira página de candidatos do índice
+        Produto.objects.bulk_create([
+            Produto(nome=f'Caneca antiga {indice}', preco=Decimal('1.00'), categoria=self.categoria, ativo=False)
+            for indice in range(60)
+        ])
+        sugestoes = sugerir_produtos(
+            Produto.objects.filter(ativo=True).values('id', 'nome'), 'caneca', limite=1
+        )
+        self.assertEqual([sugestao['nome'] for sugestao in sugestoes], ['Caneca'])
+
+
+@override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'AUTOCOMPLETE_INTERVALO': 0})
+class AutocompleteMemoriaTests(DadosMixin, TestCase):
+    """Índice de autocomplete em memória"""
+
+    def setUp(self):
+        super().setUp()
+        autocomplete.indice = autocomplete.IndiceAutocomplete()
+        self.addCleanup(setattr, autocomplete, 'indice', autocomplete.IndiceAutocomplete())
+        self.caneca = Produto.objects.create(
+            nome='Caneca Térmica', preco=Decimal('30.00'), estoque=8, categoria=self.categoria
+        )
+
+    def sugerir(self, termo):
+        resposta = self.client.get('/api/ajax/produtos/buscar/', {'q': termo})
+        return [(p['nome'], p['estoque']) for p in resposta.json()['produtos']]
+
+    def test_prefixo_sem_acento_sem_consultar_o_banco(self):
+        self.assertEqual(self.sugerir('termi'), [('Caneca Térmica', 8)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugerir('caneca TER'), [('Caneca Térmica', 8)])
+        self.assertEqual(self.sugerir('fone caneca'), [])
+
+    def test_acompanha_alteracoes(self):
+        self.sugerir('ca')
+
+        # As gerações só avançam quando a transação é confirmada
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(3, self.caneca)
+        # Só a releitura dos alterados: exclusões chegam pelo sinal
+        with self.assertNumQueries(1):
+            self.assertEqual(self.sugerir('caneca'), [('Caneca Térmica', 5)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.caneca.refresh_from_db()
+            self.caneca.nome = 'Copo Térmico'
+            self.caneca.save()
+        self.assertEqual(self.sugerir('caneca'), [])
+        self.assertEqual(self.sugerir('copo'), [('Copo Térmico', 5)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.filter(pk=self.produto.pk).update(ativo=False, atualizado_em=timezone.now())
+            invalidar('produto')
+        self.assertEqual(self.sugerir('fone'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.caneca.delete()
+        self.assertEqual(self.sugerir('copo'), [])
+
+    def test_sincronizacao_troca_as_listas_de_uma_vez(self):
+        indice = autocomplete.indice
+        indice.atualizar()
+        produtos, lista, ids = indice._estado
+        copia = (lista[:], ids[:])
+
+        indice.aplicar([
+            (self.caneca.pk, 'Copo Térmico', Decimal('30.00'), 8, True),
+            (self.produto.pk, 'Fone', Decimal('50.00'), 100, False),
+        ])
+        # Quem já tinha lido o índice continua com listas coerentes
+        self.assertEqual((lista, ids), copia)
+        self.assertEqual(len(indice.palavras), len(indice.ids))
+        self.assertEqual([p['nome'] for p in indice.buscar('copo')], ['Copo Térmico'])
+        self.assertEqual(indice.buscar('fone'), [])
+
+
+class ViaCepFalso(BaseHTTPRequestHandler):
+    """Servidor local no lugar do ViaCEP"""
+    enderecos = {
+        '01310100': {'cep': '01310-100', 'logradouro': 'Avenida Paulista', 'localidade': 'São Paulo', 'uf': 'SP'},
+        **{f'2004000{i}': {'cep': f'20040-00{i}', 'localidade': 'Rio de Janeiro', 'uf': 'RJ'} for i in range(10)},
+    }
+    requisicoes = []
+    falhas = 0
+    atraso = 0
+
+    def do_GET(self):
+        cep = self.path.strip('/').split('/')[-2]
+        self.__class__.requisicoes.append(cep)
+        time.sleep(self.atraso)
+        if self.__class__.falhas:
+            self.__class__.falhas -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        corpo = json.dumps(self.enderecos.get(cep, {'erro': 'true'})).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ViaCepTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ViaCepFalso)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.configuracao = override_settings(ECOMMERCE_SETTINGS={
+            **settings.ECOMMERCE_SETTINGS,
+            'VIACEP_URL': f'http://127.0.0.1:{cls.servidor.server_port}/ws/',
+            'VIACEP_REQUISICOES_POR_SEGUNDO': 0,
+        })
+        cls.configuracao.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.configuracao.disable()
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        ViaCepFalso.requisicoes = []
+        ViaCepFalso.falhas = 0
+        ViaCepFalso.atraso = 0
+
+    def test_endereco_fica_em_cache(self):
+        for _ in range(3):
+            response = self.client.get('/api/cep/01310-100/')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cidade'], 'São Paulo')
+        self.assertEqual(ViaCepFalso.requisicoes, ['01310100'])
+
+    def test_cep_inexistente_fica_em_cache(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/cep/99999999/').status_code, 404)
+        self.assertEqual(ViaCepFalso.requisicoes, ['99999999'])
+
+    def test_tenta_de_novo_e_nao_guarda_falhas(self):
+        ViaCepFalso.falhas = 1
+        self.assertEqual(viacep.buscar_cep('01310-100')['uf'], 'SP')
+        self.assertEqual(len(ViaCepFalso.requisicoes), 2)
+
+        cache.clear()
+        ViaCepFalso.falhas = 10
+        self.assertEqual(self.client.get('/api/cep/01310100/').status_code, 503)
+        ViaCepFalso.falhas = 0
+        self.assertEqual(self.client.get('/api/cep/01310100/').status_code, 200)
+
+    def test_consultas_simultaneas_sao_agrupadas(self):
+        ViaCepFalso.atraso = 0.2
+        resultados = []
+        threads = [
+            threading.Thread(target=lambda: resultados.append(viacep.buscar_cep('01310100')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([r['uf'] for r in resultados], ['SP'] * 5)
+        self.assertEqual(ViaCepFalso.requisicoes, ['01310100'])
+
+    def test_validacao_em_lote(self):
+        ViaCepFalso.atraso = 0.2
+        ceps = ['01310-100', '123', '99999999', '01310100'] + [f'2004000{i}' for i in range(6)]
+        inicio = time.monotonic()
+        response = self.client.post('/api/cep/lote/', {'ceps': ceps}, content_type='application/json')
+        duracao = time.monotonic() - inicio
+
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados['validos'], 8)
+        self.assertEqual(
+            [resultado['status'] for resultado in dados['resultados'][:4]],
+            ['valido', 'invalido', 'nao_encontrado', 'valido']
+        )
+        self.assertEqual(dados['resultados'][1]['cep'], '123')
+        self.assertEqual(dados['resultados'][4]['endereco']['uf'], 'RJ')
+        # 8 CEPs distintos, consultados em paralelo (em sequência seriam 1,6s)
+        self.assertEqual(sorted(ViaCepFalso.requisicoes), sorted(set(ViaCepFalso.requisicoes)))
+        self.assertEqual(len(ViaCepFalso.requisicoes), 8)
+        self.assertLess(duracao, 1.0)
+
+        self.assertEqual(
+            self.client.post('/api/cep/lote/', {'ceps': 'x'}, content_type='application/json').status_code, 400
+        )
+
+    def test_limite_de_requisicoes_por_host(self):
+        limite = viacep.LimiteTaxa()
+        inicio = time.monotonic()
+        for _ in range(5):
+            limite.aguardar('viacep.com.br', 20)
+        limite.aguardar('outro.host', 20)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.2)
+        self.assertLess(time.monotonic() - inicio, 0.3)
+
+
+class BatchTests(DadosMixin, TestCase):
+    """Vários GETs numa só requisição em /api/batch/"""
+
+    def lote(self, requisicoes, status_esperado=200):
+        corpo = {'requisicoes': requisicoes} if isinstance(requisicoes, list) else requisicoes
+        resposta = self.client.post('/api/batch/', corpo, content_type='application/json')
+        self.assertEqual(resposta.status_code, status_esperado)
+        return resposta.json()
+
+    def test_mesmos_dados_das_requisicoes_separadas(self):
+        self.vender(3)
+        urls = [
+            '/dashboard/stats/', '/dashboard/grafico-vendas/?dias=7&format=columns',
+            '/produtos/?page_size=1', '/relatorios/', f'/produtos/{self.produto.pk}/',
+        ]
+        resultados = self.lote(urls)['resultados']
+        self.assertEqual([resultado['url'] for resultado in resultados], urls)
+        for url, resultado in zip(urls, resultados):
+            separada = self.client.get(f'/api{url}')
+            self.assertEqual(resultado['status'], separada.status_code, url)
+            self.assertEqual(resultado['data'], separada.json(), url)
+            self.assertEqual(resultado.get('etag'), separada.get('ETag'), url)
+
+    def test_etag_devolve_304(self):
+        etag = self.client.get('/api/dashboard/stats/')['ETag']
+        resultado, = self.lote([{'url': '/dashboard/stats/', 'etag': etag}])['resultados']
+        self.assertEqual(resultado['status'], 304)
+        self.assertNotIn('data', resultado)
+
+    def test_erros_por_sub_requisicao(self):
+        resultados = self.lote([
+            '/nada/', '/produtos/999999/', '/dashboard/grafico-vendas/?dias=-1', 'dashboard/stats/',
+        ])['resultados']
+        self.assertEqual([resultado['status'] for resultado in resultados], [404, 404, 400, 200])
+        self.assertEqual(resultados[3]['data']['produtos_ativos'], 1)
+
+    def test_rotas_sem_json_recusadas_sem_executar(self):
+        with mock.patch.object(cache_pdf, 'obter_ou_gerar') as gerar, \
+                mock.patch('dashboard.views.exportar') as exportar_vendas:
+            resultados = self.lote([
+                '/relatorios/estoque/pdf/', '/vendas/export/?formato=xlsx', '/metrics/', '/batch/',
+            ])['resultados']
+        self.assertEqual({resultado['status'] for resultado in resultados}, {400})
+        gerar.assert_not_called()
+        exportar_vendas.assert_not_called()
+
+    def test_somente_leitura(self):
+        # Sub-requisições são sempre GETs: /vendas/ lista, nunca cria
+        resultado, = self.lote(['/vendas/'])['resultados']
+        self.assertEqual(resultado['status'], 200)
+        self.assertEqual(Venda.objects.count(), 0)
+
+    def test_requisicoes_invalidas(self):
+        self.lote([], 400)
+        self.lote('abc', 400)
+        self.lote(5, 400)
+        self.lote([{'etag': 'x'}], 400)
+        self.lote(['http://exemplo.com/api/dashboard/stats/'], 400)
+        with override_settings(ECOMMERCE_SETTINGS={**settings.ECOMMERCE_SETTINGS, 'BATCH_LIMITE': 2}):
+            self.lote(['/relatorios/'] * 3, 400)
+
+
+class MetricasTests(DadosMixin, TestCase):
+    """Métricas por view expostas em /api/metrics/"""
+
+    def amostra(self, nome, **rotulos):
+        return REGISTRY.get_sample_value(nome, rotulos) or 0
+
+    def test_requisicoes_consultas_e_cache(self):
+        rotulos = {'view': 'api_dashboard_stats', 'method': 'GET'}
+        requisicoes = self.amostra('dashboard_request_duration_seconds_count', **rotulos)
+        respondidas = self.amostra('dashboard_requests_total', status='200', **rotulos)
+        consultas = self.amostra('dashboard_db_queries_per_request_sum', view='api_dashboard_stats')
+        acertos = self.amostra('dashboard_cache_requests_total', cache='api', result='hit')
+        faltas = self.amostra('dashboard_cache_requests_total', cache='api', result='miss')
+
+        self.client.get('/api/dashboard/stats/')
+        self.client.get('/api/dashboard/stats/')
+
+        self.assertEqual(self.amostra('dashboard_request_duration_seconds_count', **rotulos), requisicoes + 2)
+        self.assertEqual(self.amostra('dashboard_requests_total', status='200', **rotulos), respondidas + 2)
+        # Só a primeira requisição consulta o banco
+        self.assertGreaterEqual(
+            self.amostra('dashboard_db_queries_per_request_sum', view='api_dashboard_stats'), consultas + 4
+        )
+        self.assertEqual(self.amostra('dashboard_cache_requests_total', cache='api', result='hit'), acertos + 1)
+        self.assertEqual(self.amostra('dashboard_cache_requests_total', cache='api', result='miss'), faltas + 1)
+
+    def test_formato_prometheus(self):
+        self.client.get('/api/produtos/')
+        self.client.get('/api/nao-existe/')
+        resposta = self.client.get('/api/metrics/')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta['Content-Type'].startswith('text/plain'))
+        texto = resposta.content.decode()
+        self.assertIn('# TYPE dashboard_request_duration_seconds histogram', texto)
+        self.assertIn('dashboard_request_duration_seconds_bucket{le="0.005",method="GET",view="produto-list"}', texto)
+        self.assertIn(f'dashboard_requests_total{{method="GET",status="404",view="{metricas.SEM_VIEW}"}}', texto)
+
+    def test_renderizacao_pdf(self):
+        antes = self.amostra('dashboard_pdf_render_seconds_count', relatorio='estoque')
+        gerar_relatorio_estoque({})
+        self.assertEqual(self.amostra('dashboard_pdf_render_seconds_count', relatorio='estoque'), antes + 1)
+
+
+class BenchTests(TestCase):
+    """Massa de dados e medições do manage.py bench"""
+
+    def assinatura(self):
+        return list(Venda.objects.order_by('id').values_list('produto__nome', 'quantidade', 'valor_total'))
+
+    def test_massa_deterministica_e_consolidada(self):
+        dados = semear(500, semente=7)
+        self.assertEqual(dados, {'categorias': 20, 'produtos': 100, 'vendas': 500})
+        self.assertEqual(reconciliar_contadores(), [])
+        self.assertEqual(sum(RelatorioVendas.objects.values_list('quantidade_vendas', flat=True)), 500)
+        primeira = self.assinatura()
+        # Datas espalhadas pelo último ano, sem mexer no auto_now_add do campo
+        self.assertLess(Venda.objects.earliest('data_venda').data_venda, timezone.now() - timedelta(days=30))
+        self.assertTrue(Venda._meta.get_field('data_venda').auto_now_add)
+
+        Categoria.objects.all().delete()
+        semear(500, semente=7)
+        self.assertEqual(self.assinatura(), primeira)
+
+    def test_medir(self):
+        semear(200)
+        medida = medir(Client(), '/api/dashboard/stats/', 5, esfriar=cache.clear)
+        self.assertEqual(medida['status'], 200)
+        self.assertEqual(medida['repeticoes'], 5)
+        self.assertEqual(medida['consultas'], 4)
+        self.assertLessEqual(medida['p50_ms'], medida['p95_ms'])
+        self.assertLessEqual(medida['p95_ms'], medida['p99_ms'])
+        self.assertGreater(medida['memoria_pico_kib'], 0)
+        self.assertGreater(medida['bytes'], 0)
+        self.assertEqual(medida['condicional']['status'], 304)
+        self.assertEqual(medida['condicional']['bytes'], 0)
 
-# Create your tests here.
@@ -18,15 +18,30 @@ urlpatterns = [
     path('dashboard/grafico-produtos/', views.grafico_produtos_api, name='api_grafico_produtos'),
     path('dashboard/grafico-categorias/', views.grafico_categorias_api, name='api_grafico_categorias'),
     
+    # Autocomplete de produtos
+    path('ajax/produtos/buscar/', views.ajax_produtos_buscar, name='ajax_produtos_buscar'),
+    
     # Relatórios PDF
     path('relatorios/', views.relatorios_disponiveis_api, name='relatorios_disponiveis'),
     path('relatorios/vendas/pdf/', views.relatorio_vendas_pdf, name='relatorio_vendas_pdf'),
     path('relatorios/estoque/pdf/', views.relatorio_estoque_pdf, name='relatorio_estoque_pdf'),
     
+    # Fila de relatórios (geração em segundo plano)
+    path('relatorios/jobs/', views.relatorio_jobs_api, name='relatorio_jobs'),
+    path('relatorios/jobs/<uuid:job_id>/', views.relatorio_job_status_api, name='relatorio_job_status'),
+    path('relatorios/jobs/<uuid:job_id>/download/', views.relatorio_job_download, name='relatorio_job_download'),
+    
     # Configurações da loja
     path('configuracoes/', views.configuracoes_loja_api, name='configuracoes_loja'),
     
-    # ViaCEP
+    # ViaCEP (cep/lote/ antes de cep/<cep>/)
+    path('cep/lote/', views.validar_ceps_api, name='validar_ceps'),
     path('cep/<str:cep>/', views.buscar_cep_api, name='buscar_cep'),
     path('teste-viacep/', views.teste_viacep_api, name='teste_viacep'),
+    
+    # Métricas no formato do Prometheus
+    path('metrics/', views.metricas_api, name='metricas'),
+    
+    # Vários GETs numa só requisição
+    path('batch/', views.batch_api, name='api_batch'),
 ]
@@ -0,0 +1,28 @@
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def inicio_do_dia(data):
+    """Retorna o início do dia (no fuso atual) como datetime com fuso"""
+    if isinstance(data, str):
+        data = date.fromisoformat(data)
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def filtro_periodo(campo, data_inicio=None, data_fim=None):
+    """
+    Filtra um DateTimeField pelo período [data_inicio, data_fim], em dias.
+
+    Usa comparações diretas com a coluna (em vez de campo__date), o que
+    permite ao banco usar os índices do campo.
+    """
+    filtro = Q()
+    if data_inicio:
+        filtro &= Q(**{f'{campo}__gte': inicio_do_dia(data_inicio)})
+    if data_fim:
+        if isinstance(data_fim, str):
+            data_fim = date.fromisoformat(data_fim)
+        filtro &= Q(**{f'{campo}__lt': inicio_do_dia(data_fim + timedelta(days=1))})
+    return filtro
@@ -0,0 +1,235 @@
+"""
+Consulta de CEPs no ViaCEP.
+
+Os endereços quase nunca mudam, então as respostas ficam no cache do
+Django por muito tempo, inclusive os CEPs inexistentes (por menos tempo).
+As requisições usam uma única requests.Session com keep-alive e novas
+tentativas, e consultas simultâneas ao mesmo CEP são agrupadas: só uma
+vai ao ViaCEP e as demais esperam pelo resultado dela no cache.
+
+validar_ceps() consulta muitos CEPs em paralelo, com um limite de
+consultas simultâneas e de requisições por segundo ao ViaCEP.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metricas import registrar_cache
+
+URL_PADRAO = 'https://viacep.com.br/ws/'
+CACHE_TTL_PADRAO = 60 * 60 * 24 * 30
+CACHE_TTL_NAO_ENCONTRADO_PADRAO = 60 * 60 * 24
+TIMEOUT_PADRAO = 5
+CONCORRENCIA_PADRAO = 8
+REQUISICOES_POR_SEGUNDO_PADRAO = 10
+
+PREFIXO_CEP = 'dashboard:cep:'
+PREFIXO_TRAVA = 'dashboard:cep:trava:'
+
+# Guardado no cache para CEPs inexistentes
+NAO_ENCONTRADO = {'erro': True}
+
+_sessao = None
+_sessao_trava = threading.Lock()
+
+_em_andamento = {}
+_em_andamento_trava = threading.Lock()
+
+
+class LimiteTaxa:
+    """Espaça as requisições a cada host em 1/taxa segundos"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._proxima = {}
+
+    def aguardar(self, host, por_segundo):
+        if not por_segundo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            horario = max(agora, self._proxima.get(host, agora))
+            self._proxima[host] = horario + 1 / por_segundo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+
+limite_taxa = LimiteTaxa()
+
+
+def _configuracao(nome, padrao):
+    return settings.ECOMMERCE_SETTINGS.get(nome, padrao)
+
+
+def limpar_cep(cep):
+    """Só os dígitos do CEP"""
+    return re.sub(r'\D', '', cep or '')
+
+
+def formatar_cep(cep):
+    """CEP no formato 00000-000"""
+    cep = limpar_cep(cep)
+    return f'{cep[:5]}-{cep[5:]}'
+
+
+def sessao():
+    """Session compartilhada, com pool de conexões e novas tentativas"""
+    global _sessao
+    if _sessao is None:
+        with _sessao_trava:
+            if _sessao is None:
+                tentativas = Retry(
+                    total=2,
+                    backoff_factor=0.2,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=('GET',),
+                    raise_on_status=False,
+                )
+                # Uma conexão por thread de validar_ceps()
+                conexoes = max(10, _configuracao('VIACEP_CONCORRENCIA', CONCORRENCIA_PADRAO))
+                nova = requests.Session()
+                nova.mount('http://', HTTPAdapter(max_retries=tentativas, pool_maxsize=conexoes))
+                nova.mount('https://', HTTPAdapter(max_retries=tentativas, pool_maxsize=conexoes))
+                _sessao = nova
+    return _sessao
+
+
+def _consultar(cep):
+    url = f"{_configuracao('VIACEP_URL', URL_PADRAO).rstrip('/')}/{cep}/json/"
+    timeout = _configuracao('VIACEP_TIMEOUT', TIMEOUT_PADRAO)
+    limite_taxa.aguardar(
+        urlsplit(url).netloc,
+        _configuracao('VIACEP_REQUISICOES_POR_SEGUNDO', REQUISICOES_POR_SEGUNDO_PADRAO),
+    )
+    response = sessao().get(url, timeout=timeout)
+    if response.status_code == 400:
+        # O ViaCEP responde 400 para CEPs mal formados
+        return NAO_ENCONTRADO
+    response.raise_for_status()
+    dados = response.json()
+    return NAO_ENCONTRADO if 'erro' in dados else dados
+
+
+def _consultar_e_guardar(cep):
+    dados = _consultar(cep)
+    if dados is NAO_ENCONTRADO:
+        ttl = _configuracao('VIACEP_CACHE_TTL_NAO_ENCONTRADO', CACHE_TTL_NAO_ENCONTRADO_PADRAO)
+    else:
+        ttl = _configuracao('VIACEP_CACHE_TTL', CACHE_TTL_PADRAO)
+    cache.set(PREFIXO_CEP + cep, dados, ttl)
+    return dados
+
+
+def _consultar_entre_processos(cep):
+    # Outros processos: quem consegue a trava consulta, os demais
+    # aguardam a resposta aparecer no cache (e consultam se ela não vier)
+    chave_trava = PREFIXO_TRAVA + cep
+    espera = _configuracao('VIACEP_TIMEOUT', TIMEOUT_PADRAO) * 2
+    if not cache.add(chave_trava, 1, timeout=espera):
+        limite = time.monotonic() + espera
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            dados = cache.get(PREFIXO_CEP + cep)
+            if dados is not None:
+                return dados
+        return _consultar_e_guardar(cep)
+    try:
+        return _consultar_e_guardar(cep)
+    finally:
+        cache.delete(chave_trava)
+
+
+def _resultado(dados):
+    return None if dados == NAO_ENCONTRADO else dados
+
+
+def buscar_cep(cep):
+    """
+    Dados do ViaCEP para o CEP (8 dígitos), ou None se ele não existir.
+
+    Falhas de rede propagam as exceções do requests (Timeout,
+    HTTPError, ...) e não são guardadas no cache.
+    """
+    cep = limpar_cep(cep)
+    dados = cache.get(PREFIXO_CEP + cep)
+    registrar_cache('cep', dados is not None)
+    if dados is not None:
+        return _resultado(dados)
+
+    with _em_andamento_trava:
+        evento = _em_andamento.get(cep)
+        lider = evento is None
+        if lider:
+            evento = _em_andamento[cep] = threading.Event()
+
+    if not lider:
+        evento.wait(_configuracao('VIACEP_TIMEOUT', TIMEOUT_PADRAO) * 2)
+        dados = cache.get(PREFIXO_CEP + cep)
+        if dados is None:
+            # A consulta do líder falhou: tenta por conta própria
+            dados = _consultar_e_guardar(cep)
+        return _resultado(dados)
+
+    try:
+        return _resultado(_consultar_entre_processos(cep))
+    finally:
+        with _em_andamento_trava:
+            del _em_andamento[cep]
+        evento.set()
+
+
+def validar_cep(cep):
+    """
+    Resultado da validação de um CEP: dicionário com 'cep', 'status'
+    ('valido', 'nao_encontrado', 'invalido' ou 'erro'), 'endereco' e 'erro'.
+    """
+    cep_limpo = limpar_cep(cep)
+    resultado = {'cep': cep, 'status': 'invalido', 'endereco': None, 'erro': None}
+    if len(cep_limpo) != 8:
+        resultado['erro'] = 'CEP deve ter 8 dígitos'
+        return resultado
+
+    resultado['cep'] = formatar_cep(cep_limpo)
+    try:
+        dados = buscar_cep(cep_limpo)
+    except requests.RequestException as e:
+        resultado.update(status='erro', erro=str(e))
+        return resultado
+
+    if dados is None:
+        resultado['status'] = 'nao_encontrado'
+    else:
+        resultado.update(status='valido', endereco=dados)
+    return resultado
+
+
+def validar_ceps(ceps):
+    """
+    Valida vários CEPs em paralelo (até VIACEP_CONCORRENCIA por vez) e
+    retorna os resultados na ordem recebida. CEPs repetidos são
+    consultados uma vez só.
+    """
+    ceps = list(ceps)
+    unicos = list(dict.fromkeys(limpar_cep(cep) for cep in ceps))
+    if not unicos:
+        return []
+
+    concorrencia = _configuracao('VIACEP_CONCORRENCIA', CONCORRENCIA_PADRAO)
+    with ThreadPoolExecutor(max_workers=min(concorrencia, len(unicos))) as executor:
+        resultados = dict(zip(unicos, executor.map(validar_cep, unicos)))
+
+    validados = []
+    for cep in ceps:
+        resultado = dict(resultados[limpar_cep(cep)])
+        if resultado['status'] == 'invalido':
+            resultado['cep'] = cep
+        validados.append(resultado)
+    return validados
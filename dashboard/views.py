@@ -1,45 +1,69 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse 
-from django.db.models import Sum, Count, Q
+from django.http import JsonResponse, HttpResponse, FileResponse
+from django.db.models import Sum, Count, Q, Prefetch
 from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.cache import get_conditional_response
 from datetime import datetime, timedelta
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
-from weasyprint import HTML, CSS
 import os
 import requests
-import re
 
-from .models import Categoria, Produto, Venda, RelatorioVendas, ConfiguracaoLoja
+from .models import (
+    Categoria, Produto, Venda, RelatorioVendas, RelatorioCategoria, RelatorioJob,
+    ConfiguracaoLoja
+)
+from .lote import registrar_vendas_em_lote, limite_lote
+from .exportacao import exportar, FORMATOS
+from .pagination import PaginacaoProdutos, PaginacaoVendas
+from .busca import buscar_produtos, sugerir_produtos
+from . import autocomplete
+from .caching import GeracaoCondicionalMixin, cache_por_geracao
+from .series import GRANULARIDADES, colunas_vendas, serie_vendas
+from .utils import filtro_periodo
+from .relatorios import PARAMETROS
+from . import renderers
+from . import cache_pdf
+from . import metricas, requisicoes, viacep
+from .fila import enfileirar
 from .serializers import (
     CategoriaSerializer, ProdutoListSerializer, ProdutoDetailSerializer,
     VendaListSerializer, VendaDetailSerializer, RelatorioVendasSerializer,
     DashboardStatsSerializer, GraficoVendasSerializer, GraficoProdutosSerializer,
-    GraficoCategoriaSerializer, ConfiguracaoLojaSerializer
+    GraficoCategoriaSerializer, ConfiguracaoLojaSerializer, RelatorioJobSerializer
 )
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(GeracaoCondicionalMixin, viewsets.ModelViewSet):
     """ViewSet para CRUD de Categorias"""
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [AllowAny]
+    tabelas_geracao = ('categoria', 'produto')
     
     def get_queryset(self):
-        queryset = Categoria.objects.all()
+        queryset = Categoria.objects.annotate(
+            produtos_count=Count('produtos', filter=Q(produtos__ativo=True))
+        )
         ativo = self.request.query_params.get('ativo')
         if ativo is not None:
             queryset = queryset.filter(ativo=ativo.lower() == 'true')
         return queryset.order_by('nome')
 
 
-class ProdutoViewSet(viewsets.ModelViewSet):
+class ProdutoViewSet(GeracaoCondicionalMixin, viewsets.ModelViewSet):
     """ViewSet para CRUD de Produtos"""
     permission_classes = [AllowAny]
+    pagination_class = PaginacaoProdutos
+    # O detalhe traz as vendas recentes
+    tabelas_geracao = ('produto', 'categoria', 'venda')
     
     def get_queryset(self):
         queryset = Produto.objects.select_related('categoria')
@@ -59,11 +83,20 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         if estoque_baixo and estoque_baixo.lower() == 'true':
             queryset = queryset.filter(estoque__lt=10)
         
-        if busca:
-            queryset = queryset.filter(
-                Q(nome__icontains=busca) | Q(descricao__icontains=busca)
+        if self.action != 'list':
+            # Vendas recentes do serializer de detalhe numa consulta só
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'vendas',
+                    queryset=Venda.objects.order_by('-data_venda')[:5],
+                    to_attr='vendas_recentes_lista'
+                )
             )
         
+        if busca:
+            # Já vem ordenado por relevância
+            return buscar_produtos(queryset, busca)
+        
         return queryset.order_by('-criado_em')
     
     def get_serializer_class(self):
@@ -79,9 +112,11 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class VendaViewSet(viewsets.ModelViewSet):
+class VendaViewSet(GeracaoCondicionalMixin, viewsets.ModelViewSet):
     """ViewSet para CRUD de Vendas"""
     permission_classes = [AllowAny]
+    pagination_class = PaginacaoVendas
+    tabelas_geracao = ('venda', 'produto', 'categoria')
     
     def get_queryset(self):
         queryset = Venda.objects.select_related('produto', 'produto__categoria')
@@ -98,11 +133,11 @@ class VendaViewSet(viewsets.ModelViewSet):
         if categoria:
             queryset = queryset.filter(produto__categoria_id=categoria)
         
-        if data_inicio:
-            queryset = queryset.filter(data_venda__date__gte=data_inicio)
-        
-        if data_fim:
-            queryset = queryset.filter(data_venda__date__lte=data_fim)
+        if data_inicio or data_fim:
+            try:
+                queryset = queryset.filter(filtro_periodo('data_venda', data_inicio, data_fim))
+            except ValueError:
+                raise ValidationError({'data': 'Use datas no formato AAAA-MM-DD.'})
         
         return queryset.order_by('-data_venda')
     
@@ -110,6 +145,40 @@ class VendaViewSet(viewsets.ModelViewSet):
         if self.action == 'list':
             return VendaListSerializer
         return VendaDetailSerializer
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Registra várias vendas em uma única requisição"""
+        itens = request.data if isinstance(request.data, list) else request.data.get('vendas')
+        
+        if not isinstance(itens, list) or not itens:
+            return Response({
+                'error': 'Envie uma lista de vendas (ou {"vendas": [...]})'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(itens) > limite_lote():
+            return Response({
+                'error': f'Máximo de {limite_lote()} vendas por requisição'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        vendas, erros = registrar_vendas_em_lote(itens)
+        
+        return Response({
+            'criadas': len(vendas),
+            'ids': [venda.id for venda in vendas],
+            'erros': erros,
+        }, status=status.HTTP_201_CREATED if vendas else status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exporta as vendas filtradas em CSV ou XLSX (?formato=csv|xlsx)"""
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({
+                'error': f'Formato inválido. Use: {", ".join(FORMATOS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return exportar(self.filter_queryset(self.get_queryset()), formato)
 
 @api_view(['GET'])
 def ajax_produto_detalhes(request, produto_id):
@@ -137,12 +206,15 @@ def ajax_produtos_buscar(request):
     if len(busca) < 2:
         return JsonResponse({'produtos': []})
     
-    produtos = Produto.objects.filter(
-        nome__icontains=busca,
-        ativo=True
-    ).values('id', 'nome', 'preco', 'estoque')[:10]
+    if settings.ECOMMERCE_SETTINGS.get('AUTOCOMPLETE_EM_MEMORIA', True):
+        # Índice do processo: não consulta o banco enquanto nada mudar
+        produtos = autocomplete.sugerir(busca)
+    else:
+        produtos = sugerir_produtos(
+            Produto.objects.filter(ativo=True).values('id', 'nome', 'preco', 'estoque'), busca
+        )
     
-    return JsonResponse({'produtos': list(produtos)})
+    return JsonResponse({'produtos': produtos})
 
 
 @api_view(['POST'])
@@ -169,48 +241,44 @@ def ajax_verificar_estoque(request):
         return JsonResponse({'error': str(e)}, status=400)
 
 @api_view(['GET'])
+@cache_por_geracao('produto', 'venda', 'categoria')
 def dashboard_stats_api(request):
     """API para estatísticas do dashboard"""
-    hoje = timezone.now().date()
+    hoje = timezone.localdate()
     inicio_mes = hoje.replace(day=1)
     
-    # Estatísticas básicas
-    total_produtos = Produto.objects.filter(ativo=True).count()
-    produtos_ativos = Produto.objects.filter(ativo=True).count()
-    produtos_estoque_baixo = Produto.objects.filter(ativo=True, estoque__lt=10).count()
-    
-    # Vendas hoje
-    vendas_hoje = Venda.objects.filter(data_venda__date=hoje).aggregate(
-        total=Sum('valor_total'),
-        quantidade=Count('id')
+    # Contadores de produtos em uma única consulta
+    produtos = Produto.objects.aggregate(
+        ativos=Count('id', filter=Q(ativo=True)),
+        estoque_baixo=Count('id', filter=Q(ativo=True, estoque__lt=10))
     )
     
-    # Vendas do mês
-    vendas_mes = Venda.objects.filter(data_venda__date__gte=inicio_mes).aggregate(
-        total=Sum('valor_total'),
-        quantidade=Count('id')
+    # Vendas de hoje e do mês em uma única leitura do consolidado diário
+    vendas = RelatorioVendas.objects.filter(data__gte=inicio_mes).aggregate(
+        total_mes=Sum('total_vendas'),
+        quantidade_mes=Sum('quantidade_vendas'),
+        total_hoje=Sum('total_vendas', filter=Q(data=hoje)),
+        quantidade_hoje=Sum('quantidade_vendas', filter=Q(data=hoje))
     )
     
-    # Produto mais vendido
-    produto_mais_vendido = Venda.objects.values('produto__nome').annotate(
-        total=Sum('quantidade')
-    ).order_by('-total').first()
-    
-    # Categoria mais vendida
-    categoria_mais_vendida = Venda.objects.values('produto__categoria__nome').annotate(
-        total=Sum('quantidade')
-    ).order_by('-total').first()
+    # Produto e categoria mais vendidos direto dos contadores consolidados
+    produto_mais_vendido = Produto.objects.filter(produtos_vendidos__gt=0).order_by(
+        '-produtos_vendidos'
+    ).values_list('nome', flat=True).first()
+    categoria_mais_vendida = RelatorioCategoria.objects.filter(produtos_vendidos__gt=0).order_by(
+        '-produtos_vendidos'
+    ).values_list('categoria__nome', flat=True).first()
     
     stats = {
-        'total_produtos': total_produtos,
-        'produtos_ativos': produtos_ativos,
-        'produtos_estoque_baixo': produtos_estoque_baixo,
-        'total_vendas_hoje': vendas_hoje['total'] or 0,
-        'total_vendas_mes': vendas_mes['total'] or 0,
-        'quantidade_vendas_hoje': vendas_hoje['quantidade'] or 0,
-        'quantidade_vendas_mes': vendas_mes['quantidade'] or 0,
-        'produto_mais_vendido': produto_mais_vendido['produto__nome'] if produto_mais_vendido else 'N/A',
-        'categoria_mais_vendida': categoria_mais_vendida['produto__categoria__nome'] if categoria_mais_vendida else 'N/A',
+        'total_produtos': produtos['ativos'],
+        'produtos_ativos': produtos['ativos'],
+        'produtos_estoque_baixo': produtos['estoque_baixo'],
+        'total_vendas_hoje': vendas['total_hoje'] or 0,
+        'total_vendas_mes': vendas['total_mes'] or 0,
+        'quantidade_vendas_hoje': vendas['quantidade_hoje'] or 0,
+        'quantidade_vendas_mes': vendas['quantidade_mes'] or 0,
+        'produto_mais_vendido': produto_mais_vendido or 'N/A',
+        'categoria_mais_vendida': categoria_mais_vendida or 'N/A',
     }
     
     serializer = DashboardStatsSerializer(stats)
@@ -218,47 +286,80 @@ def dashboard_stats_api(request):
 
 
 @api_view(['GET'])
+@renderer_classes(renderers.RENDERERS)
+@cache_por_geracao('venda')
 def grafico_vendas_api(request):
-    """API para dados do gráfico de vendas"""
-    dias = int(request.GET.get('dias', 30))
-    data_inicio = timezone.now().date() - timedelta(days=dias)
-    
-    vendas_por_data = Venda.objects.filter(
-        data_venda__date__gte=data_inicio
-    ).extra(
-        select={'data': 'DATE(data_venda)'}
-    ).values('data').annotate(
-        total_vendas=Sum('valor_total'),
-        quantidade_vendas=Count('id')
-    ).order_by('data')
-    
-    serializer = GraficoVendasSerializer(vendas_por_data, many=True)
+    """
+    API para dados do gráfico de vendas (?dias=30&granularity=day|week|month).
+    Dias sem vendas aparecem zerados. Com ?format=columns, em colunas.
+    """
+    granularidade = request.GET.get('granularity', 'day')
+    if granularidade not in GRANULARIDADES:
+        return Response({
+            'error': f'Granularidade inválida. Use: {", ".join(GRANULARIDADES)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        dias = int(request.GET.get('dias', settings.ECOMMERCE_SETTINGS['GRAFICOS_DIAS_PADRAO']))
+    except ValueError:
+        dias = -1
+    dias_maximo = settings.ECOMMERCE_SETTINGS.get('GRAFICOS_DIAS_MAXIMO', 3660)
+    if not 0 <= dias <= dias_maximo:
+        return Response({
+            'error': f'dias deve ser um número entre 0 e {dias_maximo}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data_fim = timezone.localdate()
+    if renderers.em_colunas(request):
+        datas, totais, quantidades = colunas_vendas(data_fim - timedelta(days=dias), data_fim, granularidade)
+        return Response({
+            'labels': renderers.datas(datas),
+            'total_vendas': renderers.numeros(totais),
+            'quantidade_vendas': quantidades,
+        })
+    
+    serie = serie_vendas(data_fim - timedelta(days=dias), data_fim, granularidade)
+    
+    serializer = GraficoVendasSerializer(serie, many=True)
     return Response(serializer.data)
 
 
 @api_view(['GET'])
+@renderer_classes(renderers.RENDERERS)
+@cache_por_geracao('produto', 'venda', 'categoria')
 def grafico_produtos_api(request):
-    """API para dados do gráfico de produtos mais vendidos"""
+    """API para dados do gráfico de produtos mais vendidos (?format=columns para colunas)"""
     limite = int(request.GET.get('limite', 10))
     
-    produtos_vendidos = Venda.objects.values(
-        'produto__nome',
-        'produto__categoria__nome'
-    ).annotate(
-        total_vendido=Sum('quantidade'),
-        valor_total=Sum('valor_total'),
-        estoque_atual=Sum('produto__estoque')
-    ).order_by('-total_vendido')[:limite]
+    # Contadores mantidos no produto: ORDER BY ... LIMIT sobre um índice
+    produtos_vendidos = Produto.objects.filter(produtos_vendidos__gt=0).order_by('-produtos_vendidos')[:limite]
+    
+    if renderers.em_colunas(request):
+        linhas = list(produtos_vendidos.values_list(
+            'nome', 'categoria__nome', 'produtos_vendidos', 'total_vendas', 'estoque'
+        ))
+        nomes, categorias, vendidos, totais, estoques = zip(*linhas) if linhas else ((),) * 5
+        return Response({
+            'labels': list(nomes),
+            'categoria': list(categorias),
+            'total_vendido': list(vendidos),
+            'valor_total': renderers.numeros(totais),
+            'estoque_atual': list(estoques),
+        })
+    
+    produtos_vendidos = produtos_vendidos.values(
+        'nome', 'categoria__nome', 'produtos_vendidos', 'total_vendas', 'estoque'
+    )
     
     # Renomear campos para o serializer
     dados_formatados = []
     for item in produtos_vendidos:
         dados_formatados.append({
-            'nome': item['produto__nome'],
-            'categoria': item['produto__categoria__nome'],
-            'total_vendido': item['total_vendido'],
-            'valor_total': item['valor_total'],
-            'estoque_atual': item['estoque_atual']
+            'nome': item['nome'],
+            'categoria': item['categoria__nome'],
+            'total_vendido': item['produtos_vendidos'],
+            'valor_total': item['total_vendas'],
+            'estoque_atual': item['estoque']
         })
     
     serializer = GraficoProdutosSerializer(dados_formatados, many=True)
@@ -266,184 +367,72 @@ def grafico_produtos_api(request):
 
 
 @api_view(['GET'])
+@renderer_classes(renderers.RENDERERS)
+@cache_por_geracao('produto', 'venda', 'categoria')
 def grafico_categorias_api(request):
-    """API para dados do gráfico por categorias"""
-    categorias_vendas = Venda.objects.values(
-        'produto__categoria__nome'
-    ).annotate(
-        total_produtos=Count('produto', distinct=True),
-        total_vendas=Sum('valor_total'),
-        quantidade_vendida=Sum('quantidade')
-    ).order_by('-total_vendas')
+    """
+    API para dados do gráfico por categorias (lidos do consolidado por
+    categoria). Com ?format=columns, em colunas.
+    """
+    categorias_vendas = RelatorioCategoria.objects.filter(quantidade_vendas__gt=0).order_by('-total_vendas')
+    
+    if renderers.em_colunas(request):
+        linhas = list(categorias_vendas.values_list(
+            'categoria__nome', 'produtos_com_vendas', 'produtos_ativos', 'total_vendas', 'produtos_vendidos'
+        ))
+        nomes, com_vendas, ativos, totais, vendidos = zip(*linhas) if linhas else ((),) * 5
+        return Response({
+            'labels': list(nomes),
+            'total_produtos': list(com_vendas),
+            'produtos_ativos': list(ativos),
+            'total_vendas': renderers.numeros(totais),
+            'quantidade_vendida': list(vendidos),
+        })
+    
+    categorias_vendas = categorias_vendas.values(
+        'categoria__nome', 'produtos_com_vendas', 'produtos_ativos', 'total_vendas', 'produtos_vendidos'
+    )
     
     # Renomear campos para o serializer
     dados_formatados = []
     for item in categorias_vendas:
         dados_formatados.append({
-            'categoria': item['produto__categoria__nome'],
-            'total_produtos': item['total_produtos'],
+            'categoria': item['categoria__nome'],
+            'total_produtos': item['produtos_com_vendas'],
+            'produtos_ativos': item['produtos_ativos'],
             'total_vendas': item['total_vendas'],
-            'quantidade_vendida': item['quantidade_vendida']
+            'quantidade_vendida': item['produtos_vendidos']
         })
     
     serializer = GraficoCategoriaSerializer(dados_formatados, many=True)
     return Response(serializer.data)
 
+def _resposta_pdf(request, tipo):
+    """Serve o PDF do cache em disco (ou 304), gerando-o só se necessário"""
+    chave = cache_pdf.chave(tipo, request.GET)
+    etag = f'"{chave}"'
+    
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+    
+    arquivo, filename = cache_pdf.obter_ou_gerar(tipo, request.GET, chave)
+    response = FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/pdf'
+    )
+    response['ETag'] = etag
+    # O navegador pode guardar o PDF, mas deve revalidar a cada download
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 @api_view(['GET'])
 def relatorio_vendas_pdf(request):
     """Gera relatório de vendas em PDF usando WeasyPrint"""
     try:
-        # Parâmetros de filtro
-        data_inicio = request.GET.get('data_inicio')
-        data_fim = request.GET.get('data_fim')
-        categoria_id = request.GET.get('categoria')
-        produto_id = request.GET.get('produto')
-        
-        # Filtros padrão (últimos 30 dias se não especificado)
-        if not data_inicio:
-            data_inicio = (timezone.now().date() - timedelta(days=30)).strftime('%Y-%m-%d')
-        if not data_fim:
-            data_fim = timezone.now().date().strftime('%Y-%m-%d')
-        
-        # Query base
-        vendas = Venda.objects.select_related('produto', 'produto__categoria').filter(
-            data_venda__date__gte=data_inicio,
-            data_venda__date__lte=data_fim
-        )
-        
-        # Aplicar filtros
-        if categoria_id:
-            vendas = vendas.filter(produto__categoria_id=categoria_id)
-        if produto_id:
-            vendas = vendas.filter(produto_id=produto_id)
-        
-        vendas = vendas.order_by('-data_venda')
-        
-        # Calcular totais
-        totais = vendas.aggregate(
-            total_valor=Sum('valor_total'),
-            total_quantidade=Sum('quantidade'),
-            total_vendas=Count('id')
-        )
-        
-        # Top produtos
-        top_produtos = vendas.values(
-            'produto__nome', 'produto__categoria__nome'
-        ).annotate(
-            total_vendido=Sum('quantidade'),
-            valor_total=Sum('valor_total')
-        ).order_by('-valor_total')[:10]
-        
-        # Preparar contexto
-        context = {
-            'vendas': vendas,
-            'totais': totais,
-            'top_produtos': top_produtos,
-            'data_inicio': data_inicio,
-            'data_fim': data_fim,
-            'data_geracao': timezone.now(),
-            'filtros': {
-                'categoria_id': categoria_id,
-                'produto_id': produto_id,
-            }
-        }
-        
-        # HTML simples inline (sem template por enquanto)
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Relatório de Vendas</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                .header {{ text-align: center; margin-bottom: 30px; }}
-                .titulo {{ color: #2c3e50; font-size: 24px; font-weight: bold; }}
-                .periodo {{ color: #7f8c8d; margin: 10px 0; }}
-                .resumo {{ background: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0; }}
-                .resumo h3 {{ color: #495057; margin-top: 0; }}
-                .stat {{ display: inline-block; margin: 10px 20px; text-align: center; }}
-                .stat-valor {{ font-size: 18px; font-weight: bold; color: #28a745; }}
-                .stat-label {{ font-size: 12px; color: #6c757d; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                th, td {{ border: 1px solid #dee2e6; padding: 8px; text-align: left; }}
-                th {{ background-color: #e9ecef; font-weight: bold; }}
-                .text-right {{ text-align: right; }}
-                .text-center {{ text-align: center; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div class="titulo">🛒 Relatório de Vendas</div>
-                <div class="periodo">Período: {data_inicio} até {data_fim}</div>
-                <div class="periodo">Gerado em: {timezone.now().strftime('%d/%m/%Y %H:%M')}</div>
-            </div>
-            
-            <div class="resumo">
-                <h3>Resumo Executivo</h3>
-                <div class="stat">
-                    <div class="stat-valor">{totais['total_vendas'] or 0}</div>
-                    <div class="stat-label">Total Vendas</div>
-                </div>
-                <div class="stat">
-                    <div class="stat-valor">R$ {(totais['total_valor'] or 0):,.2f}</div>
-                    <div class="stat-label">Faturamento</div>
-                </div>
-                <div class="stat">
-                    <div class="stat-valor">{totais['total_quantidade'] or 0}</div>
-                    <div class="stat-label">Itens Vendidos</div>
-                </div>
-                <div class="stat">
-                    <div class="stat-valor">R$ {((totais['total_valor'] or 0) / max(totais['total_vendas'] or 1, 1)):,.2f}</div>
-                    <div class="stat-label">Ticket Médio</div>
-                </div>
-            </div>
-            
-            <h3>Detalhes das Vendas</h3>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Data</th>
-                        <th>Produto</th>
-                        <th>Categoria</th>
-                        <th class="text-center">Qtd</th>
-                        <th class="text-right">Preço Unit.</th>
-                        <th class="text-right">Total</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
-        # Adicionar linhas das vendas
-        for venda in vendas[:100]:  # Limitar a 100 vendas
-            html_content += f"""
-                    <tr>
-                        <td>{venda.data_venda.strftime('%d/%m/%Y')}</td>
-                        <td>{venda.produto.nome}</td>
-                        <td>{venda.produto.categoria.nome}</td>
-                        <td class="text-center">{venda.quantidade}</td>
-                        <td class="text-right">R$ {venda.preco_unitario:,.2f}</td>
-                        <td class="text-right">R$ {venda.valor_total:,.2f}</td>
-                    </tr>
-            """
-        
-        html_content += """
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
-        
-        # Gerar PDF com WeasyPrint
-        html = HTML(string=html_content)
-        pdf = html.write_pdf()
-        
-        # Resposta HTTP
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f'relatorio_vendas_{data_inicio}_{data_fim}.pdf'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
+        return _resposta_pdf(request, 'vendas')
         
     except Exception as e:
         return Response({
@@ -454,133 +443,7 @@ def relatorio_vendas_pdf(request):
 def relatorio_estoque_pdf(request):
     """Gera relatório de estoque em PDF usando WeasyPrint"""
     try:
-        # Parâmetros
-        apenas_baixo = request.GET.get('apenas_baixo', 'false').lower() == 'true'
-        categoria_id = request.GET.get('categoria')
-        
-        # Query base
-        produtos = Produto.objects.select_related('categoria').filter(ativo=True)
-        
-        # Filtros
-        if apenas_baixo:
-            produtos = produtos.filter(estoque__lt=10)
-        if categoria_id:
-            produtos = produtos.filter(categoria_id=categoria_id)
-        
-        produtos = produtos.order_by('estoque', 'nome')
-        
-        # Estatísticas
-        stats = {
-            'total_produtos': produtos.count(),
-            'produtos_sem_estoque': produtos.filter(estoque=0).count(),
-            'produtos_estoque_baixo': produtos.filter(estoque__lt=10, estoque__gt=0).count(),
-            'produtos_ok': produtos.filter(estoque__gte=10).count(),
-        }
-        
-        # HTML para estoque
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Relatório de Estoque</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                .header {{ text-align: center; margin-bottom: 30px; }}
-                .titulo {{ color: #2c3e50; font-size: 24px; font-weight: bold; }}
-                .data {{ color: #7f8c8d; margin: 10px 0; }}
-                .resumo {{ background: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0; }}
-                .stat {{ display: inline-block; margin: 10px 20px; text-align: center; }}
-                .stat-valor {{ font-size: 18px; font-weight: bold; }}
-                .stat-label {{ font-size: 12px; color: #6c757d; }}
-                .ok {{ color: #28a745; }}
-                .baixo {{ color: #ffc107; }}
-                .sem {{ color: #dc3545; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                th, td {{ border: 1px solid #dee2e6; padding: 8px; text-align: left; }}
-                th {{ background-color: #e9ecef; font-weight: bold; }}
-                .text-right {{ text-align: right; }}
-                .text-center {{ text-align: center; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div class="titulo">📦 Relatório de Estoque</div>
-                <div class="data">Gerado em: {timezone.now().strftime('%d/%m/%Y %H:%M')}</div>
-            </div>
-            
-            <div class="resumo">
-                <h3>Resumo do Estoque</h3>
-                <div class="stat">
-                    <div class="stat-valor">{stats['total_produtos']}</div>
-                    <div class="stat-label">Total Produtos</div>
-                </div>
-                <div class="stat ok">
-                    <div class="stat-valor">{stats['produtos_ok']}</div>
-                    <div class="stat-label">Estoque OK</div>
-                </div>
-                <div class="stat baixo">
-                    <div class="stat-valor">{stats['produtos_estoque_baixo']}</div>
-                    <div class="stat-label">Estoque Baixo</div>
-                </div>
-                <div class="stat sem">
-                    <div class="stat-valor">{stats['produtos_sem_estoque']}</div>
-                    <div class="stat-label">Sem Estoque</div>
-                </div>
-            </div>
-            
-            <h3>Produtos</h3>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Produto</th>
-                        <th>Categoria</th>
-                        <th class="text-right">Preço</th>
-                        <th class="text-center">Estoque</th>
-                        <th class="text-center">Status</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
-        # Adicionar produtos
-        for produto in produtos:
-            if produto.estoque == 0:
-                status_class = 'sem'
-                status_text = 'SEM ESTOQUE'
-            elif produto.estoque < 10:
-                status_class = 'baixo'
-                status_text = 'BAIXO'
-            else:
-                status_class = 'ok'
-                status_text = 'OK'
-                
-            html_content += f"""
-                    <tr>
-                        <td>{produto.nome}</td>
-                        <td>{produto.categoria.nome}</td>
-                        <td class="text-right">R$ {produto.preco:,.2f}</td>
-                        <td class="text-center">{produto.estoque}</td>
-                        <td class="text-center {status_class}">{status_text}</td>
-                    </tr>
-            """
-        
-        html_content += """
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
-        
-        # Gerar PDF
-        html = HTML(string=html_content)
-        pdf = html.write_pdf()
-        
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f'relatorio_estoque_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
+        return _resposta_pdf(request, 'estoque')
         
     except Exception as e:
         return Response({
@@ -595,20 +458,59 @@ def relatorios_disponiveis_api(request):
             'id': 'vendas',
             'nome': 'Relatório de Vendas',
             'descricao': 'Vendas por período com filtros e estatísticas',
-            'parametros': ['data_inicio', 'data_fim', 'categoria', 'produto'],
-            'url': '/api/relatorios/vendas/pdf/'
+            'parametros': PARAMETROS['vendas'],
+            'url': '/api/relatorios/vendas/pdf/',
+            'url_fila': '/api/relatorios/jobs/'
         },
         {
             'id': 'estoque',
             'nome': 'Relatório de Estoque',
             'descricao': 'Status do estoque por produto e categoria',
-            'parametros': ['apenas_baixo', 'categoria'],
-            'url': '/api/relatorios/estoque/pdf/'
+            'parametros': PARAMETROS['estoque'],
+            'url': '/api/relatorios/estoque/pdf/',
+            'url_fila': '/api/relatorios/jobs/'
         }
     ]
     
     return Response(relatorios)
 
+@api_view(['POST'])
+def relatorio_jobs_api(request):
+    """Enfileira a geração de um relatório PDF e retorna o id do job"""
+    serializer = RelatorioJobSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        job = enfileirar(serializer.validated_data['tipo'], serializer.validated_data['parametros'])
+    except (ValueError, DjangoValidationError) as e:
+        return Response({'error': f'Parâmetros inválidos: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(RelatorioJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def relatorio_job_status_api(request, job_id):
+    """Consulta o andamento de um job de relatório"""
+    job = get_object_or_404(RelatorioJob, pk=job_id)
+    return Response(RelatorioJobSerializer(job).data)
+
+@api_view(['GET'])
+def relatorio_job_download(request, job_id):
+    """Baixa o PDF de um job concluído"""
+    job = get_object_or_404(RelatorioJob, pk=job_id)
+    
+    if job.status != 'concluido':
+        return Response({
+            'error': 'Relatório ainda não está pronto',
+            'status': job.status
+        }, status=status.HTTP_409_CONFLICT)
+    
+    return FileResponse(
+        job.arquivo.open('rb'),
+        as_attachment=True,
+        filename=job.nome_arquivo,
+        content_type='application/pdf'
+    )
+
 @api_view(['GET', 'PUT'])
 def configuracoes_loja_api(request):
     """API para configurações da loja (Singleton)"""
@@ -660,10 +562,10 @@ def configuracoes_loja_api(request):
 
 @api_view(['GET'])
 def buscar_cep_api(request, cep):
-    """Busca endereço pelo CEP usando ViaCEP"""
+    """Busca endereço pelo CEP usando ViaCEP (com cache)"""
     try:
         # Limpar CEP (remover tudo que não é número)
-        cep_limpo = re.sub(r'\D', '', cep)
+        cep_limpo = viacep.limpar_cep(cep)
         
         # Validar CEP
         if len(cep_limpo) != 8:
@@ -671,43 +573,35 @@ def buscar_cep_api(request, cep):
                 'error': 'CEP deve ter 8 dígitos'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Formatar CEP para consulta
-        cep_formatado = f"{cep_limpo[:5]}-{cep_limpo[5:]}"
-        
-        # Fazer requisição para ViaCEP
-        url = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-        response = requests.get(url, timeout=10)
+        data = viacep.buscar_cep(cep_limpo)
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Verificar se CEP existe
-            if 'erro' in data:
-                return Response({
-                    'error': 'CEP não encontrado'
-                }, status=status.HTTP_404_NOT_FOUND)
-            
-            # Retornar dados formatados
+        # Verificar se CEP existe
+        if data is None:
             return Response({
-                'cep': cep_formatado,
-                'endereco': data.get('logradouro', ''),
-                'bairro': data.get('bairro', ''),
-                'cidade': data.get('localidade', ''),
-                'uf': data.get('uf', ''),
-                'complemento': data.get('complemento', ''),
-                'success': True
-            })
+                'error': 'CEP não encontrado'
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        else:
-            return Response({
-                'error': 'Erro ao consultar CEP no serviço ViaCEP'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # Retornar dados formatados
+        return Response({
+            'cep': viacep.formatar_cep(cep_limpo),
+            'endereco': data.get('logradouro', ''),
+            'bairro': data.get('bairro', ''),
+            'cidade': data.get('localidade', ''),
+            'uf': data.get('uf', ''),
+            'complemento': data.get('complemento', ''),
+            'success': True
+        })
     
     except requests.exceptions.Timeout:
         return Response({
             'error': 'Timeout ao consultar CEP - tente novamente'
         }, status=status.HTTP_408_REQUEST_TIMEOUT)
     
+    except requests.exceptions.HTTPError:
+        return Response({
+            'error': 'Erro ao consultar CEP no serviço ViaCEP'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
     except requests.exceptions.RequestException as e:
         return Response({
             'error': f'Erro de conexão: {str(e)}'
@@ -718,18 +612,38 @@ def buscar_cep_api(request, cep):
             'error': f'Erro interno: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+def validar_ceps_api(request):
+    """Valida vários CEPs em paralelo no ViaCEP ({"ceps": [...]})"""
+    ceps = request.data if isinstance(request.data, list) else request.data.get('ceps')
+    
+    if not isinstance(ceps, list) or not ceps or not all(isinstance(cep, str) for cep in ceps):
+        return Response({
+            'error': 'Envie uma lista de CEPs (ou {"ceps": [...]})'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    limite = settings.ECOMMERCE_SETTINGS.get('VIACEP_LOTE_LIMITE', 500)
+    if len(ceps) > limite:
+        return Response({
+            'error': f'Máximo de {limite} CEPs por requisição'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    resultados = viacep.validar_ceps(ceps)
+    
+    return Response({
+        'total': len(resultados),
+        'validos': sum(1 for resultado in resultados if resultado['status'] == 'valido'),
+        'resultados': resultados,
+    })
+
 @api_view(['GET'])
 def teste_viacep_api(request):
     """Endpoint para testar integração ViaCEP"""
     try:
         # Testar com CEP da Av. Paulista
-        cep_teste = "01310100"
-        url = f"https://viacep.com.br/ws/{cep_teste}/json/"
+        data = viacep.buscar_cep("01310100")
         
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             return Response({
                 'status': 'ViaCEP funcionando',
                 'exemplo': data,
@@ -739,11 +653,38 @@ def teste_viacep_api(request):
         else:
             return Response({
                 'status': 'Erro no ViaCEP',
-                'codigo': response.status_code
+                'codigo': status.HTTP_404_NOT_FOUND
             })
     
     except Exception as e:
         return Response({
             'status': 'Erro',
             'erro': str(e)
-        })
\ No newline at end of file
+        })
+
+def metricas_api(request):
+    """Métricas da API no formato texto do Prometheus"""
+    conteudo, content_type = metricas.exportar()
+    return HttpResponse(conteudo, content_type=content_type)
+
+@api_view(['POST'])
+def batch_api(request):
+    """
+    Vários GETs da API numa só requisição ({"requisicoes": ["/dashboard/stats/", ...]}),
+    com os resultados na mesma ordem
+    """
+    itens = request.data
+    if isinstance(itens, dict):
+        itens = itens.get('requisicoes')
+    
+    erro = requisicoes.validar(itens)
+    if erro is not None:
+        return Response({'error': erro}, status=status.HTTP_400_BAD_REQUEST)
+    
+    limite = settings.ECOMMERCE_SETTINGS.get('BATCH_LIMITE', 20)
+    if len(itens) > limite:
+        return Response({
+            'error': f'Máximo de {limite} requisições por lote'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'resultados': requisicoes.executar(request._request, itens)})
@@ -11,7 +11,7 @@ import {
   Legend,
 } from 'chart.js';
 import { Line, Bar } from 'react-chartjs-2';
-import { dashboardAPI, produtosAPI, vendasAPI } from '../../services/api';
+import { emLote, produtosAPI, vendasAPI } from '../../services/api';
 import './Dashboard.css';
 
 // Registrar componentes do Chart.js
@@ -43,11 +43,11 @@ const Dashboard = () => {
     try {
       setLoading(true);
       
-      // Buscar todos os dados em paralelo
-      const [statsResponse, vendasResponse, produtosResponse] = await Promise.all([
-        dashboardAPI.stats(),
-        dashboardAPI.graficoVendas(30),
-        dashboardAPI.graficoProdutos(10)
+      // Buscar todos os dados numa única requisição
+      const [statsResponse, vendasResponse, produtosResponse] = await emLote([
+        '/dashboard/stats/',
+        '/dashboard/grafico-vendas/?dias=30',
+        '/dashboard/grafico-produtos/?limite=10'
       ]);
 
       setStats(statsResponse.data);
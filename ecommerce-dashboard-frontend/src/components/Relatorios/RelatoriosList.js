@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { relatoriosAPI, downloadPDF, categoriasAPI, produtosAPI } from '../../services/api';
+import { relatoriosAPI, downloadPDF, emLote } from '../../services/api';
 import './RelatoriosList.css';
 
 const RelatoriosList = () => {
@@ -32,11 +32,11 @@ const RelatoriosList = () => {
     try {
       setLoading(true);
       
-      // Carregar relatórios disponíveis, categorias e produtos
-      const [relatoriosResponse, categoriasResponse, produtosResponse] = await Promise.all([
-        relatoriosAPI.listar(),
-        categoriasAPI.listar('?ativo=true'),
-        produtosAPI.listar('?ativo=true')
+      // Carregar relatórios disponíveis, categorias e produtos numa única requisição
+      const [relatoriosResponse, categoriasResponse, produtosResponse] = await emLote([
+        '/relatorios/',
+        '/categorias/?ativo=true',
+        '/produtos/?ativo=true'
       ]);
       
       setRelatorios(relatoriosResponse.data);
@@ -79,15 +79,11 @@ const RelatoriosList = () => {
       if (filtrosVendas.categoria) filtros.categoria = filtrosVendas.categoria;
       if (filtrosVendas.produto) filtros.produto = filtrosVendas.produto;
       
-      const response = await relatoriosAPI.gerarVendasPDF(filtros);
-      
-      // Gerar nome do arquivo
-      const dataInicio = filtrosVendas.data_inicio || 'todas';
-      const dataFim = filtrosVendas.data_fim || 'datas';
-      const filename = `relatorio_vendas_${dataInicio}_${dataFim}.pdf`;
+      // O PDF é gerado em segundo plano; aguardamos o job terminar
+      const { blob, filename } = await relatoriosAPI.gerarViaFila('vendas', filtros);
       
       // Download do PDF
-      downloadPDF(response.data, filename);
+      downloadPDF(blob, filename);
       
     } catch (err) {
       console.error('Erro ao gerar relatório de vendas:', err);
@@ -106,12 +102,9 @@ const RelatoriosList = () => {
       if (filtrosEstoque.apenas_baixo) filtros.apenas_baixo = 'true';
       if (filtrosEstoque.categoria) filtros.categoria = filtrosEstoque.categoria;
       
-      const response = await relatoriosAPI.gerarEstoquePDF(filtros);
-      
-      const timestamp = new Date().toISOString().slice(0, 19).replace(/[:-]/g, '');
-      const filename = `relatorio_estoque_${timestamp}.pdf`;
+      const { blob, filename } = await relatoriosAPI.gerarViaFila('estoque', filtros);
       
-      downloadPDF(response.data, filename);
+      downloadPDF(blob, filename);
       
     } catch (err) {
       console.error('Erro ao gerar relatório de estoque:', err);
@@ -41,6 +41,20 @@ export const dashboardAPI = {
   graficoCategorias: () => api.get('/dashboard/grafico-categorias/'),
 };
 
+// Vários GETs numa só requisição (POST /api/batch/). Resolve com uma
+// resposta ({ status, data }) por URL, na ordem, ou rejeita se alguma falhar
+export const emLote = async (urls) => {
+  const { data } = await api.post('/batch/', { requisicoes: urls });
+  return data.resultados.map((resultado) => {
+    if (resultado.status >= 400) {
+      const erro = new Error(resultado.error || `Erro ${resultado.status} em ${resultado.url}`);
+      erro.response = resultado;
+      throw erro;
+    }
+    return resultado;
+  });
+};
+
 export const relatoriosAPI = {
   listar: () => api.get('/relatorios/'),
   
@@ -57,6 +71,43 @@ export const relatoriosAPI = {
       responseType: 'blob',
     });
   },
+  
+  // Fila de relatórios (geração em segundo plano)
+  enfileirar: (tipo, parametros = {}) => api.post('/relatorios/jobs/', { tipo, parametros }),
+  statusJob: (id) => api.get(`/relatorios/jobs/${id}/`),
+  baixarJob: (id) => api.get(`/relatorios/jobs/${id}/download/`, {
+    responseType: 'blob',
+  }),
+  
+  // Enfileira o relatório e aguarda o job terminar; retorna { blob, filename }.
+  // Se o job não terminar em `tentativas` consultas (nenhum processar_relatorios
+  // rodando, por exemplo), o PDF é gerado pelo endpoint síncrono
+  gerarViaFila: async (tipo, parametros = {}, intervalo = 1000, tentativas = 30) => {
+    const { data: job } = await relatoriosAPI.enfileirar(tipo, parametros);
+    
+    let atual = job;
+    for (let i = 0; i < tentativas && (atual.status === 'pendente' || atual.status === 'processando'); i++) {
+      await new Promise(resolve => setTimeout(resolve, intervalo));
+      atual = (await relatoriosAPI.statusJob(job.id)).data;
+    }
+    
+    if (atual.status === 'pendente' || atual.status === 'processando') {
+      const gerarSincrono = { vendas: relatoriosAPI.gerarVendasPDF, estoque: relatoriosAPI.gerarEstoquePDF }[tipo];
+      if (!gerarSincrono) {
+        throw new Error('Tempo esgotado aguardando o relatório');
+      }
+      const response = await gerarSincrono(parametros);
+      const hoje = new Date().toISOString().slice(0, 10);
+      return { blob: response.data, filename: `relatorio_${tipo}_${hoje}.pdf` };
+    }
+    
+    if (atual.status !== 'concluido') {
+      throw new Error(atual.erro || 'Erro ao gerar relatório');
+    }
+    
+    const response = await relatoriosAPI.baixarJob(job.id);
+    return { blob: response.data, filename: atual.nome_arquivo };
+  },
 };
 
 
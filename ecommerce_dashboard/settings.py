@@ -42,6 +42,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'dashboard.metricas.MetricasMiddleware',  # primeiro, para medir a requisição inteira
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -127,7 +128,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'dashboard.pagination.PaginacaoPadrao',
     'PAGE_SIZE': 20,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -270,8 +271,28 @@ ECOMMERCE_SETTINGS = {
     'SIMBOLO_MOEDA': 'R$',
     'DECIMAIS_PRECO': 2,
     'PAGINACAO_PADRAO': 15,
+    'PAGINACAO_MAXIMA': 100,  # maior ?page_size= aceito pelas APIs
+    'CONTAGEM_CACHE_TTL': 60,  # segundos que uma contagem aproximada fica em cache
     'GRAFICOS_DIAS_PADRAO': 30,
+    'GRAFICOS_DIAS_MAXIMO': 3660,  # maior ?dias= aceito pelo gráfico de vendas
     'TOP_PRODUTOS_LIMITE': 10,
+    'VENDAS_LOTE_LIMITE': 10000,
+    'RELATORIOS_TEMPO_LIMITE': 600,  # segundos até um job travado voltar para a fila
+    'RELATORIOS_JOBS_RETENCAO': 24 * 60 * 60,  # segundos até um job terminado e o seu PDF serem apagados
+    'RELATORIOS_CACHE_DIR': BASE_DIR / 'cache' / 'relatorios',
+    'RELATORIOS_CACHE_TAMANHO_MAXIMO': 200 * 1024 * 1024,  # bytes
+    'RELATORIOS_LINHAS_POR_SEGMENTO': 2000,  # produtos por segmento do PDF de estoque (0 = um documento só)
+    'RELATORIOS_PROCESSOS': 1,  # processos que renderizam os segmentos
+    'AUTOCOMPLETE_EM_MEMORIA': True,  # índice de autocomplete em memória por processo
+    'AUTOCOMPLETE_INTERVALO': 1.0,  # segundos entre verificações de alterações
+    'VIACEP_URL': config('VIACEP_URL', default='https://viacep.com.br/ws/'),
+    'VIACEP_TIMEOUT': 5,  # segundos por tentativa
+    'VIACEP_CACHE_TTL': 60 * 60 * 24 * 30,  # CEPs encontrados
+    'VIACEP_CACHE_TTL_NAO_ENCONTRADO': 60 * 60 * 24,  # CEPs inexistentes
+    'VIACEP_CONCORRENCIA': 8,  # consultas simultâneas na validação em lote
+    'VIACEP_REQUISICOES_POR_SEGUNDO': 10,  # por host; 0 desativa o limite
+    'VIACEP_LOTE_LIMITE': 500,  # CEPs por requisição em /api/cep/lote/
+    'BATCH_LIMITE': 20,  # sub-requisições por chamada a /api/batch/
 }
 
 # Configurações de arquivos permitidos